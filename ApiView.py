@@ -8,6 +8,7 @@ from pydantic import ValidationError, MissingError, ExtraError # NOQA
 from pydantic.main import BaseModel
 
 import tools
+import validators
 from api_utils import ApiResponse
 
 
@@ -63,26 +64,18 @@ def validate(parameters, schema=None):
         schema = {"type": "object"}
     try:
         if schema is not None:
-            jsonschema.validate(parameters, schema,
-                                format_checker=jsonschema.FormatChecker(
-                                    formats=['date', 'date-time', 'phone', 'email', 'digitstr', 'str_bool']))
+            validators.check(parameters, schema)
 
     except jsonschema.exceptions.ValidationError as exc:
-        if exc.validator == 'required':
-            raise ApiResponse(12)
-        if exc.validator == 'additionalProperties':
-            raise ApiResponse(14)
-        else:
+        if exc.validator not in ('required', 'additionalProperties'):
             logger.debug(f'validation err: {exc}')
-            raise ApiResponse(13)
+        validators.raise_api_response(exc)
 
 
 def validate_apiview(parameters, schema):
     try:
         if isinstance(schema, dict) or isinstance(schema, list):
-            jsonschema.validate(parameters, schema,
-                                format_checker=jsonschema.FormatChecker(
-                                    formats=['date', 'date-time', 'phone', 'email', 'digitstr', 'str_bool']))
+            validators.check(parameters, schema)
         elif issubclass(schema, BaseModel):
             return schema(**parameters)
     except ValidationError as exceptions:
@@ -94,9 +87,4 @@ def validate_apiview(parameters, schema):
                 raise ApiResponse(14)
         raise ApiResponse(13)
     except jsonschema.exceptions.ValidationError as exc:
-        if exc.validator == 'required':
-            raise ApiResponse(12)
-        if exc.validator == 'additionalProperties':
-            raise ApiResponse(14)
-        else:
-            raise ApiResponse(13)
+        validators.raise_api_response(exc)
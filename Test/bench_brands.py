@@ -0,0 +1,100 @@
+"""
+Сравнение постраничной выдачи брендов (PartnersInAirport): прежний путь с запросами точки и фото на каждый бренд
+и пакетный tools_ext.fetch_brands. Считает обращения к БД и время ответа для страниц из 20/100/500 брендов.
+
+Запуск из корня проекта: python -m Test.bench_brands --airport_id 3 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import asyncpg
+
+from queries import GET_BRANDS_LIST_QUERY, GET_POINT_QUERY
+from settings import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_DATABASE
+from system_parameters import system_parameters
+from tools_ext import fetch_brands
+
+
+class CountingConnection:
+    """ Обертка над соединением asyncpg, считающая обращения к БД """
+
+    def __init__(self, connection, counter):
+        self._connection = connection
+        self._counter = counter
+
+    def __getattr__(self, item):
+        attr = getattr(self._connection, item)
+        if item in ('fetch', 'fetchrow', 'fetchval', 'execute'):
+            async def counted(*args, **kwargs):
+                self._counter[0] += 1
+                return await attr(*args, **kwargs)
+            return counted
+        if item == 'prepare':
+            async def prepare(*args, **kwargs):
+                self._counter[0] += 1
+                return CountingConnection(await attr(*args, **kwargs), self._counter)
+            return prepare
+        return attr
+
+
+async def legacy_brands(pool, counter, language_code, airport_id, limit):
+    """ Прежняя реализация: точка и фото запрашиваются по одной на каждый бренд """
+    async with pool.acquire() as conn:
+        conn = CountingConnection(conn, counter)
+        language_id = await conn.fetchval('select id from languages where code = $1;', language_code)
+    async with pool.acquire() as conn:
+        conn = CountingConnection(conn, counter)
+        brands = await conn.fetch(GET_BRANDS_LIST_QUERY, language_code, False, airport_id, None, None, limit, 0, None,
+                                  system_parameters.resource_server_url)
+        brands = [dict(brand) for brand in brands]
+        prepared_point = await conn.prepare(GET_POINT_QUERY)
+        for brand in brands:
+            brand.update(await prepared_point.fetchrow(language_id, brand.pop('points')[0]))
+    for brand in brands:
+        async with pool.acquire() as conn:
+            conn = CountingConnection(conn, counter)
+            brand['photo_paths'] = [row['photo'] for row in await conn.fetch(
+                'select photo from photo_to_point where point_id = $1 order by id', brand['point_id'])]
+    return brands
+
+
+async def batched_brands(pool, counter, language_code, airport_id, limit):
+    async with pool.acquire() as conn:
+        return await fetch_brands(CountingConnection(conn, counter), language_code, airport_id=airport_id,
+                                  limit=limit, with_photos=True)
+
+
+async def measure(func, pool, repeat, *args):
+    timings, round_trips, size = [], 0, 0
+    for _ in range(repeat):
+        counter = [0]
+        started = time.perf_counter()
+        brands = await func(pool, counter, *args)
+        timings.append((time.perf_counter() - started) * 1000)
+        round_trips, size = counter[0], len(brands)
+    return size, round_trips, statistics.median(timings), max(timings)
+
+
+async def main(airport_id, language_code, repeat):
+    pool = await asyncpg.create_pool(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD,
+                                     database=DB_DATABASE, min_size=2, max_size=4)
+    try:
+        await system_parameters.refresh(pool)
+        print(f'{"limit":>6} {"path":>8} {"brands":>7} {"round trips":>12} {"median, ms":>11} {"max, ms":>9}')
+        for limit in (20, 100, 500):
+            for name, func in (('legacy', legacy_brands), ('batched', batched_brands)):
+                size, round_trips, median, worst = await measure(func, pool, repeat, language_code, airport_id, limit)
+                print(f'{limit:>6} {name:>8} {size:>7} {round_trips:>12} {median:>11.2f} {worst:>9.2f}')
+    finally:
+        await pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='бенчмарк выдачи брендов в аэропорту\n')
+    parser.add_argument('-a', '--airport_id', type=int, default=None, help='id аэропорта, по умолчанию все')
+    parser.add_argument('-l', '--language_code', default='ru', help='')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='количество повторов для каждого размера')
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(main(args.airport_id, args.language_code, args.repeat))
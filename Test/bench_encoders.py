@@ -0,0 +1,91 @@
+"""
+Кодирование ответов: стандартный json.dumps (как сейчас в ApiResponse) и encoders.dumps (orjson/json).
+Ответы с кодами берутся из таблицы responses.md; листинги partnersInAirport, stocks, onpass/points и banners
+собираются по образцу примеров из документации обработчиков, с датами и Decimal в данных.
+Для каждого ответа выводятся время кодирования и размер тела без сжатия, с gzip и brotli (если установлен).
+
+Запуск из корня проекта: python -m Test.bench_encoders --number 200
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import timeit
+from datetime import datetime, date
+from decimal import Decimal
+
+import encoders
+from settings import BASE_DIR, FORMAT_DATE_TIME, RESPONSE_COMPRESSION
+
+RESPONSE_ROW = re.compile(r'<td>(\d+)(?:<br>)?</td>\s*<td><span[^>]*>([^<]+)</span></td>')
+
+
+def recorded_responses():
+    """ Ответы без данных для всех кодов из responses.md """
+    with open(os.path.join(BASE_DIR, 'responses.md'), encoding='utf-8') as f:
+        rows = RESPONSE_ROW.findall(f.read())
+    return [{'responseCode': int(code), 'responseMessage': message, 'data': None} for code, message in rows]
+
+
+def listing(name, size):
+    now = datetime(2021, 9, 7, 7, 15, 4)
+    if name == 'partnersInAirport':
+        partners = [{'id': i, 'name': f'Партнер {i}', 'category_id': i % 7, 'cashback': Decimal('5.50'),
+                     'photo_paths': [f'https://developer.mileonair.com/resources/PhotoToPoint/{i}_{j}.jpg'
+                                     for j in range(3)],
+                     'work_time': [{'day': d, 'open': '08:00', 'close': '22:00'} for d in range(7)],
+                     'address_short': 'Терминал D, 3 этаж', 'created_date': now} for i in range(size)]
+        return {'partners_in_airport': [{'category_id': c, 'partners': partners[c::7]} for c in range(7)]}
+    if name == 'stocks':
+        return {'stocks': [{'id': i, 'ord': 1, 'name': f'Акция {i}', 'price': Decimal('1990.00'),
+                            'date_start': date(2021, 9, 1), 'date_end': date(2021, 12, 31),
+                            'cart': {'id': i, 'amount': 1}, 'points': list(range(5))} for i in range(size)]}
+    if name == 'onpass/points':
+        return {'points': [{'id': i, 'name': f'Бизнес-зал {i}', 'active': True, 'terminal': 'D', 'closed': False,
+                            'photo_path': f'https://dev.cl.maocloud.ru/resources/PhotoToPoint/{i}.jpg',
+                            'custom_info': {'type': 'BUSINESS'}, 'price': 123456, 'purchased_visits_count': i % 3}
+                           for i in range(size)]}
+    return {'banners': [{'id': i, 'title': f'баннер {i}', 'short_description': None,
+                         'image_url': f'https://developer.mileonair.com/resources/Banner/{i}_photo_path.png',
+                         'logo_path': None, 'created_date': now} for i in range(size)],
+            'total_count': size, 'next_after_id': None}
+
+
+def preformatted(obj):
+    """ Данные в том виде, в каком их сейчас готовит convert_data перед json.dumps """
+    return json.loads(encoders.dumps_json(obj))
+
+
+def payloads(size):
+    for response in recorded_responses():
+        yield f'code {response["responseCode"]}', response
+    for name in ('partnersInAirport', 'stocks', 'onpass/points', 'banners'):
+        yield f'{name} x{size}', {'responseCode': 0, 'responseMessage': 'Запрос обработан успешно',
+                                  'data': listing(name, size)}
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main(number, size):
+    print(f'{"payload":<26} {"json, us":>9} {"encoders, us":>13} {"bytes":>8} {"gzip":>7} {"brotli":>7}')
+    for name, payload in payloads(size):
+        legacy_payload = preformatted(payload)
+        legacy = measure(lambda: json.dumps(legacy_payload).encode(), number)
+        current = measure(lambda: encoders.dumps(payload), number)
+        body = encoders.dumps(payload)
+        gzipped = len(gzip.compress(body, compresslevel=RESPONSE_COMPRESSION['gzip_level']))
+        brotli_size = len(encoders.brotli.compress(body, quality=RESPONSE_COMPRESSION['brotli_quality'])) \
+            if encoders.brotli is not None else '-'
+        print(f'{name:<26} {legacy:>9.1f} {current:>13.1f} {len(body):>8} {gzipped:>7} {brotli_size:>7}')
+    print(f'кодировщик: {encoders.dumps.__name__}, формат дат: {FORMAT_DATE_TIME}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='бенчмарк кодирования ответов\n')
+    parser.add_argument('-n', '--number', type=int, default=200, help='количество кодирований в замере')
+    parser.add_argument('-s', '--size', type=int, default=500, help='количество элементов в листингах')
+    args = parser.parse_args()
+    main(args.number, args.size)
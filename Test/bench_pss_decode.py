@@ -0,0 +1,61 @@
+"""
+Разбор ответов PSS: модели pydantic (как сейчас) и pss.decode без проверки (PSS_TRUSTED_DECODE).
+Берутся записанные ответы из Test_contract/pss_payloads; список заказов seller/orders размножается
+до --size заказов, чтобы оценить страницу onpass-заказов активного пользователя.
+
+Запуск из корня проекта: python -m Test.bench_pss_decode --number 50 --size 500
+"""
+import argparse
+import copy
+import json
+import os
+import timeit
+
+from pss.decode import decode
+from pss.views import PssResponse, PointsModel, OrdersModel
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Test_contract', 'pss_payloads')
+
+
+def load(name):
+    with open(os.path.join(PAYLOADS, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def scaled_orders(size):
+    response = load('seller_orders.json')
+    recorded = response['data']['orders']
+    orders = []
+    for i in range(size):
+        order = copy.deepcopy(recorded[i % len(recorded)])
+        order['order_id'] += i
+        order['qr'] = f'{order["qr"][:-6]}{i:06d}'
+        orders.append(order)
+    response['data']['orders'] = orders
+    return response
+
+
+def payloads(size):
+    yield 'seller/points', load('seller_points.json'), PointsModel
+    yield f'seller/orders x{size}', scaled_orders(size), OrdersModel
+
+
+def main(number, size):
+    print(f'{"payload":<22} {"pydantic, us":>13} {"trusted, us":>12} {"speedup":>8}')
+    for name, response, model in payloads(size):
+        def validated():
+            model(**PssResponse(**response).data)
+
+        def trusted():
+            decode(model, decode(PssResponse, response).data)
+
+        results = [min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6 for func in (validated, trusted)]
+        print(f'{name:<22} {results[0]:>13.1f} {results[1]:>12.1f} {results[0] / results[1]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='бенчмарк разбора ответов PSS\n')
+    parser.add_argument('-n', '--number', type=int, default=50, help='количество разборов в замере')
+    parser.add_argument('-s', '--size', type=int, default=500, help='количество заказов в ответе seller/orders')
+    args = parser.parse_args()
+    main(args.number, args.size)
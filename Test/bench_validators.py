@@ -0,0 +1,77 @@
+"""
+Пропускная способность проверки запросов по схемам из schemas.py: jsonschema.validate с новым FormatChecker
+на каждый вызов (прежний путь) и скомпилированный валидатор из validators.registry.
+Для каждой схемы проверяется построенный по ней пример запроса.
+
+Запуск из корня проекта: python -m Test.bench_validators --number 2000
+"""
+import argparse
+import timeit
+
+import jsonschema
+
+import schemas
+import validators
+
+SAMPLE_STRINGS = {
+    'date': '2021-09-07',
+    'date-time': '2021-09-07 07:15:04',
+    'phone': '+79857759703',
+    'email': 'user@example.com',
+    'digitstr': '42',
+    'str_bool': 'true',
+}
+
+
+def sample(schema):
+    """ Пример значения, удовлетворяющего схеме (для типов и форматов, используемых в schemas.py) """
+    if 'enum' in schema:
+        return schema['enum'][0]
+    schema_type = schema.get('type', 'object')
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != 'null'), 'null')
+    if schema_type == 'object':
+        return {name: sample(value) for name, value in schema.get('properties', {}).items()}
+    if schema_type == 'array':
+        return [sample(schema['items'])] if isinstance(schema.get('items'), dict) else []
+    if schema_type == 'string':
+        return SAMPLE_STRINGS.get(schema.get('format'), 'text')
+    return {'integer': 1, 'number': 1.5, 'boolean': True, 'null': None}[schema_type]
+
+
+def legacy(data, schema):
+    jsonschema.validate(data, schema, format_checker=jsonschema.FormatChecker(formats=validators.FORMATS))
+
+
+def valid(data, schema):
+    try:
+        validators.check(data, schema)
+    except jsonschema.exceptions.ValidationError:
+        return False
+    return True
+
+
+def main(number):
+    print(f'{"schema":<40} {"valid":>6} {"legacy, op/s":>13} {"registry, op/s":>15} {"speedup":>8}')
+    for name in sorted(dir(schemas)):
+        schema = getattr(schemas, name)
+        if not name.isupper() or not isinstance(schema, dict):
+            continue
+        data = sample(schema)
+        results = []
+        for func in (legacy, validators.check):
+            def run():
+                try:
+                    func(data, schema)
+                except jsonschema.exceptions.ValidationError:
+                    pass
+            results.append(number / min(timeit.repeat(run, number=number, repeat=3)))
+        print(f'{name:<40} {str(valid(data, schema)):>6} {results[0]:>13.0f} {results[1]:>15.0f} '
+              f'{results[1] / results[0]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='бенчмарк проверки запросов по jsonschema\n')
+    parser.add_argument('-n', '--number', type=int, default=2000, help='количество проверок в замере')
+    args = parser.parse_args()
+    main(args.number)
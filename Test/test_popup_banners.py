@@ -0,0 +1,39 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import asyncpg
+
+from queries import GET_POPUP_BANNERS_QUERY
+from settings import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_DATABASE
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+async def fetch_popup_banners(profile_id, now):
+    connection = await asyncpg.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD,
+                                       database=DB_DATABASE)
+    try:
+        statement = await connection.prepare(GET_POPUP_BANNERS_QUERY)
+        rows = await statement.fetch('ru', '', '', profile_id, now)
+        return [parameter.name for parameter in statement.get_parameters()], rows
+    finally:
+        await connection.close()
+
+
+class Test_popup_banners_query:
+
+    def test_query_prepares_with_timestamp_now(self, profile):
+        parameters, _ = run(fetch_popup_banners(profile, datetime.now()))
+        assert parameters[4] == 'timestamp'
+
+    def test_shows_count_in_time_interval(self, profile):
+        _, rows = run(fetch_popup_banners(profile, datetime.now()))
+        for row in rows:
+            assert isinstance(row['shows_count'], int)
+            assert row['shows_count'] >= 0
+
+    def test_no_shows_before_window(self, profile):
+        _, rows = run(fetch_popup_banners(profile, datetime.now() - timedelta(days=365 * 50)))
+        assert all(row['shows_count'] == 0 for row in rows)
@@ -0,0 +1,61 @@
+import base64
+from datetime import datetime
+
+import pytest
+from api_utils import ApiResponse
+
+from utils import encode_cursor, decode_cursor, get_cursor, next_cursor
+
+
+class Request:
+    def __init__(self, **query):
+        self.query = query
+
+
+def b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+class Test_cursor:
+
+    @pytest.mark.parametrize('created_date, id_', [
+        (datetime(2021, 3, 1, 12, 30, 15, 123456), 1),
+        (datetime(2021, 3, 1), 2 ** 40),
+        (datetime(1999, 12, 31, 23, 59, 59), 0),
+    ])
+    def test_round_trip(self, created_date, id_):
+        cursor = encode_cursor(created_date, id_)
+        assert '=' not in cursor
+        assert decode_cursor(cursor) == (created_date, id_)
+        assert get_cursor(Request(cursor=cursor)) == (created_date, id_)
+
+    @pytest.mark.parametrize('cursor', [
+        '',
+        'not a cursor!',
+        b64(b'not json'),
+        b64(b'\xff\xfe'),
+        b64(b'null'),
+        b64(b'{"created_date": "2021-03-01"}'),
+        b64(b'["2021-03-01T00:00:00"]'),
+        b64(b'["2021-03-01T00:00:00", 1, 2]'),
+        b64(b'[1, 2]'),
+        b64(b'["yesterday", 1]'),
+        b64(b'["2021-03-01T00:00:00", "one"]'),
+    ])
+    def test_malformed_cursor(self, cursor):
+        with pytest.raises(ApiResponse) as exc_info:
+            decode_cursor(cursor)
+        assert exc_info.value.code == 13
+        with pytest.raises(ApiResponse) as exc_info:
+            get_cursor(Request(cursor=cursor))
+        assert exc_info.value.code == 13
+
+    def test_no_cursor(self):
+        assert get_cursor(Request(limit='20')) is None
+
+    def test_next_cursor(self):
+        rows = [dict(created_date=datetime(2021, 3, 2), id=7), dict(created_date=datetime(2021, 3, 1), id=5)]
+        assert next_cursor(rows, limit=3) is None
+        assert decode_cursor(next_cursor(rows, limit=2)) == (datetime(2021, 3, 1), 5)
+        assert decode_cursor(next_cursor(rows, limit=2, date_key='created_date', id_key='id')) == \
+               (datetime(2021, 3, 1), 5)
@@ -0,0 +1,57 @@
+"""
+Контракт ответов PSS на записанных ответах (pss_payloads). Тесты не обращаются к серверу API и лежат
+отдельно от Test, где conftest регистрирует пользователя на запущенном сервере для каждой сессии pytest.
+
+Запуск из корня проекта: python -m pytest Test_contract
+"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+from pydantic.datetime_parse import parse_datetime
+
+from pss.decode import decode
+from pss.views import PssResponse, PointsModel, OrdersModel
+
+PAYLOADS = os.path.join(os.path.dirname(__file__), 'pss_payloads')
+
+RECORDED = [
+    ('seller_points.json', PointsModel),
+    ('seller_orders.json', OrdersModel),
+]
+
+
+def load(name):
+    with open(os.path.join(PAYLOADS, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def same(trusted, validated):
+    """ Значение без проверки совпадает с проверенным pydantic; даты без проверки остаются строками """
+    if isinstance(validated, datetime):
+        return isinstance(trusted, str) and parse_datetime(trusted) == validated
+    if isinstance(validated, dict):
+        return isinstance(trusted, dict) and trusted.keys() == validated.keys() \
+               and all(same(trusted[key], validated[key]) for key in validated)
+    if isinstance(validated, list):
+        return isinstance(trusted, list) and len(trusted) == len(validated) \
+               and all(same(t, v) for t, v in zip(trusted, validated))
+    return type(trusted) is type(validated) and trusted == validated
+
+
+@pytest.mark.parametrize('name, model', RECORDED)
+class Test_pss_contract:
+
+    def test_response_matches_model(self, name, model):
+        response = PssResponse(**load(name))
+        assert response.code == 0
+        model(**response.data)
+
+    def test_trusted_decode_matches_model(self, name, model):
+        data = load(name)['data']
+        assert same(decode(model, data).dict(), model(**data).dict())
+
+    def test_trusted_decode_validates_lazily(self, name, model):
+        data = load(name)['data']
+        assert decode(model, data).validate() == model(**data)
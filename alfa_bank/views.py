@@ -1,7 +1,6 @@
 from json import JSONDecodeError
 from typing import TypeVar
 
-import aiohttp
 from aiohttp import ClientError
 from api_utils import ApiResponse
 from loguru import logger
@@ -11,6 +10,7 @@ from alfa_bank.models import WebPaymentData, MobilePaymentResponse, ApplePayment
     WebPaymentResponse, GetOrderStatusExtendedData, GetOrderStatusExtendedDataResponse, OrderBundle, CartItems, \
     CartItem, CartItemQuantity, RegisterPreAuthModel, ReverseModel, WebPaymentError, CustomerDetails, UnbindModel
 from auth_model import config
+from http_clients import HttpClients
 from utils import DecodingStreamReader, mask_pans
 
 
@@ -51,36 +51,36 @@ class AlfaBankPay:
 
     @classmethod
     async def post(cls, params: input_post_model, raise_api_response: bool = True) -> T:
-        async with aiohttp.ClientSession() as session:
-            try:
-
-                logger.debug(f'запрос на альфу {cls.url}, с параметрами {params}')
-                foo = cls.make_request_params(params.dict(exclude_none=True))
-                response_content = await session.post(
-                    cls.url,
-                    **foo
-                )
-            except ClientError as exc:
-                logger.error(f'не удалось получить ответ от альфы; {exc}')
-                if raise_api_response:
-                    raise ApiResponse(30, exc=exc)
-            try:
-                response_raw = await DecodingStreamReader(response_content.content).read()
-                logger.debug(f'получен ответ {mask_pans(response_raw)}')
-                payment_response: T = cls.payment_response.parse_raw(response_raw)
-
-            except ValidationError as exc:
-                logger.error(f'ответ от альфы на {cls.url}: {mask_pans(response_raw)} exc: {exc}')
-                if raise_api_response:
-                    raise ApiResponse(30, exc=exc)
-            except JSONDecodeError as exc:
-                raise ApiResponse(30, exc=exc,
-                                  log_message=f'(JSONDecodeError, ClientError), {response_content.content}')
-            except Exception as exc:
-                logger.exception(exc)
-                raise ApiResponse(90, exc=exc)
-
-            return payment_response
+        session = HttpClients.get(HttpClients.ALFA_BANK)
+        try:
+
+            logger.debug(f'запрос на альфу {cls.url}, с параметрами {params}')
+            foo = cls.make_request_params(params.dict(exclude_none=True))
+            response_content = await session.post(
+                cls.url,
+                **foo
+            )
+        except ClientError as exc:
+            logger.error(f'не удалось получить ответ от альфы; {exc}')
+            if raise_api_response:
+                raise ApiResponse(30, exc=exc)
+        try:
+            response_raw = await DecodingStreamReader(response_content.content).read()
+            logger.debug(f'получен ответ {mask_pans(response_raw)}')
+            payment_response: T = cls.payment_response.parse_raw(response_raw)
+
+        except ValidationError as exc:
+            logger.error(f'ответ от альфы на {cls.url}: {mask_pans(response_raw)} exc: {exc}')
+            if raise_api_response:
+                raise ApiResponse(30, exc=exc)
+        except JSONDecodeError as exc:
+            raise ApiResponse(30, exc=exc,
+                              log_message=f'(JSONDecodeError, ClientError), {response_content.content}')
+        except Exception as exc:
+            logger.exception(exc)
+            raise ApiResponse(90, exc=exc)
+
+        return payment_response
 
 
 class WebPay(AlfaBankPay):
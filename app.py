@@ -20,8 +20,16 @@ from loguru import logger, _file_sink
 import settings as s
 import tools
 from auth_model import DatabaseConfig, config
+from banner_counters import banner_counters
+from payment_status import payment_status_worker
+from shared_cache import shared_cache
+from blacklist import ip_blacklist
+from http_clients import HttpClients
+from notify_listener import notify_listener
+from response_cache import response_cache
+from system_parameters import system_parameters
 from confirm_email import create_views as create_confirm_email_views
-from middlewares import auth_middleware, errors_middleware, context_middleware
+from middlewares import auth_middleware, errors_middleware, context_middleware, compression_middleware
 from v1.privileges import create_views as create_privileges_views
 from v1.superuser import create_views as create_superuser_views
 from views import routes as view_routes
@@ -59,6 +67,9 @@ pool_settings = dict(
     max_inactive_connection_lifetime=60
 )
 
+# отдельные соединения вне пула: чтение параметров в make_app и LISTEN
+connect_settings = {key: pool_settings[key] for key in ('host', 'port', 'user', 'password', 'database')}
+
 
 async def make_redis_pool():
     redis_address = s.REDIS_ADRESS
@@ -88,12 +99,14 @@ def make_app():
     try:
         loop = asyncio.get_event_loop()
 
-        app = web.Application(middlewares=[context_middleware, errors_middleware, auth_middleware],
+        app = web.Application(middlewares=[compression_middleware, context_middleware, errors_middleware,
+                                           auth_middleware],
                               client_max_size=50 * 10485760)
 
-        res = tools.read_sys_params(app)
+        res = loop.run_until_complete(tools.read_sys_params(app, **connect_settings))
 
         redis_pool = loop.run_until_complete(make_redis_pool())
+        app['redis_pool'] = redis_pool
         storage = None
         if s.TYPE_SESSION_STORAGE == 0:
             storage = aiohttp_session.SimpleCookieStorage(cookie_name=s.REDIS_COOKIE_NAME, max_age=app[
@@ -151,6 +164,14 @@ def make_app():
 
 async def on_start(app):
     await pool.create(s.POOL, **pool_settings)
+    await HttpClients.create()
+    await system_parameters.start(pool.get_pool(s.POOL))
+    await ip_blacklist.start(pool.get_pool(s.POOL))
+    await response_cache.start(pool.get_pool(s.POOL))
+    await notify_listener.start(**connect_settings)
+    banner_counters.start(pool.get_pool(s.POOL))
+    payment_status_worker.start(pool.get_pool(s.POOL))
+    shared_cache.start(app['redis_pool'], s.REDIS_ADRESS)
     Mail.configure(True, config.mail.host, config.mail.password, config.mail.user, 587)
     # await init_db(app)
     # app[s.POOL] = await create_pool(s.POOL)
@@ -158,6 +179,12 @@ async def on_start(app):
 
 
 async def on_shutdown(app):
+    await notify_listener.stop()
+    await response_cache.stop()
+    await banner_counters.stop()
+    await payment_status_worker.stop()
+    await shared_cache.stop()
+    await HttpClients.close()
     await pool.close(s.POOL)
     # await close_pool(app[s.POOL])
 
@@ -0,0 +1,84 @@
+import asyncio
+from asyncio import CancelledError
+from datetime import datetime
+
+from loguru import logger
+
+from settings import BANNER_COUNTERS_RECONCILE_INTERVAL, FORMAT_DATE_TIME
+
+# ключ advisory lock, чтобы сверку выполнял только один экземпляр API
+RECONCILE_LOCK_KEY = 7301
+
+RECONCILE_QUERY = """
+with actual as (select profile_id, count(*) as unread
+                from banners_to_profiles
+                where not read_banner
+                group by profile_id)
+update profiles p
+set unread_banners_count = coalesce(actual.unread, 0)
+from profiles p2
+         left join actual on actual.profile_id = p2.id
+where p.id = p2.id
+  and p.unread_banners_count is distinct from coalesce(actual.unread, 0)
+"""
+
+
+class BannerCountersReconciler:
+    """
+    Фоновая сверка profiles.unread_banners_count с banners_to_profiles.
+    Счетчик поддерживает триггер на banners_to_profiles (migrations/0010_banners_to_profiles_unread_trigger.sql);
+    сверка раз в BANNER_COUNTERS_RECONCILE_INTERVAL секунд - страховка на случай расхождений
+    (TRUNCATE, отключенный триггер, правки profiles вручную)
+    """
+
+    def __init__(self, interval=BANNER_COUNTERS_RECONCILE_INTERVAL):
+        self._interval = interval
+        self._pool = None
+        self._task = None
+        self.runs = 0
+        self.fixed = 0
+        self.last_run = None
+
+    async def reconcile(self, pool=None) -> int:
+        pool = pool or self._pool
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                if not await connection.fetchval('select pg_try_advisory_xact_lock($1)', RECONCILE_LOCK_KEY):
+                    return 0
+                status = await connection.execute(RECONCILE_QUERY)
+        fixed = int(status.split()[-1])
+        self.runs += 1
+        self.fixed += fixed
+        self.last_run = datetime.now()
+        if fixed:
+            logger.warning(f'banner_counters: исправлено счетчиков непрочитанных баннеров {fixed}')
+        return fixed
+
+    async def _reconcile_periodically(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.reconcile()
+            except CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f'banner_counters: ошибка сверки счетчиков: {exc}')
+
+    def start(self, pool):
+        self._pool = pool
+        self._task = asyncio.ensure_future(self._reconcile_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def metrics(self) -> dict:
+        return dict(
+            runs=self.runs,
+            fixed=self.fixed,
+            last_run=self.last_run.strftime(FORMAT_DATE_TIME) if self.last_run is not None else None,
+        )
+
+
+banner_counters = BannerCountersReconciler()
@@ -0,0 +1,99 @@
+import ipaddress
+from datetime import datetime
+
+from loguru import logger
+
+from notify_listener import notify_listener
+from settings import IP_BLACKLIST_CHANNEL, IP_BLACKLIST_REFRESH_INTERVAL, FORMAT_DATE_TIME
+
+
+class IpBlacklist:
+    """
+    Черный список IP в памяти процесса.
+    Загружается в on_start, перечитывается по NOTIFY из канала IP_BLACKLIST_CHANNEL
+    (см. migrations/0001_ip_blacklist_notify.sql, notify_listener) и дополнительно раз в IP_BLACKLIST_REFRESH_INTERVAL
+    секунд, на случай потери LISTEN-соединения. Поддерживает как одиночные адреса, так и подсети в нотации CIDR.
+    """
+
+    def __init__(self, channel=IP_BLACKLIST_CHANNEL, refresh_interval=IP_BLACKLIST_REFRESH_INTERVAL):
+        self._channel = channel
+        self._refresh_interval = refresh_interval
+        self._addresses = frozenset()
+        self._networks = ()
+        self._raw = frozenset()
+        self._pool = None
+        self.loaded = False
+        self.lookups = 0
+        self.hits = 0
+        self.refresh_count = 0
+        self.last_refresh = None
+
+    @staticmethod
+    def _parse(values):
+        addresses, networks, raw = set(), [], set()
+        for value in values:
+            if value is None:
+                continue
+            value = value.strip()
+            raw.add(value)
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                logger.warning(f'ip_blacklist: некорректный адрес {value}, учитывается только точное совпадение')
+                continue
+            if network.num_addresses == 1:
+                addresses.add(network.network_address)
+            else:
+                networks.append(network)
+        return frozenset(addresses), tuple(networks), frozenset(raw)
+
+    async def refresh(self, pool=None):
+        pool = pool or self._pool
+        async with pool.acquire() as connection:
+            rows = await connection.fetch('SELECT ip_address FROM ip_blacklist')
+        self._addresses, self._networks, self._raw = self._parse(row.get('ip_address') for row in rows)
+        self.loaded = True
+        self.refresh_count += 1
+        self.last_refresh = datetime.now()
+        logger.debug(f'ip_blacklist: загружено адресов={len(self._addresses)}, подсетей={len(self._networks)}')
+
+    async def start(self, pool):
+        """ Первая загрузка; дальше список перечитывает notify_listener по NOTIFY и периодически """
+        self._pool = pool
+        await self.refresh()
+        notify_listener.subscribe(self._channel, 'ip_blacklist', self.refresh, self._refresh_interval)
+
+    def contains(self, ip) -> bool:
+        self.lookups += 1
+        found = self._match(ip)
+        if found:
+            self.hits += 1
+        return found
+
+    def _match(self, ip) -> bool:
+        if ip is None:
+            return False
+        if ip in self._raw:
+            return True
+        try:
+            address = ipaddress.ip_address(ip.strip())
+        except ValueError:
+            return False
+        if address in self._addresses:
+            return True
+        return any(address in network for network in self._networks)
+
+    def metrics(self) -> dict:
+        return dict(
+            loaded=self.loaded,
+            addresses=len(self._addresses),
+            networks=len(self._networks),
+            lookups=self.lookups,
+            hits=self.hits,
+            refresh_count=self.refresh_count,
+            last_refresh=self.last_refresh.strftime(FORMAT_DATE_TIME) if self.last_refresh is not None else None,
+            listening=notify_listener.listening,
+        )
+
+
+ip_blacklist = IpBlacklist()
@@ -0,0 +1,87 @@
+import gzip
+import json
+from datetime import datetime, date
+from decimal import Decimal
+
+from aiohttp import web
+from api_utils import ApiResponse
+from pydantic import BaseModel
+
+from settings import FORMAT_DATE, FORMAT_DATE_TIME, RESPONSE_ENCODER, RESPONSE_COMPRESSION
+
+try:
+    import orjson
+except ImportError:  # без orjson ответы кодируются стандартным json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # без brotli сжатие только gzip
+    brotli = None
+
+
+def default(obj):
+    """ Типы, которых нет в JSON: даты в форматах API, Decimal числом, модели pydantic словарем """
+    if isinstance(obj, datetime):
+        return obj.strftime(FORMAT_DATE_TIME)
+    if isinstance(obj, date):
+        return obj.strftime(FORMAT_DATE)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f'Тип {type(obj).__name__} не сериализуется в JSON')
+
+
+def dumps_json(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=default).encode()
+
+
+def dumps_orjson(obj) -> bytes:
+    # даты передаются в default, чтобы формат совпадал с convert_data, а не был ISO 8601
+    return orjson.dumps(obj, default=default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+ENCODERS = {'json': dumps_json}
+if orjson is not None:
+    ENCODERS['orjson'] = dumps_orjson
+
+dumps = ENCODERS.get(RESPONSE_ENCODER, dumps_json)
+
+_envelopes = {}
+
+
+def api_response(code, data=None) -> ApiResponse:
+    """
+    ApiResponse(code, data), у которого data кодируется через dumps.
+    Текст ответа берется из ApiResponse(code) один раз на код
+    """
+    response = ApiResponse(code)
+    envelope = _envelopes.get(code)
+    if envelope is None:
+        envelope = _envelopes[code] = json.loads(response.body)
+    response.body = dumps(dict(envelope, data=data))
+    return response
+
+
+def compress(request, response):
+    """
+    Сжатие тела ответа brotli или gzip по Accept-Encoding, если включено в RESPONSE_COMPRESSION
+    и тело не меньше RESPONSE_COMPRESSION['min_size'] байт. Уже сжатые ответы не изменяются
+    """
+    if not RESPONSE_COMPRESSION['enabled'] or not isinstance(response, web.Response):
+        return
+    body = response.body
+    if not isinstance(body, bytes) or len(body) < RESPONSE_COMPRESSION['min_size'] \
+            or 'Content-Encoding' in response.headers:
+        return
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accept_encoding:
+        response.body = brotli.compress(body, quality=RESPONSE_COMPRESSION['brotli_quality'])
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accept_encoding:
+        response.body = gzip.compress(body, compresslevel=RESPONSE_COMPRESSION['gzip_level'])
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return
+    response.headers['Vary'] = 'Accept-Encoding'
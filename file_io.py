@@ -0,0 +1,46 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from settings import FILE_IO_THREADS
+
+try:
+    from PIL import Image
+except ImportError:  # уменьшение фото необязательно, без Pillow файлы сохраняются как есть
+    Image = None
+
+executor = ThreadPoolExecutor(max_workers=FILE_IO_THREADS, thread_name_prefix='file_io')
+
+
+async def run(func, *args):
+    """ Выполнение блокирующей файловой операции в пуле потоков, не занимая event loop """
+    return await asyncio.get_event_loop().run_in_executor(executor, func, *args)
+
+
+def read_file(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as exc:
+            logger.warning(f'не удалось удалить файл {path}: {exc}')
+
+
+def downsize_image(path, max_side):
+    if Image is None or max_side is None:
+        return
+    try:
+        with Image.open(path) as image:
+            if max(image.size) <= max_side:
+                return
+            image_format = image.format
+            image.thumbnail((max_side, max_side))
+            image.save(path, format=image_format)
+    except Exception as exc:
+        logger.warning(f'не удалось уменьшить изображение {path}, сохранено без изменений: {exc}')
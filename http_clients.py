@@ -0,0 +1,79 @@
+import aiohttp
+from api_utils import ApiResponse
+from loguru import logger
+
+from settings import HTTP_CLIENTS
+
+
+class HttpClients:
+    """
+    Общие для приложения aiohttp.ClientSession, по одной на внешний сервис.
+    Создаются в on_start и закрываются в on_shutdown, соединения к сервису переиспользуются (keep-alive),
+    лимиты коннектора, кэш DNS и таймауты задаются для каждого сервиса в settings.HTTP_CLIENTS
+    """
+    PSS = 'pss'
+    KASSA = 'kassa'
+    ALFA_BANK = 'alfa_bank'
+    SMS = 'sms'
+    CALLBACK = 'callback'
+    WALLET = 'wallet'
+
+    _sessions = {}
+
+    @staticmethod
+    def _make_session(name) -> aiohttp.ClientSession:
+        params = HTTP_CLIENTS[name]
+        connector = aiohttp.TCPConnector(
+            limit=params['limit'],
+            limit_per_host=params['limit_per_host'],
+            keepalive_timeout=params['keepalive_timeout'],
+            ttl_dns_cache=params['ttl_dns_cache'],
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(total=params['total_timeout'], connect=params['connect_timeout'])
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    @classmethod
+    async def create(cls):
+        for name in HTTP_CLIENTS:
+            if name not in cls._sessions or cls._sessions[name].closed:
+                cls._sessions[name] = cls._make_session(name)
+        logger.debug(f'HttpClients: созданы сессии {list(cls._sessions)}')
+
+    @classmethod
+    def get(cls, name) -> aiohttp.ClientSession:
+        session = cls._sessions.get(name)
+        if session is None or session.closed:
+            # на случай использования вне жизненного цикла приложения (скрипты, тесты)
+            session = cls._sessions[name] = cls._make_session(name)
+        return session
+
+    @classmethod
+    async def close(cls):
+        for name, session in list(cls._sessions.items()):
+            try:
+                await session.close()
+            except Exception as exc:
+                logger.error(f'HttpClients: ошибка при закрытии сессии {name}: {exc}')
+        cls._sessions.clear()
+
+
+async def get_api_response_json(base_request, session, url, method, headers=None, params=None, json=None):
+    try:
+        if method.lower() == 'get':
+            response = await session.get(url, headers=headers, params=params, json=json)
+        elif method.lower() == 'post':
+            response = await session.post(url, headers=headers, params=params, json=json)
+        else:
+            raise NotImplementedError
+    except Exception as ex:
+        raise ApiResponse(31, exc=ex, log_message=f"не удалось выполнить запрос к партнёрскму сервису: "
+                                                  f"{method.upper()}: {url} : {ex}")
+    try:
+        response = await response.json()
+    except Exception as ex:
+        raise ApiResponse(90, exc=ex, log_message=f"не удалось распарсить json: {url}")
+    if response.get('responseCode') != 0:
+        raise ApiResponse(30, log_message=f"Ответ от стороннего сервиса не 0: {url} : "
+                                          f"responseCode = {response.get('responseCode')}")
+    return response.get('data')
@@ -1,12 +1,12 @@
 from json import JSONDecodeError
 from typing import Optional, Union
 
-import aiohttp
 from aiohttp import ClientError
 from api_utils import ApiResponse
 from pydantic import ValidationError, BaseModel, validator
 
 from auth_model import config
+from http_clients import HttpClients
 from kassa import InfoGetModel, RccPostModel, FreezePostModel, CollectPostModel
 from kassa.models import RedeemPutModel, UnfreezePostModel
 
@@ -46,26 +46,26 @@ class BaseKassaRequest:
 
     @classmethod
     async def _make_request(cls, method, params):
-        async with aiohttp.ClientSession() as session:
-            try:
-                if isinstance(params, dict):
-                    response = await session.__getattribute__(method)(
-                        cls.url,
-                        headers=cls.headers,
-                        **cls.make_request_params(method, params))
-                else:
-                    response = await session.__getattribute__(method)(
-                        cls.url,
-                        headers=cls.headers,
-                        **cls.make_request_params(method, params.dict(exclude_none=True)))
-                response_json = await response.json()
-                data = KassaResponse(**response_json)
-            except ValidationError as exc:
-                raise ApiResponse(30, exc=exc, log_message=response_json)
-            except (JSONDecodeError, ClientError)as exc:
-                raise ApiResponse(30, exc=exc)
-
-            return data.data
+        session = HttpClients.get(HttpClients.KASSA)
+        try:
+            if isinstance(params, dict):
+                response = await session.__getattribute__(method)(
+                    cls.url,
+                    headers=cls.headers,
+                    **cls.make_request_params(method, params))
+            else:
+                response = await session.__getattribute__(method)(
+                    cls.url,
+                    headers=cls.headers,
+                    **cls.make_request_params(method, params.dict(exclude_none=True)))
+            response_json = await response.json()
+            data = KassaResponse(**response_json)
+        except ValidationError as exc:
+            raise ApiResponse(30, exc=exc, log_message=response_json)
+        except (JSONDecodeError, ClientError)as exc:
+            raise ApiResponse(30, exc=exc)
+
+        return data.data
 
     @classmethod
     async def get(cls, params: input_get_model):
@@ -5,6 +5,7 @@ from aiohttp_session import get_session, new_session
 from api_utils import ApiResponse
 from loguru import logger
 
+import encoders
 import tools
 from settings import *
 from states import Context, Unauthorized, Authorized, Unconfirmed, Confirmed
@@ -36,29 +37,25 @@ async def auth_middleware(app, handler):  # NOQA
         # получаем сессию
         session = await get_session(request)
         state = Unauthorized()
+        # одним запросом: активность сессии, продление срока жизни, устройство, профиль
+        session_state = await tools.resolve_session(request)
         # если сессия есть и неактивна - создаём новую с новым моа сид
-        session_is_active = await tools.session_is_active(request)
-        if session_is_active is None:
+        if session_state.active is None:
             logger.error(f'middleware: сессии в БД нет с таким моа сид')
             await tools.renew_moa_in_coockie(request)
-        if not session_is_active:
+        if not session_state.active:
             logger.debug(f'middleware: сессия есть и неактивна')
             session.clear()
             raise ApiResponse(20)
-        await tools.update_lifetime_session(request)
-        # получаем данные профиля
-        await tools.get_dev_prof(request)
         user = User.get()
         phone = request.get('phone_number', None)
         with logger.contextualize(phone=phone):
-            # проверяем наличие устройств
-            have_devices = await tools.have_devices(request)
-            # проверяем наличие профилей
-            have_profile = await tools.have_profile(request)
+            have_devices = session_state.have_devices
+            have_profile = session_state.have_profile
             need_to_fill_profile = None
             if have_profile:
                 if not have_devices:
-                    need_to_fill_profile = await tools.check_need_to_fill_profile(request, None)
+                    need_to_fill_profile = session_state.need_to_fill_profile
                     if user.active and need_to_fill_profile:
                         state = Confirmed()
                     else:
@@ -104,6 +101,19 @@ async def context_middleware(_, handler):
     return middleware
 
 
+async def compression_middleware(_, handler):
+    async def middleware(request):
+        try:
+            response = await handler(request)
+        except web.HTTPException as exc:
+            encoders.compress(request, exc)
+            raise
+        encoders.compress(request, response)
+        return response
+
+    return middleware
+
+
 async def errors_middleware(app, handler):  # NOQA
 
     async def middleware(request):
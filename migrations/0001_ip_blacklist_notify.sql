@@ -0,0 +1,15 @@
+-- Уведомление экземпляров API об изменении ip_blacklist (см. blacklist.IpBlacklist)
+CREATE OR REPLACE FUNCTION notify_ip_blacklist_changed() RETURNS trigger AS
+$$
+BEGIN
+    PERFORM pg_notify('ip_blacklist_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ip_blacklist_changed ON ip_blacklist;
+CREATE TRIGGER ip_blacklist_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON ip_blacklist
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE notify_ip_blacklist_changed();
@@ -0,0 +1,15 @@
+-- Уведомление экземпляров API об изменении system_parameters (см. system_parameters.SystemParameters)
+CREATE OR REPLACE FUNCTION notify_system_parameters_changed() RETURNS trigger AS
+$$
+BEGIN
+    PERFORM pg_notify('system_parameters_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS system_parameters_changed ON system_parameters;
+CREATE TRIGGER system_parameters_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON system_parameters
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE notify_system_parameters_changed();
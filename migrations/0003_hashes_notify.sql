@@ -0,0 +1,15 @@
+-- Уведомление экземпляров API об изменении hashes (см. response_cache.ResponseCache)
+CREATE OR REPLACE FUNCTION notify_hashes_changed() RETURNS trigger AS
+$$
+BEGIN
+    PERFORM pg_notify('hashes_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS hashes_changed ON hashes;
+CREATE TRIGGER hashes_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON hashes
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE notify_hashes_changed();
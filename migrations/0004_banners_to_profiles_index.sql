@@ -0,0 +1,3 @@
+-- Проверка уже назначенных баннеров при назначении профилю (см. tools.assign_banners_to_profile)
+CREATE INDEX IF NOT EXISTS banners_to_profiles_profile_id_banner_id_idx
+    ON banners_to_profiles (profile_id, banner_id);
@@ -0,0 +1,4 @@
+-- Непрочитанные баннеры профиля: отметка прочтения и сверка счетчика (см. banner_counters.py)
+CREATE INDEX IF NOT EXISTS banners_to_profiles_unread_idx
+    ON banners_to_profiles (profile_id)
+    WHERE NOT read_banner;
@@ -0,0 +1,40 @@
+-- Хеш banners в hashes меняется при любом изменении данных ленты баннеров; через триггер hashes_changed
+-- (см. migrations/0003_hashes_notify.sql) экземпляры API перестраивают снимки ленты (см. tools_ext.BannersFeed)
+CREATE OR REPLACE FUNCTION touch_banners_hash() RETURNS trigger AS
+$$
+BEGIN
+    UPDATE hashes SET value = md5(clock_timestamp()::text) WHERE table_name = 'banners';
+    IF NOT FOUND THEN
+        INSERT INTO hashes (table_name, value, enabled) VALUES ('banners', md5(clock_timestamp()::text), true);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS banners_hash ON banners;
+CREATE TRIGGER banners_hash
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON banners
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE touch_banners_hash();
+
+DROP TRIGGER IF EXISTS banners_hash ON banner_translates;
+CREATE TRIGGER banners_hash
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON banner_translates
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE touch_banners_hash();
+
+DROP TRIGGER IF EXISTS banners_hash ON airport_banner;
+CREATE TRIGGER banners_hash
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON airport_banner
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE touch_banners_hash();
+
+DROP TRIGGER IF EXISTS banners_hash ON promotions;
+CREATE TRIGGER banners_hash
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON promotions
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE touch_banners_hash();
@@ -0,0 +1,7 @@
+-- Индексы для постраничной выдачи по курсору (created_date, id), см. utils.get_cursor:
+-- страница после курсора читается из индекса, а не отбрасыванием offset строк
+CREATE INDEX IF NOT EXISTS notifications_profile_id_created_date_id_idx
+    ON notifications (profile_id, created_date DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS orders_profile_id_created_date_id_idx
+    ON orders (profile_id, created_date DESC, id DESC);
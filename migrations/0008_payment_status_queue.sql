@@ -0,0 +1,18 @@
+-- Очередь сверки статусов оплаты в Альфа-Банке (см. payment_status.py)
+CREATE TABLE IF NOT EXISTS payment_status_queue
+(
+    bank_order_id   text PRIMARY KEY,
+    kind            text        NOT NULL DEFAULT 'order',
+    attempts        integer     NOT NULL DEFAULT 0,
+    next_attempt_at timestamptz NOT NULL DEFAULT now(),
+    locked_until    timestamptz,
+    done            boolean     NOT NULL DEFAULT false,
+    order_status    integer,
+    last_error      text,
+    created_date    timestamptz NOT NULL DEFAULT now(),
+    confirmed_date  timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS payment_status_queue_pending_idx
+    ON payment_status_queue (next_attempt_at)
+    WHERE NOT done;
@@ -0,0 +1,19 @@
+-- Состояние оплаты заказа (см. order_state.py); существующие заказы получают состояние по флагам
+ALTER TABLE orders
+    ADD COLUMN IF NOT EXISTS state            text        NOT NULL DEFAULT 'new',
+    ADD COLUMN IF NOT EXISTS state_changed_at timestamptz NOT NULL DEFAULT now();
+
+UPDATE orders
+SET state = CASE
+                WHEN processed THEN 'processed'
+                WHEN confirmed AND paid THEN 'paid'
+                WHEN confirmed THEN 'declined'
+                WHEN qr IS NOT NULL THEN 'awaiting_payment'
+                ELSE 'new'
+    END
+WHERE state = 'new';
+
+ALTER TABLE orders
+    DROP CONSTRAINT IF EXISTS orders_state_check,
+    ADD CONSTRAINT orders_state_check
+        CHECK (state IN ('new', 'registering', 'awaiting_payment', 'paid', 'declined', 'processing', 'processed'));
@@ -0,0 +1,60 @@
+-- Счетчик profiles.unread_banners_count поддерживается триггером по изменениям banners_to_profiles
+-- (любые пути записи, в том числе в обход API); banner_counters.py только сверяет его на случай расхождений
+CREATE OR REPLACE FUNCTION banners_to_profiles_unread_count() RETURNS trigger AS
+$$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE profiles p
+        SET unread_banners_count = coalesce(p.unread_banners_count, 0) + delta.unread
+        FROM (SELECT profile_id, count(*) AS unread
+              FROM new_rows
+              WHERE NOT read_banner
+              GROUP BY profile_id) delta
+        WHERE p.id = delta.profile_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE profiles p
+        SET unread_banners_count = greatest(coalesce(p.unread_banners_count, 0) - delta.unread, 0)
+        FROM (SELECT profile_id, count(*) AS unread
+              FROM old_rows
+              WHERE NOT read_banner
+              GROUP BY profile_id) delta
+        WHERE p.id = delta.profile_id;
+    ELSE
+        UPDATE profiles p
+        SET unread_banners_count = greatest(coalesce(p.unread_banners_count, 0) + delta.unread, 0)
+        FROM (SELECT profile_id, sum(change) AS unread
+              FROM (SELECT profile_id, 1 AS change FROM new_rows WHERE NOT read_banner
+                    UNION ALL
+                    SELECT profile_id, -1 FROM old_rows WHERE NOT read_banner) changes
+              GROUP BY profile_id
+              HAVING sum(change) <> 0) delta
+        WHERE p.id = delta.profile_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- таблицы переходов задаются только для триггера на одно событие, поэтому триггеров три
+DROP TRIGGER IF EXISTS banners_to_profiles_unread_insert ON banners_to_profiles;
+CREATE TRIGGER banners_to_profiles_unread_insert
+    AFTER INSERT
+    ON banners_to_profiles
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE banners_to_profiles_unread_count();
+
+DROP TRIGGER IF EXISTS banners_to_profiles_unread_delete ON banners_to_profiles;
+CREATE TRIGGER banners_to_profiles_unread_delete
+    AFTER DELETE
+    ON banners_to_profiles
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE banners_to_profiles_unread_count();
+
+DROP TRIGGER IF EXISTS banners_to_profiles_unread_update ON banners_to_profiles;
+CREATE TRIGGER banners_to_profiles_unread_update
+    AFTER UPDATE
+    ON banners_to_profiles
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE banners_to_profiles_unread_count();
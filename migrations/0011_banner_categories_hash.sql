@@ -0,0 +1,21 @@
+-- Хеш banner_categories в hashes меняется при любом изменении переводов категорий баннеров; через триггер
+-- hashes_changed (см. migrations/0003_hashes_notify.sql) меняются ключи пространства banner_categories общего кэша
+-- (см. shared_cache.CacheNamespace, tools.get_categories)
+CREATE OR REPLACE FUNCTION touch_banner_categories_hash() RETURNS trigger AS
+$$
+BEGIN
+    UPDATE hashes SET value = md5(clock_timestamp()::text) WHERE table_name = 'banner_categories';
+    IF NOT FOUND THEN
+        INSERT INTO hashes (table_name, value, enabled)
+        VALUES ('banner_categories', md5(clock_timestamp()::text), true);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS banner_categories_hash ON banner_categories_translate;
+CREATE TRIGGER banner_categories_hash
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON banner_categories_translate
+    FOR EACH STATEMENT
+EXECUTE PROCEDURE touch_banner_categories_hash();
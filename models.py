@@ -52,3 +52,4 @@ class OrderModel(BaseModel):
     expiration_date: Union[datetime, None]
     processed: Union[bool, None] = False
     uuid_relation: Union[str, None]
+    state: Union[str, None]
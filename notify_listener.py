@@ -0,0 +1,91 @@
+import asyncio
+from asyncio import CancelledError
+
+import asyncpg
+from loguru import logger
+
+
+class Subscription:
+    __slots__ = ('channel', 'name', 'refresh', 'refresh_interval', 'on_error')
+
+    def __init__(self, channel, name, refresh, refresh_interval, on_error=None):
+        self.channel = channel
+        self.name = name
+        self.refresh = refresh
+        self.refresh_interval = refresh_interval
+        self.on_error = on_error
+
+
+class NotifyListener:
+    """
+    Одно LISTEN-соединение процесса для всех данных, перечитываемых по NOTIFY (ip_blacklist, system_parameters,
+    response_cache). Подписчик передает канал и корутину refresh(): она вызывается по NOTIFY из канала
+    и дополнительно раз в refresh_interval секунд, на случай потери LISTEN-соединения.
+    Ошибка refresh записывается в лог, затем вызывается on_error(exc), если он задан
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+        self._connection = None
+        self._tasks = []
+
+    def subscribe(self, channel, name, refresh, refresh_interval, on_error=None):
+        """ Подписки регистрируются до start; name - имя подписчика для логов """
+        self._subscriptions.append(Subscription(channel, name, refresh, refresh_interval, on_error))
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None
+
+    async def _safe_refresh(self, subscription):
+        try:
+            await subscription.refresh()
+        except CancelledError:
+            raise
+        except Exception as exc:
+            logger.error(f'{subscription.name}: не удалось обновить данные по {subscription.channel}: {exc}')
+            if subscription.on_error is not None:
+                subscription.on_error(exc)
+
+    def _listener(self, subscription):
+        def on_notify(connection, pid, channel, payload):  # NOQA
+            asyncio.ensure_future(self._safe_refresh(subscription))
+        return on_notify
+
+    async def _refresh_periodically(self, subscription):
+        while True:
+            await asyncio.sleep(subscription.refresh_interval)
+            await self._safe_refresh(subscription)
+
+    async def start(self, **connect_settings):
+        channels = sorted({subscription.channel for subscription in self._subscriptions})
+        try:
+            self._connection = await asyncpg.connect(**connect_settings)
+            for subscription in self._subscriptions:
+                await self._connection.add_listener(subscription.channel, self._listener(subscription))
+        except CancelledError:
+            raise
+        except Exception as exc:
+            await self._close()
+            logger.error(f'notify_listener: LISTEN {", ".join(channels)} недоступен, только периодическое обновление: '
+                         f'{exc}')
+        self._tasks = [asyncio.ensure_future(self._refresh_periodically(subscription))
+                       for subscription in self._subscriptions]
+
+    async def _close(self):
+        if self._connection is not None:
+            try:
+                await self._connection.close()
+            except Exception as exc:
+                logger.error(f'notify_listener: ошибка при закрытии LISTEN-соединения: {exc}')
+            self._connection = None
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self._close()
+        self._subscriptions.clear()
+
+
+notify_listener = NotifyListener()
@@ -0,0 +1,64 @@
+"""
+Состояния оплаты заказа (orders.state, см. migrations/0009_orders_state.sql).
+
+    new -> registering -> awaiting_payment -> paid / declined -> processing -> processed
+                      \\-> paid / declined (Apple Pay, Google Pay)
+
+registering и processing - захват заказа на время запросов в банк и кассу: соединение с БД на это время
+освобождается, а повторная оплата или повторное начисление миль того же заказа не проходят.
+Захват, не завершенный за ORDER_STATE_LEASE секунд (упавший запрос), может быть взят снова
+"""
+from typing import Optional
+
+from asyncpg import Record
+
+from settings import ORDER_STATE_LEASE
+
+NEW = 'new'
+REGISTERING = 'registering'
+AWAITING_PAYMENT = 'awaiting_payment'
+PAID = 'paid'
+DECLINED = 'declined'
+PROCESSING = 'processing'
+PROCESSED = 'processed'
+
+# состояние -> из каких состояний в него можно перейти
+TRANSITIONS = {
+    REGISTERING: (NEW, AWAITING_PAYMENT),
+    AWAITING_PAYMENT: (REGISTERING,),
+    PAID: (REGISTERING, AWAITING_PAYMENT),
+    DECLINED: (REGISTERING, AWAITING_PAYMENT),
+    PROCESSING: (PAID, DECLINED),
+    PROCESSED: (PROCESSING,),
+}
+
+CLAIMS = (REGISTERING, PROCESSING)
+
+KEYS = ('id', 'qr')
+
+
+def confirmed(paid) -> str:
+    """ Состояние подтвержденного банком заказа """
+    return PAID if paid else DECLINED
+
+
+async def advance(connection, key_value, target, sources=None, key='id', **columns) -> Optional[Record]:
+    """
+    Переводит заказ в target, если его текущее состояние входит в sources (по умолчанию TRANSITIONS[target]),
+    и записывает columns в те же колонки orders. Возвращает строку заказа после перехода или None,
+    если переход недопустим (заказ уже в другом состоянии или захвачен другим запросом)
+    """
+    if key not in KEYS:
+        raise ValueError(f'заказ ищется только по {KEYS}')
+    args = [key_value, target, list(TRANSITIONS[target] if sources is None else sources)]
+    condition = 'state = any($3::text[])'
+    if target in CLAIMS:
+        args.append(ORDER_STATE_LEASE)
+        condition += f' or (state = $2 and state_changed_at < now() - make_interval(secs => ${len(args)}))'
+    assignments = ''
+    for name, value in sorted(columns.items()):
+        args.append(value)
+        assignments += f', {name} = ${len(args)}'
+    return await connection.fetchrow(
+        f'update orders set state = $2, state_changed_at = now(){assignments} '
+        f'where {key} = $1 and ({condition}) returning *', *args)
@@ -0,0 +1,250 @@
+import asyncio
+from asyncio import CancelledError
+from datetime import datetime
+
+from loguru import logger
+
+import alfa_bank
+from settings import PAYMENT_STATUS, FORMAT_DATE_TIME
+
+ORDER = 'order'
+
+ENQUEUE_QUERY = '''
+insert into payment_status_queue (bank_order_id, kind, next_attempt_at)
+values ($1, $2, now() + make_interval(secs => $3))
+on conflict (bank_order_id) do update
+    set next_attempt_at = case
+                              when payment_status_queue.done then excluded.next_attempt_at
+                              else least(payment_status_queue.next_attempt_at, excluded.next_attempt_at) end,
+        attempts        = case when payment_status_queue.done then 0 else payment_status_queue.attempts end,
+        done            = false
+-- снятая с очереди после max_attempts строка (done без order_status) открывается заново
+where not payment_status_queue.done
+   or payment_status_queue.order_status is null
+'''
+
+ENQUEUE_ORDER_QUERY = '''
+insert into payment_status_queue (bank_order_id, kind)
+select $1, $2
+where exists(select 1 from orders where qr = $1 and not coalesce(confirmed, false))
+on conflict (bank_order_id) do update
+    set next_attempt_at = now(),
+        attempts        = case when payment_status_queue.done then 0 else payment_status_queue.attempts end,
+        done            = false
+where not payment_status_queue.done
+   or payment_status_queue.order_status is null
+'''
+
+CLAIM_QUERY = '''
+update payment_status_queue
+set locked_until = now() + make_interval(secs => $2),
+    attempts     = attempts + 1
+where bank_order_id in (select bank_order_id
+                        from payment_status_queue
+                        where not done
+                          and next_attempt_at <= now()
+                          and (locked_until is null or locked_until < now())
+                        order by next_attempt_at
+                        limit $1 for update skip locked)
+returning bank_order_id, kind, attempts
+'''
+
+RETRY_QUERY = '''
+update payment_status_queue
+set next_attempt_at = now() + make_interval(secs => $2),
+    locked_until    = null,
+    done            = $3,
+    last_error      = $4
+where bank_order_id = $1
+'''
+
+DONE_QUERY = '''
+update payment_status_queue
+set done = true, locked_until = null, order_status = $2, confirmed_date = now(), last_error = null
+where bank_order_id = $1
+'''
+
+
+async def poll_status(bank_order_id, attempts=None, raise_api_response=True):
+    """
+    Статус заказа в Альфа-Банке с повторами, пока банк отвечает orderStatus=0 (заказ зарегистрирован, но не оплачен).
+    Пауза между запросами растет вдвое, начиная с PAYMENT_STATUS['poll_delay'].
+    Соединение с БД на время ожидания держать не нужно
+    """
+    attempts = PAYMENT_STATUS['poll_attempts'] if attempts is None else attempts
+    delay = PAYMENT_STATUS['poll_delay']
+    confirmation_data = None
+    for attempt in range(attempts):
+        if attempt:
+            await asyncio.sleep(delay)
+            delay *= 2
+        confirmation_data = await alfa_bank.GetOrderStatusExtended.post(
+            alfa_bank.GetOrderStatusExtended.input_post_model(orderId=bank_order_id),
+            raise_api_response=raise_api_response)
+        if confirmation_data is not None and confirmation_data.order_status != 0:
+            break
+    return confirmation_data
+
+
+class PaymentStatusWorker:
+    """
+    Фоновая сверка статусов оплаты в Альфа-Банке.
+    Очередь ожидающих заказов хранится в payment_status_queue (см. migrations/0008_payment_status_queue.sql), поэтому
+    переживает перезапуск и общая для всех экземпляров API: строки забираются через for update skip locked
+    и блокируются на PAYMENT_STATUS['lease'] секунд. Пока банк отвечает orderStatus=0, запрос повторяется
+    с экспоненциально растущей паузой, после PAYMENT_STATUS['max_attempts'] попыток заказ снимается с очереди.
+    Окончательный статус передается обработчику, зарегистрированному для вида заказа (register)
+    """
+
+    def __init__(self, settings=None):
+        self._settings = settings or PAYMENT_STATUS
+        self._handlers = {}
+        self._waiters = {}
+        self._pool = None
+        self._task = None
+        self._wakeup = None
+        self.checks = 0
+        self.confirmed = 0
+        self.expired = 0
+        self.errors = 0
+        self.last_run = None
+
+    def register(self, kind, handler):
+        """ handler(bank_order_id, confirmation_data) - корутина, применяющая окончательный статус оплаты """
+        self._handlers[kind] = handler
+
+    def backoff(self, attempts) -> float:
+        return min(self._settings['base_delay'] * 2 ** max(attempts - 1, 0), self._settings['max_delay'])
+
+    async def enqueue(self, connection, bank_order_id, kind=ORDER, delay=0):
+        """
+        Ставит заказ в очередь с первой проверкой через delay секунд; повторная постановка не создает дубликатов
+        и только приближает проверку. Заказ, снятый с очереди после max_attempts попыток, ставится заново
+        """
+        await connection.execute(ENQUEUE_QUERY, bank_order_id, kind, delay)
+        if not delay:
+            self._wake()
+
+    async def enqueue_order_redirect(self, connection, bank_order_id):
+        """ Возврат клиента со страницы банка: в очередь попадает только известный неподтвержденный заказ """
+        await connection.execute(ENQUEUE_ORDER_QUERY, bank_order_id, ORDER)
+        self._wake()
+
+    async def wait(self, bank_order_id, timeout=None, before=None):
+        """
+        Ждет ближайшей проверки заказа этим экземпляром (не дольше timeout секунд).
+        before() - корутина, выполняемая после регистрации ожидания (например, постановка в очередь).
+        Возвращает результат обработчика, если статус окончательный, иначе None
+        """
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(bank_order_id, []).append(future)
+        try:
+            if before is not None:
+                await before()
+            return await asyncio.wait_for(asyncio.shield(future),
+                                          self._settings['confirm_wait'] if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(bank_order_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(bank_order_id, None)
+
+    async def check_now(self, bank_order_id, kind=ORDER, timeout=None):
+        """
+        Внеочередная проверка заказа с ожиданием результата (см. wait). Ожидание регистрируется до постановки
+        в очередь: иначе проверка, завершившаяся раньше, чем запрос начал ждать, осталась бы незамеченной
+        """
+        async def enqueue():
+            async with self._pool.acquire() as connection:
+                await self.enqueue(connection, bank_order_id, kind)
+
+        return await self.wait(bank_order_id, timeout, before=enqueue)
+
+    def _resolve(self, bank_order_id, result=None):
+        for future in self._waiters.pop(bank_order_id, []):
+            if not future.done():
+                future.set_result(result)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _check(self, bank_order_id, kind, attempts):
+        self.checks += 1
+        result = None
+        try:
+            confirmation_data = await alfa_bank.GetOrderStatusExtended.post(
+                alfa_bank.GetOrderStatusExtended.input_post_model(orderId=bank_order_id))
+            order_status = confirmation_data.order_status
+            if order_status == 0:
+                await self._retry(bank_order_id, attempts, None)
+                return
+            result = await self._handlers[kind](bank_order_id, confirmation_data)
+            async with self._pool.acquire() as connection:
+                await connection.execute(DONE_QUERY, bank_order_id, order_status)
+            self.confirmed += 1
+        except CancelledError:
+            raise
+        except Exception as exc:
+            self.errors += 1
+            logger.error(f'payment_status: ошибка проверки заказа {bank_order_id}: {exc}')
+            await self._retry(bank_order_id, attempts, str(exc))
+        finally:
+            self._resolve(bank_order_id, result)
+
+    async def _retry(self, bank_order_id, attempts, error):
+        expired = attempts >= self._settings['max_attempts']
+        if expired:
+            self.expired += 1
+            logger.warning(f'payment_status: заказ {bank_order_id} снят с очереди после {attempts} попыток')
+        async with self._pool.acquire() as connection:
+            await connection.execute(RETRY_QUERY, bank_order_id, self.backoff(attempts), expired, error)
+
+    async def run_once(self) -> int:
+        async with self._pool.acquire() as connection:
+            items = await connection.fetch(CLAIM_QUERY, self._settings['batch_size'], self._settings['lease'])
+        # соединение освобождено: запросы в банк выполняются без него
+        await asyncio.gather(*(self._check(item['bank_order_id'], item['kind'], item['attempts']) for item in items))
+        self.last_run = datetime.now()
+        return len(items)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.run_once() >= self._settings['batch_size']:
+                    continue
+            except CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f'payment_status: ошибка обработки очереди: {exc}')
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._settings['interval'])
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, pool):
+        self._pool = pool
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def metrics(self) -> dict:
+        return dict(
+            checks=self.checks,
+            confirmed=self.confirmed,
+            expired=self.expired,
+            errors=self.errors,
+            waiting_requests=sum(len(waiters) for waiters in self._waiters.values()),
+            last_run=self.last_run.strftime(FORMAT_DATE_TIME) if self.last_run is not None else None,
+        )
+
+
+payment_status_worker = PaymentStatusWorker()
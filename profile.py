@@ -8,6 +8,7 @@ from pydantic import BaseModel, EmailStr, ValidationError
 
 from queries import UPDATE_PROFILE_QUERY_SEARCH_PROFILE_BY_UIID
 from settings import POOL, FORMAT_DATE
+from system_parameters import system_parameters
 from tools import generate_uuid5, generate_new_pqr, date_now
 
 
@@ -119,8 +120,7 @@ WHERE id = (SELECT profile_id FROM sessions WHERE sid = $7);
             try:
                 if profile_query_result is not None:
                     profile = Profile(**profile_query_result)
-                    _time_interval = await connection.fetchval(''' select value from system_parameters 
-                                                                where name=$1''', 'timeout_email')
+                    _time_interval = system_parameters.timeout_email
                     if profile.resend_confirmation_email_date is not None:
                         profile.resend_confirmation_email_date = profile.resend_confirmation_email_date + timedelta(seconds=int(_time_interval))
                 else:
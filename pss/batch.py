@@ -0,0 +1,153 @@
+import asyncio
+import math
+from asyncio import CancelledError
+from collections import deque
+
+from api_utils import ApiResponse
+from loguru import logger
+
+from auth_model import config
+from http_clients import HttpClients, get_api_response_json
+from pss.decode import parse
+from settings import PSS_BATCH
+
+_semaphores = {}
+
+
+def get_semaphore(upstream) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(upstream)
+    if semaphore is None:
+        semaphore = _semaphores[upstream] = asyncio.Semaphore(PSS_BATCH['concurrency'])
+    return semaphore
+
+
+def make_deadline(timeout=None) -> float:
+    """ Момент (по часам event loop), после которого незавершенные запросы пакета отменяются """
+    return asyncio.get_event_loop().time() + (PSS_BATCH['deadline'] if timeout is None else timeout)
+
+
+async def gather_bounded(coros, upstream=HttpClients.PSS, deadline=None) -> list:
+    """
+    Выполняет корутины, одновременно не более PSS_BATCH['concurrency'] на upstream (лимит общий для процесса).
+    Возвращает результаты в порядке coros; для завершившихся ошибкой или не успевших к deadline - None.
+    Лимит учитывается для переданных корутин, вложенные в них запросы его не занимают
+    """
+    coros = list(coros)
+    if not coros:
+        return []
+    deadline = make_deadline() if deadline is None else deadline
+    semaphore = get_semaphore(upstream)
+
+    async def run(coro):
+        try:
+            async with semaphore:
+                return await coro
+        finally:
+            # корутина, не дождавшаяся семафора до отмены, закрывается без предупреждения "never awaited"
+            coro.close()
+
+    tasks = [asyncio.ensure_future(run(coro)) for coro in coros]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - asyncio.get_event_loop().time()))
+    except CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f'{upstream}: {len(pending)} из {len(tasks)} запросов не завершились до deadline')
+
+    results = []
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is None:
+            results.append(task.result())
+            continue
+        if task in done and not task.cancelled():
+            logger.error(f'{upstream}: запрос пакета завершился ошибкой: {task.exception()}')
+        results.append(None)
+    return results
+
+
+async def fetch_orders(request, qr_codes, deadline=None) -> dict:
+    """
+    Заказы PSS по списку qr: {qr: order}. Заказы, которые не удалось получить до deadline, в результат не попадают.
+    Если PSS_BATCH['bulk_orders'], заказы запрашиваются списком через seller/orders, иначе по одному через seller/order
+    """
+    qr_codes = list(dict.fromkeys(qr for qr in qr_codes if qr is not None))
+    session = HttpClients.get(HttpClients.PSS)
+    headers = {'Authorization': f'Bearer {config.pss_service.token}'}
+    orders = dict()
+
+    if PSS_BATCH['bulk_orders']:
+        url = config.pss_service.url + 'seller/orders'
+        size = PSS_BATCH['bulk_size']
+        chunks = [qr_codes[i:i + size] for i in range(0, len(qr_codes), size)]
+        responses = await gather_bounded(
+            (get_api_response_json(request, session, url, 'get', headers,
+                                   params={'qr_codes': ','.join(chunk), 'limit': len(chunk)})
+             for chunk in chunks),
+            deadline=deadline)
+        for data in responses:
+            for order in (data or {}).get('orders', []):
+                orders[order.get('qr')] = order
+        return orders
+
+    url = config.pss_service.url + 'seller/order'
+    responses = await gather_bounded(
+        (get_api_response_json(request, session, url, 'get', headers, params={'qr': qr})
+         for qr in qr_codes),
+        deadline=deadline)
+    for qr, data in zip(qr_codes, responses):
+        if data is not None:
+            orders[qr] = data['order']
+    return orders
+
+
+async def iter_pages(request_cls, params, model, items_key='orders', limit=None, window=None):
+    """
+    Страницы списка PSS (request_cls.pss_get с limit/offset), разобранные в model, по порядку.
+    После первой страницы следующие запрашиваются одновременно, не более window сразу и в пределах
+    общего лимита PSS_BATCH['concurrency']. Если PSS вернул total_count, запрашиваются только нужные страницы,
+    иначе окно заполняется наугад до первой неполной страницы. Каждая страница разбирается по получении,
+    пока остальные еще в пути
+    """
+    limit = PSS_BATCH['page_size'] if limit is None else limit
+    window = PSS_BATCH['page_window'] if window is None else window
+    semaphore = get_semaphore(HttpClients.PSS)
+
+    async def fetch(number):
+        async with semaphore:
+            response = await request_cls.pss_get(params.copy(update=dict(limit=limit, offset=number * limit)))
+        if response.code != 0:
+            logger.error(f'ответ партнёрского сервиса не 0 а {response.code}')
+            raise ApiResponse(30)
+        data = response.data or {}
+        return data, len(data.get(items_key) or []), parse(model, data)
+
+    data, count, page = await fetch(0)
+    yield page
+    total = data.get('total_count')
+    last = math.ceil(total / limit) if total is not None else None
+    if last is None and count < limit:
+        return
+
+    pending = deque()
+    next_number = 1
+    try:
+        while True:
+            while len(pending) < window and (last is None or next_number < last):
+                pending.append(asyncio.ensure_future(fetch(next_number)))
+                next_number += 1
+            if not pending:
+                return
+            _, count, page = await pending.popleft()
+            yield page
+            if last is None and count < limit:
+                return
+    finally:
+        # лишние страницы окна и страницы, не понадобившиеся после ошибки, отменяются; ошибки уже завершившихся
+        # страниц забираются, чтобы asyncio не сообщал "Task exception was never retrieved"
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,128 @@
+import asyncio
+import copy
+import time
+from asyncio import CancelledError
+from collections import OrderedDict
+
+from loguru import logger
+
+from auth_model import config
+from http_clients import HttpClients, get_api_response_json
+from settings import PSS_CATALOG_CACHE
+from shared_cache import shared_cache
+
+
+class AsyncTtlCache:
+    """
+    Кэш результатов корутин в памяти процесса: TTL, вытеснение давно не использованных (LRU) при превышении max_size,
+    один запрос к источнику на ключ при одновременных промахах (single-flight).
+    В течение stale_ttl после истечения ttl отдается устаревшее значение, а обновление запускается в фоне.
+    Значения отдаются копиями, поэтому вызывающий код может их изменять
+    """
+
+    def __init__(self, name, ttl, stale_ttl=0, max_size=1000):
+        self._name = name
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key, loader):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, created = entry
+            age = time.monotonic() - created
+            if age < self._ttl + self._stale_ttl:
+                self._entries.move_to_end(key)
+                if age < self._ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self._load_in_background(key, loader)
+                return copy.deepcopy(value)
+        self.misses += 1
+        return copy.deepcopy(await asyncio.shield(self._load(key, loader)))
+
+    def _load(self, key, loader) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._fetch(key, loader))
+        return future
+
+    async def _fetch(self, key, loader):
+        try:
+            value = await loader()
+        except CancelledError:
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return value
+
+    def _load_in_background(self, key, loader):
+        if key in self._inflight:
+            return
+        future = self._load(key, loader)
+        future.add_done_callback(self._log_background_error)
+
+    def _log_background_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f'{self._name}: не удалось обновить значение в фоне: {future.exception()}')
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def metrics(self) -> dict:
+        return dict(
+            entries=len(self._entries),
+            hits=self.hits,
+            stale_hits=self.stale_hits,
+            misses=self.misses,
+            errors=self.errors,
+        )
+
+
+pss_catalog = AsyncTtlCache('pss_catalog', **PSS_CATALOG_CACHE)
+# общий для процессов уровень под pss_catalog: память процесса уже в pss_catalog, поэтому здесь только Redis
+pss_catalog_shared = shared_cache.namespace('pss_catalog', PSS_CATALOG_CACHE['ttl'], local_ttl=0)
+pss_catalog_shared.on_invalidate(lambda key: pss_catalog.invalidate())
+
+CATALOG_PATHS = {
+    'stock': 'seller/stock',
+    'point': 'seller/point',
+    'brand': 'seller/brand',
+}
+
+
+async def get_catalog_object(request, kind, language_code, **params) -> dict:
+    """
+    Объект справочника PSS (kind - ключ CATALOG_PATHS) через pss_catalog.
+    Ключ кэша - (kind, language_code, params), ответ - data из ответа PSS
+    """
+    key = (kind, language_code, *sorted(params.items()))
+    url = config.pss_service.url + CATALOG_PATHS[kind]
+    headers = {'Authorization': f'Bearer {config.pss_service.token}'}
+
+    async def fetch():
+        logger.info(f'запрос на url {url}, params: {params}')
+        return await get_api_response_json(request, HttpClients.get(HttpClients.PSS), url, 'get', headers,
+                                           params=dict(params, language_code=language_code))
+
+    async def load():
+        return await pss_catalog_shared.get(':'.join(str(part) for part in key), fetch)
+
+    return await pss_catalog.get(key, load)
@@ -0,0 +1,89 @@
+"""
+Разбор ответов PSS без проверки типов (PSS_TRUSTED_DECODE).
+
+Ответ раскладывается по классам со __slots__, построенным по полям моделей pydantic: те же имена и псевдонимы
+(Config.fields), значения по умолчанию и вложенные модели, но без приведения типов - даты остаются строками,
+числа и строки берутся как пришли. Соответствие ответов PSS моделям проверяет Test_contract/test_pss_contract.py
+на записанных ответах; полная проверка конкретного ответа доступна через validate()
+"""
+import copy
+from typing import Any, Dict
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+
+from settings import PSS_TRUSTED_DECODE
+
+_MISSING = object()
+
+
+class TrustedRecord:
+    __slots__ = ('_raw',)
+    _model = None
+    # (имя, ключ в ответе, значение по умолчанию, фабрика значения по умолчанию, класс вложенной записи, список)
+    _fields = ()
+
+    def __init__(self, raw: dict):
+        self._raw = raw
+        for name, alias, default, default_factory, nested, many in self._fields:
+            value = raw.get(alias, _MISSING)
+            if value is _MISSING:
+                value = default_factory() if default_factory is not None else copy.copy(default)
+            elif nested is not None and value is not None:
+                value = [nested(item) for item in value] if many else nested(value)
+            setattr(self, name, value)
+
+    def dict(self) -> dict:
+        return {name: _plain(getattr(self, name)) for name, *_ in self._fields}
+
+    def validate(self) -> BaseModel:
+        """ Модель pydantic из исходного ответа, с полной проверкой """
+        return self._model(**self._raw)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name, *_ in self._fields)
+        return f'{type(self).__name__}({fields})'
+
+
+def _plain(value):
+    if isinstance(value, TrustedRecord):
+        return value.dict()
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+_records: Dict[type, type] = {}
+
+
+def record_class(model) -> type:
+    """ Класс записи для модели pydantic; строится один раз на модель """
+    record = _records.get(model)
+    if record is not None:
+        return record
+    fields = []
+    for name, field in model.__fields__.items():
+        nested = many = None
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel) \
+                and field.shape in (SHAPE_SINGLETON, SHAPE_LIST):
+            nested = record_class(field.type_)
+            many = field.shape == SHAPE_LIST
+        fields.append((name, field.alias, field.default, field.default_factory, nested, bool(many)))
+    record = _records[model] = type(f'{model.__name__}Record', (TrustedRecord,), {
+        '__slots__': tuple(name for name, *_ in fields),
+        '_model': model,
+        '_fields': tuple(fields),
+    })
+    return record
+
+
+def decode(model, data: dict) -> Any:
+    """ Ответ PSS без проверки, в записи record_class(model) """
+    return record_class(model)(data)
+
+
+def parse(model, data: dict) -> Any:
+    """ Ответ PSS в модели model: с проверкой pydantic или, при PSS_TRUSTED_DECODE, через decode """
+    if PSS_TRUSTED_DECODE:
+        return decode(model, data)
+    return model(**data)
@@ -0,0 +1,233 @@
+import asyncio
+import copy
+import time
+from asyncio import CancelledError
+from typing import Optional
+
+from aiohttp import web
+from loguru import logger
+
+import encoders
+from auth_model import config
+from http_clients import HttpClients
+from settings import PRODUCT_CATALOG
+from shared_cache import shared_cache
+
+
+class ProductsSnapshot:
+    """
+    Все продукты PSS на одном языке. Готовые тела ответов (bytes) запоминаются по фильтру и странице,
+    не более PRODUCT_CATALOG['max_bodies'] на снимок
+    """
+
+    def __init__(self, products, message, etag=None):
+        self.products = products
+        self.message = message
+        self.etag = etag
+        self.loaded = time.monotonic()
+        self.by_id = {product.get('id'): product for product in products}
+        self.by_point = {}
+        for product in products:
+            for point_id in product.get('points') or ():
+                self.by_point.setdefault(point_id, []).append(product)
+        self._bodies = {}
+
+    def _body(self, key, data) -> bytes:
+        body = self._bodies.get(key)
+        if body is None:
+            body = encoders.dumps({'responseCode': 0, 'responseMessage': self.message, 'data': data})
+            if len(self._bodies) < PRODUCT_CATALOG['max_bodies']:
+                self._bodies[key] = body
+        return body
+
+    def list_body(self, point_id=None, limit=None, offset=0) -> bytes:
+        """ Тело ответа seller/products: продукты точки point_id (или все) со страницей limit/offset, как в PSS """
+        limit = PRODUCT_CATALOG['default_limit'] if limit is None else limit
+        products = self.products if point_id is None else self.by_point.get(point_id, [])
+        return self._body(('list', point_id, limit, offset), {'products': products[offset:offset + limit]})
+
+    def list(self, point_id=None, limit=None, offset=0) -> list:
+        limit = PRODUCT_CATALOG['default_limit'] if limit is None else limit
+        products = self.products if point_id is None else self.by_point.get(point_id, [])
+        # копии: вызывающий код дополняет и форматирует продукты
+        return copy.deepcopy(products[offset:offset + limit])
+
+    def product_body(self, product_id) -> Optional[bytes]:
+        """ Тело ответа seller/product; None, если продукта нет в снимке """
+        product = self.by_id.get(product_id)
+        if product is None:
+            return None
+        return self._body(('product', product_id), {'product': product})
+
+
+class ProductCatalog:
+    """
+    Каталог продуктов PSS в памяти процесса, по снимку на язык.
+    Снимок перечитывается не чаще раза в PRODUCT_CATALOG['ttl'] секунд одним запросом на язык (single-flight),
+    остальные запросы в это время получают прежний снимок; если PSS отдал ETag, перечитывание идет
+    с If-None-Match и при 304 снимок остается прежним. Снимок старше ttl + stale_ttl не отдается:
+    запрос ждет перечитывания. Загруженный каталог кладется в общий кэш (shared_cache, пространство products),
+    и остальные процессы API берут его оттуда, а не из PSS
+    """
+    PATH = 'seller/products'
+
+    def __init__(self):
+        self._shared = shared_cache.namespace('products', PRODUCT_CATALOG['ttl'], local_ttl=0)
+        self._shared.on_invalidate(self.invalidate)
+        self._snapshots = {}
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    async def get(self, language_code) -> ProductsSnapshot:
+        snapshot = self._snapshots.get(language_code)
+        if snapshot is not None:
+            age = time.monotonic() - snapshot.loaded
+            if age < PRODUCT_CATALOG['ttl']:
+                self.hits += 1
+                return snapshot
+            if age < PRODUCT_CATALOG['ttl'] + PRODUCT_CATALOG['stale_ttl']:
+                self.stale_hits += 1
+                if language_code not in self._inflight:
+                    self._refresh(language_code).add_done_callback(self._log_background_error)
+                return snapshot
+        self.misses += 1
+        return await asyncio.shield(self._refresh(language_code))
+
+    def _refresh(self, language_code) -> asyncio.Future:
+        future = self._inflight.get(language_code)
+        if future is None:
+            future = self._inflight[language_code] = asyncio.ensure_future(self._load(language_code))
+        return future
+
+    async def _load(self, language_code) -> ProductsSnapshot:
+        try:
+            previous = self._snapshots.get(language_code)
+            data = await self._shared.get(language_code, lambda: self._fetch(language_code, previous))
+            snapshot = ProductsSnapshot(**data)
+        except CancelledError:
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(language_code, None)
+        self._snapshots[language_code] = snapshot
+        return snapshot
+
+    async def _fetch(self, language_code, previous: Optional[ProductsSnapshot]) -> dict:
+        session = HttpClients.get(HttpClients.PSS)
+        url = config.pss_service.url + self.PATH
+        limit = PRODUCT_CATALOG['page_size']
+        products = []
+        message = etag = None
+        offset = 0
+        while True:
+            headers = {'Authorization': f'Bearer {config.pss_service.token}'}
+            # ETag проверяется по первой странице, поэтому только для каталога из одной страницы
+            if offset == 0 and previous is not None and previous.etag is not None:
+                headers['If-None-Match'] = previous.etag
+            response = await session.get(url, headers=headers,
+                                         params=dict(language_code=language_code, limit=limit, offset=offset))
+            if response.status == 304:
+                response.release()
+                self.not_modified += 1
+                return dict(products=previous.products, message=previous.message, etag=previous.etag)
+            data = await response.json()
+            if data.get('responseCode') != 0:
+                raise RuntimeError(f'ответ партнёрского сервиса не 0 а {data.get("responseCode")}')
+            page = data['data']['products']
+            products.extend(page)
+            if offset == 0:
+                message = data.get('responseMessage')
+                etag = response.headers.get('ETag')
+            if len(page) < limit:
+                break
+            offset += limit
+        logger.info(f'product_catalog: загружено {len(products)} продуктов ({language_code})')
+        # ETag запоминается только для каталога из одной страницы
+        return dict(products=products, message=message, etag=etag if len(products) < limit else None)
+
+    def _log_background_error(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f'product_catalog: не удалось обновить каталог в фоне: {future.exception()}')
+
+    def invalidate(self, language_code=None):
+        if language_code is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(language_code, None)
+
+    def metrics(self) -> dict:
+        return dict(
+            languages=sorted(self._snapshots),
+            products={language: len(snapshot.products) for language, snapshot in self._snapshots.items()},
+            hits=self.hits,
+            stale_hits=self.stale_hits,
+            misses=self.misses,
+            not_modified=self.not_modified,
+            errors=self.errors,
+        )
+
+
+product_catalog = ProductCatalog()
+
+
+def _int_params(query, allowed) -> Optional[dict]:
+    """ Целые параметры запроса; None, если есть параметры не из allowed или не числа """
+    if not set(query) <= set(allowed):
+        return None
+    try:
+        return {key: int(value) for key, value in query.items()}
+    except ValueError:
+        return None
+
+
+async def _snapshot(language_code) -> Optional[ProductsSnapshot]:
+    try:
+        return await product_catalog.get(language_code)
+    except CancelledError:
+        raise
+    except Exception as exc:
+        logger.error(f'product_catalog: каталог недоступен, запрос уйдет в PSS: {exc}')
+        return None
+
+
+async def products_body(language_code, query) -> Optional[bytes]:
+    """
+    Ответ seller/products из каталога. None - запрос каталогом не обслуживается (фильтры, которых
+    нет в каталоге, например brand_tag или airport_code, либо каталог недоступен) и передается в PSS
+    """
+    params = _int_params(query, ('point_id', 'limit', 'offset'))
+    if params is None:
+        return None
+    snapshot = await _snapshot(language_code)
+    if snapshot is None:
+        return None
+    return snapshot.list_body(**params)
+
+
+async def product_body(language_code, query) -> Optional[bytes]:
+    """ Ответ seller/product из каталога; None - запрос передается в PSS """
+    params = _int_params(query, ('id',))
+    if params is None or 'id' not in params:
+        return None
+    snapshot = await _snapshot(language_code)
+    if snapshot is None:
+        return None
+    return snapshot.product_body(params['id'])
+
+
+async def point_products(language_code, point_id) -> Optional[list]:
+    """ Продукты точки (первая страница, как seller/products?point_id=...) из каталога; None - каталог недоступен """
+    snapshot = await _snapshot(language_code)
+    if snapshot is None:
+        return None
+    return snapshot.list(point_id=point_id)
+
+
+def json_body_response(body: bytes) -> web.Response:
+    return web.Response(body=body, content_type='application/json', charset='utf-8')
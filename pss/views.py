@@ -3,13 +3,14 @@ from enum import Enum
 from json import JSONDecodeError
 from typing import Optional, Union, List, Any
 
-import aiohttp
 from aiohttp import ClientError, ServerDisconnectedError, ClientConnectionError
 from api_utils import ApiResponse
 from loguru import logger
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 from auth_model import config
+from http_clients import HttpClients
+from pss.decode import parse
 from pss.models import OnpassPostOrderInput, PostOrderInput, OrderGetInput, BindCardModels, UnBindCardModels, \
     PacketsModels, PremOrderModels, PremOrdersModels
 from settings import ONPASS_BRAND_TAG
@@ -41,40 +42,40 @@ class BasePssRequest:
 
     @classmethod
     async def pss_get(cls, params: input_get_model) -> PssResponse:
-        async with aiohttp.ClientSession() as session:
-            try:
-                url = config.pss_service.url + cls.path
-                response = await session.get(url, headers=cls.headers, params=params.dict(exclude_none=True))
-                response_json = await response.json()
-                data = PssResponse(**response_json)
-            except (ServerDisconnectedError, ClientConnectionError):
-                logger.error('сервер псс не отвечает либо разорвал соединение')
-                raise ApiResponse(31)
-            except (JSONDecodeError, ClientError)as exc:
-                logger.exception(exc)
-                raise ApiResponse(30, exc=exc)
-
-            return data
+        session = HttpClients.get(HttpClients.PSS)
+        try:
+            url = config.pss_service.url + cls.path
+            response = await session.get(url, headers=cls.headers, params=params.dict(exclude_none=True))
+            response_json = await response.json()
+            data = parse(PssResponse, response_json)
+        except (ServerDisconnectedError, ClientConnectionError):
+            logger.error('сервер псс не отвечает либо разорвал соединение')
+            raise ApiResponse(31)
+        except (JSONDecodeError, ClientError)as exc:
+            logger.exception(exc)
+            raise ApiResponse(30, exc=exc)
+
+        return data
 
     @classmethod
     async def pss_post(cls, params: input_post_model):
-        async with aiohttp.ClientSession() as session:
-            try:
-                url = config.pss_service.url + cls.path
-                response = await session.post(
-                    url,
-                    headers=cls.headers,
-                    json=params.dict(exclude_none=True))
-                response_json = await response.json()
-                data = PssResponse(**response_json)
-            except (ServerDisconnectedError, ClientConnectionError):
-                logger.error('сервер псс не отвечает либо разорвал соединение')
-                raise ApiResponse(31)
-            except (JSONDecodeError, ClientError) as exc:
-                logger.error(f'ошибка декодирования ответа от ПСС. Запрос:{params} ответ {response.content}')
-                raise ApiResponse(30, exc=exc)
-
-            return data
+        session = HttpClients.get(HttpClients.PSS)
+        try:
+            url = config.pss_service.url + cls.path
+            response = await session.post(
+                url,
+                headers=cls.headers,
+                json=params.dict(exclude_none=True))
+            response_json = await response.json()
+            data = parse(PssResponse, response_json)
+        except (ServerDisconnectedError, ClientConnectionError):
+            logger.error('сервер псс не отвечает либо разорвал соединение')
+            raise ApiResponse(31)
+        except (JSONDecodeError, ClientError) as exc:
+            logger.error(f'ошибка декодирования ответа от ПСС. Запрос:{params} ответ {response.content}')
+            raise ApiResponse(30, exc=exc)
+
+        return data
 
 
 class PointsModel(BaseModel):
@@ -156,16 +157,29 @@ class OrdersModel(BaseModel):
             }
 
     orders: List[Order] = list()
+    # индексы заказов по id и qr; при повторах, как и при переборе списка, находится первый заказ
+    _by_id: dict = PrivateAttr(default_factory=dict)
+    _by_qr: dict = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data: Any):
+        super().__init__(**data)
+        self._index(self.orders)
+
+    def _index(self, orders):
+        for order in orders:
+            self._by_id.setdefault(order.id, order)
+            self._by_qr.setdefault(order.qr, order)
+
+    def extend(self, orders: List[Order]):
+        """ Добавляет заказы (например, следующую страницу ответа) вместе с индексами """
+        self.orders.extend(orders)
+        self._index(orders)
 
     def _get_by_id(self, order_id):
-        for order in self.orders:
-            if order_id == order.id:
-                return order
+        return self._by_id.get(order_id)
 
     def _get_by_qr(self, order_qr):
-        for order in self.orders:
-            if order_qr == order.qr:
-                return order
+        return self._by_qr.get(order_qr)
 
     def find(self, order_id=None, order_qr=None):
         if order_id is not None:
@@ -209,10 +209,10 @@ select distinct brand_relations.brand_category_id as category_id,
                 brands.id,
                 coalesce(point_translates.title, 'none') as name,
                 concat(
-                            (select value from system_parameters where name = 'resource_server_url'),
+                            $3::text,
                             brands.logo_path)               as logo_path,
                 concat(
-                            (select value from system_parameters where name = 'resource_server_url'),
+                            $3::text,
                             brands.photo_path)              as photo_path,
                 brand_relations.ord
 from brands
@@ -237,7 +237,7 @@ select distinct brand_relations.brand_category_id as category_id,
                 coalesce(point_translates.description_short, 'none') as description_short, 
                 coalesce(point_translates.description, 'none') as description,
                 concat(
-                            (select value from system_parameters where name = 'resource_server_url'),
+                            $9::text,
                             brands.logo_path)               as logo_path,
                             
            case
@@ -245,7 +245,7 @@ select distinct brand_relations.brand_category_id as category_id,
            when  (select photo from photo_to_point where points.id = photo_to_point.point_id limit 1) LIKE 'http%' then 
            (select photo from photo_to_point where points.id = photo_to_point.point_id limit 1)
            else
-               concat((select value from system_parameters where name = 'resource_server_url'),
+               concat($9::text,
                        (select photo from photo_to_point where points.id = photo_to_point.point_id limit 1))
            end                  as photo_path,
            
@@ -294,6 +294,20 @@ QR_CODES_QUERY = '''
         group by pss_point_id;
 '''
 
+# qr действующих заказов профиля сразу для всех точек $1
+QR_CODES_BY_POINTS_QUERY = '''
+        select pss_point_id, array_agg(pss_qr) as qr_codes from orders where pss_point_id = any($1::int[]) and profile_id = $2
+        and (
+                  coalesce(used, false) = false
+                  and used_date is null
+                  and (estimated_date >= now() or estimated_date is null)
+                  and (expiration_date >= now() or expiration_date is null)
+                  and paid
+                  and not refunded
+              ) = true
+        group by pss_point_id;
+'''
+
 GET_POINT_QUERY = '''
 select coalesce(open_partner_schedule, '') as open_partner_schedule,
        coalesce(close_partner_schedule, '') as close_partner_schedule,
@@ -309,6 +323,28 @@ from points
 where points.id = $2;
 '''
 
+GET_POINTS_BY_IDS_QUERY = '''
+select points.id                                            as point_id,
+       coalesce(open_partner_schedule, '')                  as open_partner_schedule,
+       coalesce(close_partner_schedule, '')                 as close_partner_schedule,
+       coalesce(address_short, '')                          as address_short,
+       coalesce(address, '')                                as address,
+       coalesce(point_translates.description_short, 'none') as description_short, 
+       coalesce(point_translates.description, 'none')       as description,
+       coalesce(cashback_part, 0)                           as cashback_part
+from points
+         inner join partners on points.partner_id = partners.id
+         left outer join point_translates on points.id = point_translates.point_id and language_code = $1
+where points.id = ANY ($2::int[]);
+'''
+
+GET_PHOTOS_TO_POINTS_QUERY = '''
+select point_id, photo
+from photo_to_point
+where point_id = ANY ($1::int[])
+order by point_id, id;
+'''
+
 SYSTEM_PARAMETERS_QUERY = '''
 select name, description, value            
 from system_parameters where public is true
@@ -343,16 +379,21 @@ GET_FAQ_QUERY = '''
 SELECT ord,
        question,
        answer,
-       concat((select value from system_parameters where name = 'resource_server_url'), ico_path) as ico_path
+       concat($2::text, ico_path) as ico_path
 from faq left outer join faq_translate ft on faq.id = ft.faq_id and ft.language_id = $1
 where public
 order by ord
 '''
 GET_NOTIFICATIONS_QUERY = '''
-SELECT message, created_date from notifications 
-where profile_id = $1 order by created_date desc 
+SELECT id, message, created_date from notifications 
+where profile_id = $1 order by created_date desc, id desc 
 limit $2 offset $3;
 '''
+GET_NOTIFICATIONS_AFTER_QUERY = '''
+SELECT id, message, created_date from notifications
+where profile_id = $1 and (created_date, id) < ($3, $4) order by created_date desc, id desc
+limit $2;
+'''
 
 POST_QR_QUERY = 'update profiles set mile_count=mile_count+0 where id = $1;'
 
@@ -408,7 +449,7 @@ GET_PROMOTIONS_QUERY = '''
 SELECT title, 
 description_short, 
 description, 
-concat((select value from system_parameters where name = 'resource_server_url'), photo_path) as photo_path,
+concat($5::text, photo_path) as photo_path,
 start_date, 
 end_date
 FROM promotions
@@ -426,7 +467,7 @@ select stocks.id,
        stocks_translate.note,
        stocks_translate.purchase_terms,
        concat(
-           (select value from system_parameters where name = 'resource_server_url'), stocks.photo_path) as photo_path,
+           $4::text, stocks.photo_path) as photo_path,
        stocks.start_date,
        stocks.end_date
 from stocks
@@ -577,7 +618,19 @@ VALUES ($1, $2, $3, $4) ;
 '''
 
 GET_ORDERS_QUERY = '''
-select pss_qr, id as order_id, qr
+select pss_qr, id as order_id, qr, created_date
+from orders
+where profile_id = $1
+  and (
+              coalesce(used, false) = false
+              and used_date is null
+              and (estimated_date >= now() or estimated_date is null)
+          ) = $2
+order by created_date desc, id desc
+limit $3 offset $4
+'''
+GET_ORDERS_AFTER_QUERY = '''
+select pss_qr, id as order_id, qr, created_date
 from orders
 where profile_id = $1
   and (
@@ -585,7 +638,9 @@ where profile_id = $1
               and used_date is null
               and (estimated_date >= now() or estimated_date is null)
           ) = $2
-          limit $3 offset $4
+  and (created_date, id) < ($4, $5)
+order by created_date desc, id desc
+limit $3
 '''
 
 GET_PRODUCTS_QUERY = '''
@@ -744,48 +799,120 @@ WHERE uid = $9;
 #             category_id,
 #             city_id,
 # """
-GET_AIRPORTS = '''
+GET_AIRPORTS_TREE = '''
+with partners_in_airports as (
+    select coalesce(airports.parent_id, airports.id) as airport_id,
+           count(*)                                  as partners_count
+    from brands
+             inner join brand_relations on brands.id = brand_relations.brand_id
+             inner join points on brands.id = points.brand_id
+             inner join airports on points.airport_id = airports.id and
+                                    coalesce(airports.parent_id, airports.id) = brand_relations.airport_id
+             inner join partners on points.partner_id = partners.id
+    where brands.active
+      and partners.active
+      and points.visible
+      and partners.testing = false
+    group by coalesce(airports.parent_id, airports.id)
+),
+     partners_in_terminals as (
+         select airport_id, count(distinct brand_id) as partners_count
+         from points
+         group by airport_id
+     )
 SELECT a.id,
+       a.parent_id,
        a.city_id,
        a.code_iata,
        a.latitude,
        a.longitude,
-       concat((select value from system_parameters where name = 'resource_server_url'), a.photo_path)
-                                                                         as photo_path,
+       concat($1::text, a.photo_path)                                      as photo_path,
        a.active                                                            as available,
        a.ord,
-       (select count(*) from brands
-         inner join brand_relations on brands.id = brand_relations.brand_id
-         inner join points on brands.id = points.brand_id
-         inner join airports on points.airport_id = airports.id and coalesce(airports.parent_id, airports.id) = brand_relations.airport_id
-         inner join partners on points.partner_id = partners.id
-         where brands.active 
-  and partners.active
-  and points.visible
-  and a.parent_id is null
-  and partners.testing = false
-  and ((airports.id = a.id and airports.city_id = a.city_id) or airports.parent_id = a.id))
-    as partners_count 
+       case
+           when a.parent_id is null then coalesce(pa.partners_count, 0)
+           else coalesce(pt.partners_count, 0)
+           end                                                             as partners_count
 FROM airports a
-WHERE a.parent_id is null
-and a.visible
+         left outer join airports parent on a.parent_id = parent.id
+         left outer join partners_in_airports pa on a.parent_id is null and pa.airport_id = a.id
+         left outer join partners_in_terminals pt on a.parent_id is not null and pt.airport_id = a.id
+WHERE a.visible
+  and (a.parent_id is null or (parent.parent_id is null and parent.visible))
 ORDER BY a.ord;
 '''
 
-GET_TERMINALS = '''
-SELECT airports.id,
-       city_id,
-       latitude,
-       longitude,
-       concat((select value from system_parameters where name = 'resource_server_url'), airports.photo_path)
-                                                                         as photo_path,
-       active                                                            as available,
-       airports.ord,
-       (select count(distinct brand_id) from points where airport_id = airports.id) as partners_count
-FROM airports
-WHERE parent_id =$1::int
-and visible
-ORDER BY airports.ord;
+GET_BANNERS_FEED_QUERY = '''
+select banners.id,
+       banner_translates.title,
+       banner_translates.short_description,
+       concat($2::text, banners.image_url)                   as image_url,
+       concat($2::text, banners.image_url)                   as photo_path,
+       concat($2::text, banners.preview_rectangle_image_url) as preview_rectangle_image_url,
+       concat($2::text, banners.preview_square_image_url)    as preview_square_image_url,
+       case
+           when banners.promotion_id is null then null
+           else concat($2::text, promotions.photo_path)
+           end                                               as logo_path,
+       case
+           when banners.single_preview_square_image_url is null then null
+           else concat($2::text, banners.single_preview_square_image_url)
+           end                                               as single_preview_square_image_url,
+       banners.category_id,
+       array(select airport_banner.airport_id
+             from airport_banner
+             where airport_banner.banner_id = banners.id)    as airport_ids
+from banners
+         inner join banner_translates on banners.id = banner_translates.banner_id
+         left outer join promotions on banners.promotion_id = promotions.id
+where banners.active
+  and banners.visible
+  and banner_translates.language_code = $1
+order by banners.id desc;
+'''
+
+# кандидаты в popup баннеры профиля (см. tools.select_popup_banners): участие в акции и число показов профилю
+# за окно time_interval баннера; $5 - текущее время приложения, поэтому приводится к timestamp явно
+GET_POPUP_BANNERS_QUERY = '''
+select banner_popup_view_translates.title,
+       banner_popup_view_translates.description,
+       banners.promotion_id,
+       banner_translates.button_enable,
+       banner_translates.button_disable,
+       banners.redirect,
+       promotions.promotion_conditions,
+       banner_popup_view.time_interval,
+       banner_popup_view.popup_show_count,
+       banners.id                                           as banner_id,
+       banner_popup_view.id                                 as popup_banner_id,
+       airport_banner.action,
+       concat($3::text, banner_popup_view.image_path)       as image_url,
+       concat($3::text, banner_popup_view.logo_path)        as logo_url,
+       case
+           when banners.promotion_id is null then null
+           else concat($2::text, null)
+           end                                              as promotion_url,
+       exists(select 1
+              from promotions_to_profiles
+              where promotions_to_profiles.profile_id = $4
+                and promotions_to_profiles.promotion_id = banners.promotion_id) as participates,
+       (select count(*)
+        from profile_banner_popup_view_shows
+        where profile_banner_popup_view_shows.profile_id = $4
+          and profile_banner_popup_view_shows.created_date > $5::timestamp - banner_popup_view.time_interval
+          and profile_banner_popup_view_shows.created_date < $5::timestamp) as shows_count
+from banners
+         inner join banner_translates on banners.id = banner_translates.banner_id
+         left outer join promotions on banners.promotion_id = promotions.id
+         left outer join airport_banner on banners.id = airport_banner.banner_id
+         left outer join banner_popup_view on banners.banner_popup_view_id = banner_popup_view.id
+         left outer join banner_popup_view_translates
+                         on banner_popup_view.id = banner_popup_view_translates.banner_popup_view_id
+where banner_translates.language_code = $1
+  and banner_popup_view_translates.language_code = $1
+  and banners.active
+  and banners.visible
+order by banners.id desc;
 '''
 
 GET_AIRPORTS_TRANSLATE = '''
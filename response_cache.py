@@ -0,0 +1,177 @@
+import functools
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from aiohttp import web
+from api_utils import ApiResponse
+from loguru import logger
+
+from notify_listener import notify_listener
+from queries import GET_HASHES_QUERY
+from settings import *
+
+
+class CachedResponse:
+    __slots__ = ('body', 'gzip_body', 'etag', 'status', 'content_type', 'charset', 'tag', 'created')
+
+    def __init__(self, response, tag):
+        self.body = response.body
+        self.gzip_body = gzip.compress(self.body) if len(self.body) >= RESPONSE_CACHE_GZIP_MIN_SIZE else None
+        self.etag = f'"{hashlib.md5(self.body).hexdigest()}"'
+        self.status = response.status
+        self.content_type = response.content_type
+        self.charset = response.charset
+        self.tag = tag
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    """
+    Кэш готовых ответов справочников (аэропорты, города, языки и т.п.).
+    Ключ - (маршрут, локаль, параметры запроса), значение - сериализованное и сжатое тело ответа с ETag.
+    Каждая запись помечена значениями из таблицы hashes для таблиц, от которых зависит ответ;
+    при изменении хеша (NOTIFY из HASHES_CHANNEL через notify_listener, см. migrations/0003_hashes_notify.sql,
+    периодическое перечитывание или запрос Hashes.get) такие записи удаляются. Для таблиц без записи в hashes
+    ответ хранится не дольше RESPONSE_CACHE_UNTAGGED_TTL секунд.
+    """
+
+    def __init__(self, channel=HASHES_CHANNEL, refresh_interval=HASHES_REFRESH_INTERVAL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, untagged_ttl=RESPONSE_CACHE_UNTAGGED_TTL):
+        self._channel = channel
+        self._refresh_interval = refresh_interval
+        self._max_entries = max_entries
+        self._untagged_ttl = untagged_ttl
+        self._hashes = {}
+        self._entries = OrderedDict()
+        self._pool = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.last_refresh = None
+
+    def set_hashes(self, rows):
+        hashes = {row.get('table_name'): row.get('value') for row in rows}
+        changed = {table for table in set(hashes) | set(self._hashes) if hashes.get(table) != self._hashes.get(table)}
+        self._hashes = hashes
+        self.last_refresh = datetime.now()
+        if changed:
+            self.invalidate(*changed)
+
+    def invalidate(self, *tables):
+        tables = set(tables)
+        for key in [key for key, entry in self._entries.items() if any(table in tables for table, _ in entry.tag)]:
+            del self._entries[key]
+            self.evictions += 1
+        logger.debug(f'response_cache: изменились хеши {tables}')
+
+    def clear(self):
+        self._entries.clear()
+
+    def hash_of(self, table):
+        return self._hashes.get(table)
+
+    def tag(self, tables) -> tuple:
+        return tuple((table, self._hashes.get(table)) for table in tables)
+
+    def get(self, key, tables):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expired = any(value is None for _, value in entry.tag) \
+            and time.monotonic() - entry.created > self._untagged_ttl
+        if expired or entry.tag != self.tag(tables):
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, tag, response) -> CachedResponse:
+        entry = self._entries[key] = CachedResponse(response, tag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def make_response(self, request, entry: CachedResponse):
+        headers = {'ETag': entry.etag, 'Vary': 'Accept-Encoding'}
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None and \
+                (if_none_match.strip() == '*' or entry.etag in (tag.strip() for tag in if_none_match.split(','))):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        body = entry.body
+        if entry.gzip_body is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            body = entry.gzip_body
+            headers['Content-Encoding'] = 'gzip'
+        return web.Response(body=body, status=entry.status, content_type=entry.content_type, charset=entry.charset,
+                            headers=headers)
+
+    async def refresh(self, pool=None):
+        pool = pool or self._pool
+        async with pool.acquire() as connection:
+            self.set_hashes(await connection.fetch(GET_HASHES_QUERY))
+
+    def _on_refresh_error(self, exc):  # NOQA
+        # без актуальных хешей отдавать кэш нельзя
+        self.clear()
+
+    async def start(self, pool):
+        """ Первая загрузка hashes; дальше их перечитывает notify_listener по NOTIFY и периодически """
+        self._pool = pool
+        await self.refresh()
+        notify_listener.subscribe(self._channel, 'response_cache', self.refresh, self._refresh_interval,
+                                  on_error=self._on_refresh_error)
+
+    async def stop(self):
+        self.clear()
+
+    def metrics(self) -> dict:
+        return dict(
+            entries=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            not_modified=self.not_modified,
+            evictions=self.evictions,
+            last_refresh=self.last_refresh.strftime(FORMAT_DATE_TIME) if self.last_refresh is not None else None,
+            listening=notify_listener.listening,
+        )
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(*tables):
+    """
+    Декоратор метода get у web.View: успешный ответ (ApiResponse с кодом 0) сохраняется в response_cache
+    и до изменения хешей tables отдается без обращения к обработчику, с поддержкой If-None-Match
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(view):
+            request = view.request
+            key = (request.path, request.get('locale'), tuple(sorted(request.query.items())))
+            entry = response_cache.get(key, tables)
+            if entry is not None:
+                response_cache.hits += 1
+                return response_cache.make_response(request, entry)
+
+            response_cache.misses += 1
+            tag = response_cache.tag(tables)
+            try:
+                response = await method(view)
+            except ApiResponse as exc:
+                if exc.code != 0:
+                    raise
+                response = exc
+            else:
+                return response
+            entry = response_cache.put(key, tag, response)
+            return response_cache.make_response(request, entry)
+        return wrapper
+    return decorator
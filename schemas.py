@@ -213,6 +213,7 @@ GET_ORDERS_SCHEMA = {
     "properties": {
         "limit": {"type": "string", "format": "digitstr"},
         "offset": {"type": "string", "format": "digitstr"},
+        "cursor": {"type": "string"},
         "active": BOOL_STR
     },
     "required": ["active"],
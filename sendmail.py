@@ -6,6 +6,7 @@ from email.mime.text import MIMEText
 from loguru import logger
 import aiosmtplib
 
+import file_io
 from settings import MAIL_PARAMS
 
 if sys.platform == 'win32':
@@ -37,9 +38,7 @@ async def send_mail_async(sender, to, subject, text, textType='plain', **params)
     if photo:
         n = 1
         for file in photo:
-            fp = open(file, 'rb')
-            msgImage = MIMEImage(fp.read())
-            fp.close()
+            msgImage = MIMEImage(await file_io.run(file_io.read_file, file))
 
         # Define the image's ID as referenced above
             msgImage.add_header('Content-ID', f'<image{n}>')
@@ -0,0 +1,134 @@
+from datetime import datetime, date
+
+from asyncpg import Record
+
+MAX_CONVERTERS = 1024
+
+
+def _datetime_formatter(formatting_datetime):
+    def formatter(value):
+        if isinstance(value, (datetime, date)):
+            return datetime.strftime(value, formatting_datetime)
+        return value
+    return formatter
+
+
+def _float_formatter(digits):
+    def formatter(value):
+        if isinstance(value, float):
+            return round(value, digits)
+        return value
+    return formatter
+
+
+def _fixed_formatter(digits):
+    def formatter(value):
+        return round(value, digits)
+    return formatter
+
+
+def _chain(*formatters):
+    def formatter(value):
+        for func in formatters:
+            value = func(value)
+        return value
+    return formatter
+
+
+class RowConverter:
+    """
+    Преобразование row в dict для строк одной формы (набор колонок и типы значений первой строки).
+    Форматирование выполняется только для колонок, которым оно нужно, остальные копируются как есть
+    """
+    __slots__ = ('formatters',)
+
+    def __init__(self, formatters):
+        self.formatters = formatters
+
+    def __call__(self, row) -> dict:
+        result = dict(row)
+        for key, formatter in self.formatters:
+            result[key] = formatter(result[key])
+        return result
+
+
+_converters = {}
+
+
+def _freeze(formatting_float):
+    if isinstance(formatting_float, dict):
+        keys = formatting_float['keys']
+        keys = tuple(sorted(keys.items())) if isinstance(keys, dict) else tuple(keys)
+        return formatting_float.get('n'), keys
+    return formatting_float
+
+
+def get_converter(row, formatting_datetime=None, formatting_float=None) -> RowConverter:
+    """
+    Конвертер для строк той же формы, что row; создается один раз на форму и параметры форматирования.
+    Параметры те же, что у utils.convert_data
+    """
+    keys = tuple(row.keys())
+    types = tuple(type(value) for value in row.values())
+    cache_key = (keys, types, formatting_datetime, _freeze(formatting_float))
+    converter = _converters.get(cache_key)
+    if converter is not None:
+        return converter
+
+    fixed = {}
+    if isinstance(formatting_float, dict):
+        if isinstance(formatting_float['keys'], dict):
+            fixed = {key: digits for key, digits in formatting_float['keys'].items()}
+        elif isinstance(formatting_float['keys'], (set, tuple, list)):
+            fixed = {key: formatting_float['n'] for key in formatting_float['keys']}
+    round_floats = formatting_float if isinstance(formatting_float, int) else None
+
+    formatters = []
+    if formatting_datetime or formatting_float:
+        for key, value_type in zip(keys, types):
+            chain = []
+            if key in fixed:
+                chain.append(_fixed_formatter(fixed[key]))
+            # тип колонки неизвестен, если в первой строке NULL: проверяются оба варианта
+            unknown = value_type is type(None)
+            if round_floats and (unknown or issubclass(value_type, float)):
+                chain.append(_float_formatter(round_floats))
+            if formatting_datetime and (unknown or issubclass(value_type, (datetime, date))):
+                chain.append(_datetime_formatter(formatting_datetime))
+            if chain:
+                formatters.append((key, chain[0] if len(chain) == 1 else _chain(*chain)))
+        # ключи из formatting_float['keys'], которых нет в строке, дают KeyError, как и раньше
+        formatters.extend((key, _fixed_formatter(digits)) for key, digits in fixed.items() if key not in keys)
+
+    if len(_converters) >= MAX_CONVERTERS:
+        _converters.clear()
+    converter = _converters[cache_key] = RowConverter(tuple(formatters))
+    return converter
+
+
+def convert_rows(rows: list, formatting_datetime=None, formatting_float=None) -> list:
+    """
+    Преобразует список row в список dict на месте. Строки asyncpg одного запроса имеют одну форму,
+    поэтому конвертер берется по первой строке; для остальных типов строк - по каждой строке
+    """
+    if not rows:
+        return rows
+    first = rows[0]
+    if isinstance(first, Record):
+        converter = get_converter(first, formatting_datetime, formatting_float) \
+            if formatting_datetime or formatting_float else dict
+        for i, row in enumerate(rows):
+            rows[i] = converter(row)
+        return rows
+    for i, row in enumerate(rows):
+        if isinstance(row, list):
+            rows[i] = convert_rows(row, formatting_datetime, formatting_float)
+        elif row is not None:
+            rows[i] = convert_row(row, formatting_datetime, formatting_float)
+    return rows
+
+
+def convert_row(row, formatting_datetime=None, formatting_float=None) -> dict:
+    if not (formatting_datetime or formatting_float):
+        return dict(row)
+    return get_converter(row, formatting_datetime, formatting_float)(row)
@@ -159,6 +159,9 @@ TYPE_OF_LOGGING_SYS = 'type_of_logging'
 SP_SMS_STATUS = 'sms_enable'
 
 RESOURCE_URL = 'resource_server_url'
+POPUP_MAX_COUNT = 'popup_max_count'
+TIMEOUT_EMAIL = 'timeout_email'
+PARTICIPATE_IN_PROMOTION = 'participate_in_promotion'
 
 # если в базе отсутствую константы, учитываются следующие:
 LOC_CONFIRMATION_CODE_LIFETIME = 60
@@ -174,6 +177,78 @@ MOA_ORDER_PREFIX = 'MOA.'
 
 POOL = 'root'
 LOG_POOL = 'log_pool'
+
+# ============ HTTP-клиенты внешних сервисов (см. http_clients.HttpClients)
+# limit - соединений всего, limit_per_host - на хост, keepalive_timeout/ttl_dns_cache/таймауты - в секундах
+HTTP_CLIENTS = {
+    'pss': dict(limit=100, limit_per_host=50, keepalive_timeout=30, ttl_dns_cache=300,
+                total_timeout=30, connect_timeout=5),
+    'kassa': dict(limit=50, limit_per_host=30, keepalive_timeout=30, ttl_dns_cache=300,
+                  total_timeout=30, connect_timeout=5),
+    'alfa_bank': dict(limit=50, limit_per_host=30, keepalive_timeout=30, ttl_dns_cache=300,
+                      total_timeout=60, connect_timeout=10),
+    'sms': dict(limit=20, limit_per_host=10, keepalive_timeout=30, ttl_dns_cache=300,
+                total_timeout=15, connect_timeout=5),
+    'callback': dict(limit=20, limit_per_host=10, keepalive_timeout=30, ttl_dns_cache=300,
+                     total_timeout=15, connect_timeout=5),
+    'wallet': dict(limit=20, limit_per_host=10, keepalive_timeout=30, ttl_dns_cache=300,
+                   total_timeout=30, connect_timeout=5),
+}
+
+# пакетные запросы к PSS (см. pss.batch)
+PSS_BATCH = dict(
+    concurrency=10,  # одновременных запросов к PSS на процесс
+    deadline=10,  # секунд на все запросы пакета в рамках одного входящего запроса
+    bulk_orders=False,  # PSS отдает заказы списком: seller/orders?qr_codes=qr1,qr2
+    bulk_size=50,  # qr-кодов в одном запросе seller/orders
+    page_size=500,  # заказов на странице seller/orders при выборке всех страниц (pss.batch.iter_pages)
+    page_window=4,  # страниц, запрашиваемых одновременно
+)
+# ответы PSS разбираются без проверки pydantic (см. pss.decode);
+# включать, если проходит Test_contract/test_pss_contract.py
+PSS_TRUSTED_DECODE = False
+
+# каталог продуктов PSS seller/products в памяти (см. pss.products)
+PRODUCT_CATALOG = dict(
+    ttl=300,  # секунд до перечитывания каталога
+    stale_ttl=3600,  # секунд после ttl, в течение которых отдается прежний каталог с перечитыванием в фоне
+    page_size=1000,  # продуктов в одном запросе seller/products при загрузке
+    default_limit=20,  # limit по умолчанию, как у seller/products
+    max_bodies=500,  # готовых тел ответов на язык
+)
+
+# общий для процессов API кэш: память процесса перед Redis (см. shared_cache.py)
+SHARED_CACHE = dict(
+    enabled=True,  # False - только память процесса
+    prefix='bs_api:cache',
+    channel='bs_api:cache:invalidate',  # pub/sub рассылка сброса ключей
+    local_ttl=30,  # секунд в памяти процесса (не больше ttl пространства)
+    local_max_size=5000,
+    reconnect_interval=5,
+)
+REFERENCE_CACHE_TTL = 300  # справочники из БД в общем кэше, секунды
+
+# кэш справочных объектов PSS seller/stock, seller/point, seller/brand (см. pss.cache)
+PSS_CATALOG_CACHE = dict(
+    ttl=60,  # секунд, в течение которых объект отдается из кэша без обращения к PSS
+    stale_ttl=300,  # секунд после ttl, в течение которых отдается устаревший объект с обновлением в фоне
+    max_size=2000,  # объектов, при превышении вытесняются давно не использованные
+)
+
+IP_BLACKLIST_CHANNEL = 'ip_blacklist_changed'
+IP_BLACKLIST_REFRESH_INTERVAL = 300  # секунд, страховочное перечитывание ip_blacklist помимо NOTIFY
+SYSTEM_PARAMETERS_CHANNEL = 'system_parameters_changed'
+SYSTEM_PARAMETERS_REFRESH_INTERVAL = 300  # секунд, страховочное перечитывание system_parameters помимо NOTIFY
+HASHES_CHANNEL = 'hashes_changed'
+HASHES_REFRESH_INTERVAL = 60  # секунд, страховочное перечитывание hashes помимо NOTIFY
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_UNTAGGED_TTL = 60  # секунд, для справочников, у которых нет записи в hashes
+RESPONSE_CACHE_GZIP_MIN_SIZE = 1024  # байт, ответы меньше этого размера не сжимаются
+
+# кодирование больших ответов (см. encoders.py): 'orjson' или 'json'; без установленного orjson - всегда 'json'
+RESPONSE_ENCODER = 'orjson'
+# сжатие ответов по Accept-Encoding в compression_middleware; выключено, если сжимает балансировщик
+RESPONSE_COMPRESSION = dict(enabled=False, min_size=1024, gzip_level=5, brotli_quality=4)
 # CURRENT_TIMEZONE = 'Europe/Moscow'
 
 FORMAT_DATE = '%Y-%m-%d'
@@ -221,6 +296,33 @@ MAIL_RECEIVER = config.mail.receiver
 
 FEEDBACK_IMAGES_FOLDER = config.feedback_images_folder
 
+BANNERS_ASSIGN_DEFERRED = False  # назначать баннеры новому профилю в фоне, не задерживая ответ confirm
+BANNER_COUNTERS_RECONCILE_INTERVAL = 60 * 60  # сверка profiles.unread_banners_count, секунды (см. banner_counters.py)
+
+# фоновая сверка статусов оплаты в Альфа-Банке (см. payment_status.py), время в секундах
+PAYMENT_STATUS = dict(
+    interval=5,  # пауза между проходами очереди, если она пуста
+    batch_size=10,  # заказов за проход
+    first_delay=30,  # первая проверка заказа, зарегистрированного для оплаты на странице банка
+    base_delay=2,  # пауза после первой неокончательной проверки, далее удваивается
+    max_delay=300,
+    max_attempts=12,  # затем заказ снимается с очереди
+    lease=60,  # блокировка заказа одним экземпляром API на время проверки
+    confirm_wait=10,  # сколько confirm_pay ждет проверки заказа
+    poll_attempts=4,  # опрос статуса в запросе (привязка карты)
+    poll_delay=0.5,
+)
+ORDER_STATE_LEASE = 5 * 60  # захват заказа на время запросов в банк и кассу (см. order_state.py), секунды
+
+# потоковая загрузка фото обратной связи (см. utils.RequestFileSaver), размеры в байтах
+FILE_IO_THREADS = 4
+UPLOAD_CHUNK_SIZE = 64 * 1024
+FEEDBACK_MAX_FILES = 5
+FEEDBACK_MAX_FILE_SIZE = 10 * 1024 * 1024
+FEEDBACK_MAX_TOTAL_SIZE = 30 * 1024 * 1024
+FEEDBACK_MAX_FIELD_SIZE = 64 * 1024
+FEEDBACK_IMAGE_MAX_SIDE = 2048  # пикселей, большие фото уменьшаются при наличии Pillow; None - не уменьшать
+
 LOG_NAME = "Event log of bs_api module"
 
 ONPASS_CATEGORY_ID = 4
@@ -0,0 +1,276 @@
+import asyncio
+import functools
+import json
+import time
+import uuid
+from asyncio import CancelledError
+from collections import OrderedDict
+
+import aioredis
+from loguru import logger
+
+import encoders
+from response_cache import response_cache
+from settings import SHARED_CACHE
+
+try:
+    import msgpack
+except ImportError:  # без msgpack значения хранятся в JSON
+    msgpack = None
+
+_MSGPACK = b'm'
+_JSON = b'j'
+
+
+def pack(value) -> bytes:
+    """ Значения - то, что выражается в JSON: даты и Decimal приводятся как в encoders.default """
+    if msgpack is not None:
+        return _MSGPACK + msgpack.packb(value, use_bin_type=True, default=encoders.default)
+    return _JSON + encoders.dumps_json(value)
+
+
+def unpack(data: bytes):
+    # формат помечен первым байтом: процессы с msgpack и без него читают значения друг друга
+    if data[:1] == _MSGPACK:
+        return msgpack.unpackb(data[1:], raw=False)
+    return json.loads(data[1:])
+
+
+class CacheNamespace:
+    """
+    Пространство ключей общего кэша с собственным ttl (секунды в Redis) и local_ttl (секунды в памяти процесса,
+    0 - только Redis, если перед пространством уже есть свой кэш в памяти).
+    tables - таблицы, от которых зависят значения: к ключу добавляются их хеши из hashes (см. response_cache),
+    поэтому после изменения таблицы все процессы читают новые ключи, а прежние истекают по ttl.
+    Для таблиц без записи в hashes значение устаревает не позже чем через ttl.
+    Ключи в Redis: <prefix>:<name>:<key>[@<хеши tables>]
+    """
+
+    def __init__(self, cache, name, ttl, local_ttl=None, tables=()):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.local_ttl = min(ttl, SHARED_CACHE['local_ttl'] if local_ttl is None else local_ttl)
+        self.tables = tuple(tables)
+        self._inflight = {}
+        self._listeners = []
+
+    def redis_key(self, key) -> str:
+        return f'{SHARED_CACHE["prefix"]}:{self.name}:{key}'
+
+    def _key(self, key) -> str:
+        key = str(key)
+        if not self.tables:
+            return key
+        return key + '@' + ','.join(str(response_cache.hash_of(table)) for table in self.tables)
+
+    async def get(self, key, loader):
+        """
+        Значение из памяти процесса, иначе из Redis, иначе loader() с записью в оба уровня.
+        Одновременные промахи по ключу в процессе ждут один loader
+        """
+        key = self._key(key)
+        data = self.cache.local_get(self.name, key)
+        if data is not None:
+            self.cache.local_hits += 1
+            return unpack(data)
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._load(key, loader))
+        return unpack(await asyncio.shield(future))
+
+    async def _load(self, key, loader) -> bytes:
+        try:
+            data = await self.cache.redis_get(self.redis_key(key))
+            if data is not None:
+                self.cache.redis_hits += 1
+            else:
+                self.cache.misses += 1
+                data = pack(await loader())
+                await self.cache.redis_set(self.redis_key(key), data, self.ttl)
+            if self.local_ttl > 0:
+                self.cache.local_set(self.name, key, data, self.local_ttl)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+
+    async def invalidate(self, key=None):
+        """ Удаляет ключ (или все ключи пространства) из Redis и из памяти всех процессов """
+        await self.cache.invalidate(self.name, None if key is None else self._key(key))
+
+    def on_invalidate(self, callback):
+        """ callback(key) вызывается при сбросе ключа в любом процессе; key=None - сброс всего пространства """
+        self._listeners.append(callback)
+
+    def notify(self, key):
+        for callback in self._listeners:
+            try:
+                callback(key)
+            except Exception as exc:
+                logger.error(f'shared_cache: ошибка обработчика сброса {self.name}: {exc}')
+
+
+class SharedCache:
+    """
+    Двухуровневый кэш: LRU в памяти процесса перед Redis, общим для всех процессов API.
+    Сброс ключей рассылается через pub/sub (SHARED_CACHE['channel']), и каждый процесс удаляет их из памяти.
+    Если Redis недоступен, кэш работает только в памяти процесса
+    """
+
+    def __init__(self):
+        self._namespaces = {}
+        self._local = OrderedDict()
+        self._redis = None
+        self._subscriber = None
+        self._task = None
+        self._instance = uuid.uuid4().hex
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+        self.invalidations = 0
+
+    def namespace(self, name, ttl, local_ttl=None, tables=()) -> CacheNamespace:
+        namespace = self._namespaces.get(name)
+        if namespace is None:
+            namespace = self._namespaces[name] = CacheNamespace(self, name, ttl, local_ttl, tables)
+        return namespace
+
+    def local_get(self, name, key):
+        entry = self._local.get((name, key))
+        if entry is None:
+            return None
+        data, expires = entry
+        if expires < time.monotonic():
+            del self._local[(name, key)]
+            return None
+        self._local.move_to_end((name, key))
+        return data
+
+    def local_set(self, name, key, data, ttl):
+        self._local[(name, key)] = (data, time.monotonic() + ttl)
+        self._local.move_to_end((name, key))
+        while len(self._local) > SHARED_CACHE['local_max_size']:
+            self._local.popitem(last=False)
+
+    def local_drop(self, name, key=None):
+        if key is not None:
+            self._local.pop((name, key), None)
+        else:
+            for local_key in [local_key for local_key in self._local if local_key[0] == name]:
+                del self._local[local_key]
+        namespace = self._namespaces.get(name)
+        if namespace is not None:
+            namespace.notify(key)
+
+    async def redis_get(self, key):
+        if self._redis is None:
+            return None
+        try:
+            return await self._redis.get(key)
+        except CancelledError:
+            raise
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f'shared_cache: ошибка чтения из Redis: {exc}')
+            return None
+
+    async def redis_set(self, key, data, ttl):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, data, expire=ttl)
+        except CancelledError:
+            raise
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f'shared_cache: ошибка записи в Redis: {exc}')
+
+    async def invalidate(self, name, key=None):
+        self.invalidations += 1
+        self.local_drop(name, key)
+        if self._redis is None:
+            return
+        try:
+            namespace = self._namespaces[name]
+            if key is not None:
+                await self._redis.delete(namespace.redis_key(key))
+            else:
+                keys = [found async for found in self._redis.iscan(match=namespace.redis_key('*'))]
+                if keys:
+                    await self._redis.delete(*keys)
+            await self._redis.publish(SHARED_CACHE['channel'],
+                                      json.dumps(dict(namespace=name, key=key, origin=self._instance)))
+        except CancelledError:
+            raise
+        except Exception as exc:
+            self.redis_errors += 1
+            logger.error(f'shared_cache: ошибка сброса {name}:{key} в Redis: {exc}')
+
+    async def _listen(self, address):
+        while True:
+            try:
+                self._subscriber = await aioredis.create_redis(address)
+                channel, = await self._subscriber.subscribe(SHARED_CACHE['channel'])
+                async for message in channel.iter(encoding='utf-8'):
+                    message = json.loads(message)
+                    if message.get('origin') != self._instance:
+                        self.local_drop(message['namespace'], message.get('key'))
+            except CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f'shared_cache: подписка на {SHARED_CACHE["channel"]} прервана: {exc}')
+            finally:
+                if self._subscriber is not None:
+                    self._subscriber.close()
+                    self._subscriber = None
+            # пока подписки нет, сбросы из других процессов пропускаются: память процесса очищается целиком
+            self._local.clear()
+            await asyncio.sleep(SHARED_CACHE['reconnect_interval'])
+
+    def start(self, redis, address):
+        """ redis - пул aioredis приложения; для подписки открывается отдельное соединение по address """
+        if not SHARED_CACHE['enabled']:
+            return
+        self._redis = redis
+        self._task = asyncio.ensure_future(self._listen(address))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._redis = None
+
+    def metrics(self) -> dict:
+        return dict(
+            redis=self._redis is not None,
+            subscribed=self._subscriber is not None,
+            local_entries=len(self._local),
+            local_hits=self.local_hits,
+            redis_hits=self.redis_hits,
+            misses=self.misses,
+            redis_errors=self.redis_errors,
+            invalidations=self.invalidations,
+            serializer='msgpack' if msgpack is not None else 'json',
+        )
+
+
+shared_cache = SharedCache()
+
+
+def cached(namespace: CacheNamespace, key=None):
+    """
+    Декоратор корутины: результат кэшируется в namespace.
+    key(*args, **kwargs) - ключ кэша; по умолчанию аргументы через ':', поэтому без key аргументы должны быть
+    простыми значениями (не request, не соединение)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if key is not None:
+                cache_key = key(*args, **kwargs)
+            else:
+                cache_key = ':'.join(str(arg) for arg in (*args, *(f'{k}={v}' for k, v in sorted(kwargs.items()))))
+            return await namespace.get(cache_key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
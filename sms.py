@@ -1,7 +1,7 @@
-import aiohttp
 from api_utils import ApiResponse
 from loguru import logger
 
+from http_clients import HttpClients
 from settings import *
 
 
@@ -13,19 +13,19 @@ async def send_sms(request, phone, text_sms, sms_enable=True):
             headers = {'Authorization': f'Bearer {config.sms_service.token}'}
             request_body = dict(phone=phone, text_sms=text_sms, text_comment='MOA-Register')
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(addr, headers=headers, json=request_body) as resp:
-                        if resp is not None:
-                            status = resp.status == 200
-                            if status:
-                                jsn = await resp.json()
-                                data = jsn.get('data')
-                                if data is not None:
-                                    if dict(data).get('status', '') == 'OK':
-                                        logger.info(f'Успешно! Sms-сервис вернул: {dict(data)}')
-                                        return 1
-                                    else:
-                                        logger.error(f'SMS-сервис вернул: {dict(data)}')
+                session = HttpClients.get(HttpClients.SMS)
+                async with session.post(addr, headers=headers, json=request_body) as resp:
+                    if resp is not None:
+                        status = resp.status == 200
+                        if status:
+                            jsn = await resp.json()
+                            data = jsn.get('data')
+                            if data is not None:
+                                if dict(data).get('status', '') == 'OK':
+                                    logger.info(f'Успешно! Sms-сервис вернул: {dict(data)}')
+                                    return 1
+                                else:
+                                    logger.error(f'SMS-сервис вернул: {dict(data)}')
                 return 0
             except Exception as exc:
                 logger.error(f'send_sms: Исключение: {exc}')
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import asyncpg
+from loguru import logger
+
+from notify_listener import notify_listener
+from settings import *
+
+
+class SystemParameters:
+    """
+    Системные параметры (таблица system_parameters) в памяти процесса.
+    Считываются одним запросом при запуске приложения, перечитываются по ROUTE_RELOAD_PARAMS,
+    по NOTIFY из канала SYSTEM_PARAMETERS_CHANNEL (см. migrations/0002_system_parameters_notify.sql, notify_listener)
+    и раз в SYSTEM_PARAMETERS_REFRESH_INTERVAL секунд. Значения в БД хранятся строками,
+    типизированные свойства приводят их к нужному типу и подставляют значения по умолчанию из settings.
+    """
+
+    def __init__(self, channel=SYSTEM_PARAMETERS_CHANNEL, refresh_interval=SYSTEM_PARAMETERS_REFRESH_INTERVAL):
+        self._channel = channel
+        self._refresh_interval = refresh_interval
+        self._values = {}
+        self._app = None
+        self._pool = None
+        self.loaded = False
+        self.refresh_count = 0
+        self.last_refresh = None
+
+    def get(self, name, default=None):
+        value = self._values.get(name)
+        return default if value is None else value
+
+    def get_int(self, name, default=None):
+        value = self._values.get(name)
+        try:
+            return int(value) if value is not None else default
+        except ValueError:
+            logger.warning(f'system_parameters: {name}={value} не является целым числом, используется {default}')
+            return default
+
+    @property
+    def type_of_logging(self):
+        return self.get(TYPE_OF_LOGGING_SYS, TYPE_OF_LOGGING)
+
+    @property
+    def sms_enable(self) -> bool:
+        return True if str(self._values.get(SP_SMS_STATUS)).upper() == 'TRUE' else SMS_ENABLE
+
+    @property
+    def long_token_lifetime(self) -> int:
+        return self.get_int(LIFE_TIME_LONG_TOKEN, LOC_LIFE_TIME_LONG_TOKEN)
+
+    @property
+    def session_lifetime(self) -> int:
+        return self.get_int(LIFE_TIME_SESSION, LOC_LIFE_TIME_SESSION)
+
+    @property
+    def confirmation_code_lifetime(self) -> int:
+        return self.get_int(CONFIRMATION_CODE_LIFETIME, LOC_CONFIRMATION_CODE_LIFETIME)
+
+    @property
+    def resource_server_url(self) -> str:
+        return self.get(RESOURCE_URL, '')
+
+    @property
+    def popup_max_count(self):
+        return self.get_int(POPUP_MAX_COUNT)
+
+    @property
+    def timeout_email(self):
+        return self.get_int(TIMEOUT_EMAIL)
+
+    @property
+    def participate_in_promotion(self):
+        return self.get(PARTICIPATE_IN_PROMOTION)
+
+    def _set(self, rows):
+        self._values = {row.get('name'): row.get('value') for row in rows}
+        self.loaded = True
+        self.refresh_count += 1
+        self.last_refresh = datetime.now()
+        if self._app is not None:
+            self.apply(self._app)
+
+    async def _fetch(self, connection):
+        return await connection.fetch('SELECT name, value FROM system_parameters')
+
+    async def load(self, **connect_settings):
+        """ Чтение параметров через отдельное соединение, до создания пула (make_app) """
+        connection = await asyncpg.connect(**connect_settings)
+        try:
+            self._set(await self._fetch(connection))
+        finally:
+            await connection.close()
+
+    async def refresh(self, pool=None):
+        pool = pool or self._pool
+        async with pool.acquire() as connection:
+            self._set(await self._fetch(connection))
+        logger.debug(f'system_parameters: загружено параметров={len(self._values)}')
+
+    def apply(self, app):
+        """ Значения, которые остальной код читает из request.app """
+        self._app = app
+        app[LOGGING_TYPE] = self.type_of_logging
+        app[SP_SMS_STATUS] = self.sms_enable
+        app[LIFE_TIME_LONG_TOKEN] = self.long_token_lifetime
+        app[LIFE_TIME_SESSION] = self.session_lifetime
+        app[CONFIRMATION_CODE_LIFETIME] = self.confirmation_code_lifetime
+        app[RESOURCE_URL] = self.resource_server_url
+
+    def describe(self) -> str:
+        return f'{LOGGING_TYPE}={self.type_of_logging}, {SP_SMS_STATUS}={self.sms_enable}, ' \
+               f'{LIFE_TIME_LONG_TOKEN}={self.long_token_lifetime}, {LIFE_TIME_SESSION}={self.session_lifetime}, ' \
+               f'{CONFIRMATION_CODE_LIFETIME}={self.confirmation_code_lifetime}, ' \
+               f'{RESOURCE_URL}={self.resource_server_url}'
+
+    async def start(self, pool):
+        """ Перечитывание в пуле; дальше параметры перечитывает notify_listener по NOTIFY и периодически """
+        self._pool = pool
+        await self.refresh()
+        notify_listener.subscribe(self._channel, 'system_parameters', self.refresh, self._refresh_interval)
+
+    def metrics(self) -> dict:
+        return dict(
+            loaded=self.loaded,
+            parameters=len(self._values),
+            refresh_count=self.refresh_count,
+            last_refresh=self.last_refresh.strftime(FORMAT_DATE_TIME) if self.last_refresh is not None else None,
+            listening=notify_listener.listening,
+        )
+
+
+system_parameters = SystemParameters()
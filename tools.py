@@ -3,22 +3,22 @@ import json
 import re
 import uuid
 from asyncio import CancelledError
-from contextlib import closing
 from datetime import datetime, timedelta
 from json import JSONDecodeError
 from random import choice
 
-import psycopg2
-from aiohttp import web
 from aiohttp_session import get_session
 from loguru import logger
-from psycopg2.extras import DictCursor
 
 from api_utils import ApiResponse, ApiPool
 
+from blacklist import ip_blacklist
+from queries import GET_POPUP_BANNERS_QUERY
 from settings import *
+from shared_cache import shared_cache, cached
 from sms import send_sms
-from user.models import User, NoneUser
+from system_parameters import system_parameters
+from user.models import User, NoneUser, SessionState
 
 
 def date_now():
@@ -34,47 +34,17 @@ def get_response_json(code, message, data=None):
     return response_obj
 
 
-def get_sys_param(param_name):
-    res = None
-    try:
-        with closing(psycopg2.connect(**DATABASE_LOCAL)) as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cursor_local:
-                conn.autocommit = True
-                cursor_local.execute(f'SELECT value FROM system_parameters WHERE name=\'{param_name}\'')
-                for row in cursor_local:
-                    res = row.get('value', None)
-    except Exception as exc:
-        logger.error(f'Ошибка в функции get_sys_param: {exc}')
-        raise ApiResponse(90, exc=exc)
-    return res
-
-
-def read_sys_params(app):
-    error = None
-    try:
-        type_logging = get_sys_param(TYPE_OF_LOGGING_SYS)
-        app[LOGGING_TYPE] = type_logging if type_logging is not None else TYPE_OF_LOGGING
-
-        app[SP_SMS_STATUS] = True if str(get_sys_param(SP_SMS_STATUS)).upper() == 'TRUE' else SMS_ENABLE
-
-        life_time = get_sys_param(LIFE_TIME_LONG_TOKEN)
-        app[LIFE_TIME_LONG_TOKEN] = int(life_time) if life_time is not None else LOC_LIFE_TIME_LONG_TOKEN
-
-        life_time_s = get_sys_param(LIFE_TIME_SESSION)
-        app[LIFE_TIME_SESSION] = int(life_time_s) if life_time_s is not None else LOC_LIFE_TIME_SESSION
-
-        code_lt = get_sys_param(CONFIRMATION_CODE_LIFETIME)
-        app[CONFIRMATION_CODE_LIFETIME] = int(code_lt) if code_lt is not None else LOC_CONFIRMATION_CODE_LIFETIME
-
-        app[RESOURCE_URL] = get_sys_param(RESOURCE_URL)
-    except web.HTTPException:
-        raise
-    except Exception as err:
-        raise
-    log = f'Запуск экземпляра приложения. Считаны системные параметры: {LOGGING_TYPE}={type_logging}, ' \
-          f'{SP_SMS_STATUS}={app[SP_SMS_STATUS]}, {LIFE_TIME_LONG_TOKEN}={life_time}, ' \
-          f'{LIFE_TIME_SESSION}={life_time_s}, {CONFIRMATION_CODE_LIFETIME}={code_lt}, ' \
-          f'{RESOURCE_URL}={app[RESOURCE_URL]}. Ошибки: {error}'
+async def read_sys_params(app, **connect_settings):
+    """
+    Перечитывает системные параметры в system_parameters и переносит их в app.
+    Без connect_settings используется пул приложения (ROUTE_RELOAD_PARAMS), с ними - отдельное соединение (make_app)
+    """
+    if connect_settings:
+        await system_parameters.load(**connect_settings)
+    else:
+        await system_parameters.refresh()
+    system_parameters.apply(app)
+    log = f'Считаны системные параметры: {system_parameters.describe()}'
     print(log)
     return log
 
@@ -239,6 +209,8 @@ def get_moa_sid_from_req(request):
 
 
 async def have_ip_in_blacklist(ip, request):
+    if ip_blacklist.loaded:
+        return ip_blacklist.contains(ip)
     pool = get_pool_from_request(request)
 
     res = False
@@ -310,6 +282,83 @@ async def get_dev_prof(request):
     return None
 
 
+def need_to_fill_profile(row) -> bool:
+    """
+    True если в профиле не заполнены имя, фамилия или email
+    :param row: строка profiles (или совместимая с ней по ключам)
+    :return:
+    """
+    fn = row.get('first_name')
+    ln = row.get('last_name')
+    email = row.get('email')
+    return fn is None or len(fn) == 0 or ln is None or len(ln) == 0 or email is None or len(email) == 0
+
+
+async def resolve_session(request):
+    """
+    Разрешение сессии за один запрос к БД: заменяет цепочку session_is_active, update_lifetime_session,
+    get_dev_prof, have_devices, have_profile и check_need_to_fill_profile в auth_middleware.
+    Продлевает активную сессию, прикрепляет к request device_id, locale, profile_id и остальные поля profiles,
+    выставляет контекст User и сохраняет результат в request['session_state']
+    :param request:
+    :return: SessionState, active=None если сессии с таким moa_sid в БД нет
+    """
+    moa_sid = request.get('moa_sid')
+    pool = get_pool_from_request(request)
+    dt = date_now()
+    exp_date = dt + timedelta(seconds=int(request.app[LIFE_TIME_SESSION]))
+
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            query = f'WITH last_session AS (SELECT * FROM sessions WHERE sid=$1 ORDER BY exp_date DESC LIMIT 1), ' \
+                    f'     prolonged AS (UPDATE sessions SET exp_date=$3 ' \
+                    f'                   WHERE sid=$1 ' \
+                    f'                     AND EXISTS(SELECT 1 FROM last_session ' \
+                    f'                                WHERE last_session.active AND last_session.exp_date>$2) ' \
+                    f'                   RETURNING id) ' \
+                    f'SELECT last_session.active AND last_session.exp_date>$2 AS session_active, ' \
+                    f'  EXISTS(SELECT 1 FROM sessions ' \
+                    f'         WHERE sid=$1 AND active=True AND device_id IS NOT NULL) AS session_have_devices, ' \
+                    f'  EXISTS(SELECT 1 FROM sessions ' \
+                    f'         WHERE sid=$1 AND active=True AND profile_id IS NOT NULL) AS session_have_profile, ' \
+                    f'  devices.id AS device_id, ' \
+                    f'  devices.fcm_token AS fcm_token, ' \
+                    f'  devices.locale AS locale, ' \
+                    f'  profiles.* ' \
+                    f'FROM last_session ' \
+                    f'  LEFT OUTER JOIN devices ON devices.id=last_session.device_id AND last_session.active ' \
+                    f'  LEFT OUTER JOIN profiles ON profiles.id=last_session.profile_id AND last_session.active'
+            row = await connection.fetchrow(query, moa_sid, dt, exp_date)
+
+    if row is None:
+        state = SessionState(active=None)
+        NoneUser().set_context()
+        request['session_state'] = state
+        return state
+
+    state = SessionState(
+        active=row.get('session_active'),
+        have_devices=row.get('session_have_devices'),
+        have_profile=row.get('session_have_profile'),
+    )
+    profile = {k: v for k, v in row.items() if not k.startswith('session_')}
+    if state.active:
+        for column, value in profile.items():
+            if column == 'id':
+                request['profile_id'] = value
+            else:
+                request[column] = value
+    if profile.get('id') is not None:
+        user = User(**profile)
+        if not profile.get('is_deleted'):
+            state.need_to_fill_profile = need_to_fill_profile(profile)
+    else:
+        user = NoneUser(**profile)
+    user.set_context()
+    request['session_state'] = state
+    return state
+
+
 async def session_is_active(request):
     """
     возвращает True если сессия в БД активна.
@@ -1091,10 +1140,7 @@ async def check_need_to_fill_profile(request, phone):
                                                 f'FROM profiles '
                                                 f'WHERE phone_number=$1 '
                                                 f'  and is_deleted=False', phone)
-                fn = row.get('first_name')
-                ln = row.get('last_name')
-                email = row.get('email')
-                return fn is None or len(fn) == 0 or ln is None or len(ln) == 0 or email is None or len(email) == 0
+                return need_to_fill_profile(row)
     except CancelledError:
         raise
     except Exception as exc:
@@ -1168,26 +1214,26 @@ async def get_banner(request, _id, language_code):
                     f' banner_translates.button_enable, banner_translates.button_disable,'
                     f' airport_banner.action, banners.redirect, '
                     f' banner_translates.short_description, banners.type, promotions.promotion_conditions,'
-                    f' concat((select value from system_parameters where name = $3),'
+                    f' concat($3::text,'
                     f' banners.image_url)               as image_url,'
-                    f' concat((select value from system_parameters where name = $3),'
+                    f' concat($3::text,'
                     f' banners.image_url)               as photo_path,'
-                    f' concat((select value from system_parameters where name = $3),'
+                    f' concat($3::text,'
                     f' banners.preview_rectangle_image_url)               as preview_rectangle_image_url,'
-                    f' concat((select value from system_parameters where name = $3),'
+                    f' concat($3::text,'
                     f' banners.preview_square_image_url)               as preview_square_image_url,'
                     f'case'
                     f'   when banners.promotion_id is null then null '
                     f'    when  promotions.photo_path_for_banner is null then null '
                     f' when  promotions.photo_path_for_banner = $5 then null '
                     f' else'
-                    f' concat((select value from system_parameters where name = $3), '
+                    f' concat($3::text, '
                     f'  promotions.photo_path_for_banner) '
                     f' end as logo_path,'
                     f'case'
                     f' when banners.promotion_id is null then null '
                     f' else'
-                    f' concat((select value from system_parameters where name = $4),'
+                    f' concat($4::text,'
                     f' null) '
                     f' end as promotion_url'
                     f' from banners '
@@ -1196,7 +1242,8 @@ async def get_banner(request, _id, language_code):
                     f' left outer join airport_banner on banners.id = airport_banner.banner_id'
                     f' where banners.active=true and  banners.visible=true and banners.id=$1 and '
                     f'banner_translates.language_code=$2',
-                    _id, language_code, 'resource_server_url', 'participate_in_promotion', ''
+                    _id, language_code, system_parameters.resource_server_url,
+                    system_parameters.participate_in_promotion, ''
                 )
                 return banner
 
@@ -1206,177 +1253,8 @@ async def get_banner(request, _id, language_code):
         raise ApiResponse(90, exc=e, log_message='Исключение при обращении к  banner get_banner ' + str(e))
 
 
-async def get_banners_category_airport(request, airport_id, language_code, category_id, limit_offset, offset):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                banners = await connection.fetch(
-                    f'select banners.id, banner_translates.title '
-                    f', banner_translates.short_description, '
-                    f'(select count(*) from banners '
-                    f' left outer join airport_banner on banners.id = airport_banner.banner_id '
-                    f' where (airport_banner.airport_id=$1 or airport_banner.airport_id is null)'
-                    f'  and banners.category_id=$3)'
-                    f' as total_count, '
-                    f' concat((select value from system_parameters where name = $6),'
-                    f' banners.image_url)               as image_url,'
-                    f' concat((select value from system_parameters where name = $6),'
-                    f' banners.image_url)               as photo_path,'
-                    f' concat((select value from system_parameters where name = $6),'
-                    f' banners.preview_rectangle_image_url)               as preview_rectangle_image_url,'
-                    f' concat((select value from system_parameters where name = $6),'
-                    f' banners.preview_square_image_url)               as preview_square_image_url,'
-                    f'case'
-                    f'   when banners.promotion_id is null then null '
-                    f' else'
-                    f' concat((select value from system_parameters where name = $6), '
-                    f'  promotions.photo_path)'
-                    f' end as logo_path'
-                    f' from banners '
-                    f' inner join banner_translates on banners.id = banner_translates.banner_id'
-                    f' inner join banner_categories on banners.category_id = banner_categories.id'
-                    f' left outer join  promotions on banners.promotion_id = promotions.id '
-                    f' left outer join airport_banner on banners.id = airport_banner.banner_id'
-                    f' where banners.active=true and  banners.visible=true   '
-                    f' and banner_translates.language_code=$2 and '
-                    f' banners.category_id =$3 and (airport_banner.airport_id=$1 or airport_banner.airport_id is null) '
-                    f'  order by banners.id desc limit $4::int offset $5::int;',
-                    airport_id, language_code, category_id, limit_offset, offset, 'resource_server_url'
-                )
-                return banners
-
-    except CancelledError:
-        raise
-    except Exception as e:
-        raise ApiResponse(90, exc=e,
-                          log_message='Исключение при обращении к banners get_banners_category_airport' + str(e))
-
-
-async def get_banners_airport(request, airport_id, language_code, limit_offset, offset):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                banners = await connection.fetch(
-                    f'select banners.id, banner_translates.title, '
-                    f' banner_translates.short_description, '
-                    f'(select count(*) from banners '
-                    f' left outer join airport_banner on banners.id = airport_banner.banner_id '
-                    f' where (airport_banner.airport_id=$1 or airport_banner.airport_id is null))'
-                    f' as total_count,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.image_url)               as image_url,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.image_url)               as photo_path,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.preview_rectangle_image_url)               as preview_rectangle_image_url,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.preview_square_image_url)               as preview_square_image_url,'
-                    f' case '
-                    f'   when banners.promotion_id is null then null '
-                    f' else'
-                    f' concat((select value from system_parameters where name = $5), '
-                    f'  promotions.photo_path)'
-                    f' end as logo_path'
-                    f' from banners '
-                    f' inner join banner_translates on banners.id = banner_translates.banner_id'
-                    f' left outer join promotions on banners.promotion_id = promotions.id '
-                    f' left outer join airport_banner on banners.id = airport_banner.banner_id'
-                    f' where banners.active=true and  banners.visible=true and (airport_banner.airport_id=$1 or '
-                    f' airport_banner.airport_id is null)  and banner_translates.language_code=$2'
-                    f'  order by banners.id desc limit $3::int offset $4::int;'
-
-                    , airport_id, language_code, limit_offset, offset, 'resource_server_url'
-                )
-                return banners
-
-    except CancelledError:
-        raise
-    except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при обращении к banners get_banners_airport')
-
-
-async def get_all_banners(request, language_code, limit_offset, offset):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                banners = await connection.fetch(
-                    f'select  banners.id, banner_translates.title,  '
-                    f' banner_translates.short_description,  (select count(*) from banners ) '
-                    f' as total_count, '
-                    f' concat((select value from system_parameters where name = $4),'
-                    f' banners.image_url)               as image_url,'
-                    f' concat((select value from system_parameters where name = $4),'
-                    f' banners.image_url)               as photo_path,'
-                    f' concat((select value from system_parameters where name = $4),'
-                    f' banners.preview_rectangle_image_url)               as preview_rectangle_image_url,'
-                    f' concat((select value from system_parameters where name = $4),'
-                    f' banners.preview_square_image_url)               as preview_square_image_url,'
-                    f'case'
-                    f'   when banners.promotion_id is null then null '
-                    f' else'
-                    f' concat((select value from system_parameters where name = $4), '
-                    f'  promotions.photo_path)'
-                    f' end as logo_path'
-                    f' from banners '
-                    f' inner join banner_translates on banners.id = banner_translates.banner_id'
-                    f' left outer join  promotions on banners.promotion_id = promotions.id '
-                    f' where banners.active=true and  banners.visible=true and banner_translates.language_code=$1'
-                    f'  order by banners.id desc limit $2::int offset $3::int;'
-
-                    , language_code, limit_offset, offset, 'resource_server_url'
-                )
-                return banners
-
-    except CancelledError:
-        raise
-    except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при обращении к  banners get_all_banners')
-
-
-async def get_banner_category(request, category_id, language_code, limit_offset, offset):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                banners = await connection.fetch(
-                    f'select banners.id, banner_translates.title, '
-                    f' banner_translates.short_description, '
-                    f'(select count(*) from banners  where banners.category_id=$2 ) as total_count,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.image_url)               as image_url,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.image_url)               as photo_path,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.preview_rectangle_image_url)               as preview_rectangle_image_url,'
-                    f' concat((select value from system_parameters where name = $5),'
-                    f' banners.preview_square_image_url)               as preview_square_image_url,'
-                    f'case'
-                    f'   when banners.promotion_id is null then null '
-                    f' else'
-                    f' concat((select value from system_parameters where name = $5), '
-                    f'  promotions.photo_path)'
-                    f' end as logo_path'
-                    f' from banners '
-                    f' inner join banner_translates on banners.id = banner_translates.banner_id'
-                    f' inner join banner_categories on banners.category_id = banner_categories.id'
-                    f' left outer join promotions on banners.promotion_id = promotions.id '
-                    f' where banners.active=true and  banners.visible=true and banner_translates.language_code=$1 '
-                    f' and banners.category_id=$2'
-                    f'  order by banners.id desc limit $3::int offset $4::int;'
-
-                    , language_code, category_id, limit_offset, offset, 'resource_server_url'
-                )
-                return banners
-
-    except CancelledError:
-        raise
-    except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при обращении к  banners get_banner_category')
-
-
+@cached(shared_cache.namespace('banner_categories', REFERENCE_CACHE_TTL, tables=('banner_categories',)),
+        key=lambda request, language_code: language_code)
 async def get_categories(request, language_code):
     pool = get_pool_from_request(request)
     try:
@@ -1388,7 +1266,7 @@ async def get_categories(request, language_code):
 
                     , language_code
                 )
-                return banner_categories
+                return [dict(row) for row in banner_categories]
 
     except CancelledError:
         raise
@@ -1397,47 +1275,21 @@ async def get_categories(request, language_code):
 
 
 async def update_status_banner_to_profile(request):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                await connection.execute(
-                    f'UPDATE banners_to_profiles SET read_banner=True where profile_id=$1 ',
-                    request.get("profile_id")
-                )
-    except CancelledError:
-        raise
-    except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при обновлении к бд banners_to_profiles')
-
-
-# async def update_banner_count_to_profile(request):
-#     pool = get_pool_from_request(request)
-#     try:
-#         async with pool.acquire() as connection:
-#                 await connection.execute(
-#                     f'UPDATE profiles SET unread_banners_count=$2 where id=$1 ',
-#                     request.get("profile_id"), 0
-#                 )
-#     except CancelledError:
-#         raise
-#     except Exception as e:
-#         raise ApiResponse(90, exc=e, log_message='Исключение при обнулениии счетчика в profiles')
-
-async def check_banners(request):
+    """
+    Отмечает непрочитанные баннеры профиля прочитанными; unread_banners_count уменьшает триггер
+    (migrations/0010_banners_to_profiles_unread_trigger.sql). Уже прочитанные строки не перезаписываются
+    """
     pool = get_pool_from_request(request)
     try:
         async with pool.acquire() as connection:
             await connection.execute(
-                f'UPDATE profiles SET unread_banners_count='
-                f'(select count(*) from banners_to_profiles where profile_id=$1 and read_banner=$2) where id=$1',
-                request.get("profile_id"), False
+                'UPDATE banners_to_profiles SET read_banner=True where profile_id=$1 and not read_banner',
+                request.get("profile_id")
             )
     except CancelledError:
         raise
     except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при обнулениии или пополнения счетчика в profiles для '
-                                                 'banners')
+        raise ApiResponse(90, exc=e, log_message='Исключение при обновлении к бд banners_to_profiles')
 
 
 async def check_confirm_banners(request):
@@ -1456,72 +1308,78 @@ async def check_confirm_banners(request):
         raise ApiResponse(90, exc=e, log_message='Исключение при проверке баннеров при confirm')
 
 
-async def get_list_id_banners(request):
-    pool = get_pool_from_request(request)
+async def assign_banners_to_profile(pool, profile_id) -> int:
+    """
+    Назначает профилю все активные баннеры одним INSERT ... SELECT; unread_banners_count увеличивает триггер
+    (migrations/0010_banners_to_profiles_unread_trigger.sql).
+    Уже назначенные баннеры пропускаются, поэтому повторный вызов безопасен. Возвращает количество добавленных строк
+    """
     try:
         async with pool.acquire() as connection:
-            result = await connection.fetch(
-                f'select id from banners where active=$1 and visible=$1',
-                True
-
+            status = await connection.execute(
+                'insert into banners_to_profiles (profile_id, read_banner, banner_id) '
+                'select $1, false, banners.id from banners '
+                'where banners.active and banners.visible '
+                'and not exists(select 1 from banners_to_profiles btp '
+                '               where btp.profile_id = $1 and btp.banner_id = banners.id)',
+                profile_id
             )
-        return result
     except CancelledError:
         raise
     except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при взятии листа id в banners смотри route confirm')
+        raise ApiResponse(90, exc=e, log_message='Исключение при назначении баннеров профилю смотри route confirm')
+    assigned = int(status.split()[-1])
+    logger.debug(f'profile_id={profile_id}: назначено баннеров {assigned}')
+    return assigned
 
 
-async def insert_into_banners_to_profiles(request, banner_id):
-    pool = get_pool_from_request(request)
+async def assign_banners_in_background(pool, profile_id):
     try:
-        async with pool.acquire() as connection:
-            await connection.execute(
-                f'insert into banners_to_profiles (profile_id, read_banner, banner_id)'
-                f'values($1, $2, $3)',
-                request.get("profile_id"), False, banner_id
-
-            )
-
+        await assign_banners_to_profile(pool, profile_id)
     except CancelledError:
         raise
-    except Exception as e:
-        raise ApiResponse(90, exc=e, log_message='Исключение при взятии листа id в banners смотри route confirm')
+    except Exception as exc:
+        logger.error(f'profile_id={profile_id}: не удалось назначить баннеры: {exc}')
 
 
-async def check_promotion(request, banner_id, dict_data):
-    try:
-        if dict_data['action']:
-            tmp = dict_data['action'].replace("'", "\"")
-            tmp_ = json.loads(tmp)
-            dict_data['action'] = tmp_
-        else:
-            dict_data['action'] = None
-    except KeyError:
-        pass
+def parse_banner_json(dict_data):
+    """ action и redirect баннера хранятся строкой с одинарными кавычками """
+    for key in ('action', 'redirect'):
+        if key in dict_data:
+            dict_data[key] = json.loads(dict_data[key].replace("'", "\"")) if dict_data[key] else None
+    return dict_data
 
-    try:
-        if dict_data['redirect']:
-            tmp = dict_data['redirect'].replace("'", "\"")
-            tmp_ = json.loads(tmp)
-            dict_data['redirect'] = tmp_
+
+def fill_promotion(dict_data, has_promotion, participates):
+    """ Блоки promotion и button баннера; participates - профиль уже участвует в акции баннера """
+    dict_data['button'] = {}
+    if has_promotion:
+        dict_data['promotion'] = {}
+        dict_data['promotion']['id'] = dict_data.pop('promotion_id')
+        dict_data['promotion']['conditions'] = dict_data.pop('promotion_conditions')
+        dict_data['promotion']['route'] = dict_data.pop('promotion_url')
+
+        if participates:
+            dict_data['button']['is_enabled'] = False
+            dict_data['button']['text'] = dict_data.pop('button_disable')
+            dict_data.pop('button_enable')
         else:
-            dict_data['redirect'] = None
-    except KeyError:
-        pass
-
-    # if dict_data['promotion']:
-    #     tmp = dict_data['promotion'].replace("'", "\"")
-    #     tmp_ = json.loads(tmp)
-    #     dict_data['promotion'] = tmp_
-    # else:
-    #     dict_data['promotion'] = None
-
-    # if dict_data['button']:
-    #     tmp = dict_data['button'].replace("'", "\"")
-    #     tmp_ = json.loads(tmp)
-    #     dict_data['button'] = tmp_
+            dict_data['button']['is_enabled'] = True
+            dict_data['button']['text'] = dict_data.pop('button_enable')
+            dict_data.pop('button_disable')
+    else:
+        dict_data['promotion'] = None
+        dict_data['button']['text'] = dict_data.pop('button_enable')
+        dict_data['button']['is_enabled'] = True
+        dict_data.pop('button_disable')
+        dict_data.pop('promotion_url')
+        dict_data.pop('promotion_id')
+        dict_data.pop('promotion_conditions')
+    return dict_data
 
+
+async def check_promotion(request, banner_id, dict_data):
+    parse_banner_json(dict_data)
     try:
         pool = get_pool_from_request(request)
         async with pool.acquire() as connection:
@@ -1531,36 +1389,12 @@ async def check_promotion(request, banner_id, dict_data):
                 banner_id
             )
             promo_id = dict(promotion_id[0])
+            result = None
             if promo_id['promotion_id']:
                 result = await connection.fetch(
                     f'select * from promotions_to_profiles where profile_id=$1 and promotion_id=$2',
                     request.get("profile_id"), promo_id['promotion_id'])
-
-                dict_data['promotion'] = {}
-                dict_data['promotion']['id'] = dict_data.pop('promotion_id')
-                dict_data['promotion']['conditions'] = dict_data.pop('promotion_conditions')
-                dict_data['promotion']['route'] = dict_data.pop('promotion_url')
-                dict_data['button'] = {}
-
-                if result:
-                    dict_data['button']['is_enabled'] = False
-                    dict_data['button']['text'] = dict_data.pop('button_disable')
-                    dict_data.pop('button_enable')
-
-                else:
-                    dict_data['button']['is_enabled'] = True
-                    dict_data['button']['text'] = dict_data.pop('button_enable')
-                    dict_data.pop('button_disable')
-
-            else:
-                dict_data['button'] = {}
-                dict_data['promotion'] = None
-                dict_data['button']['text'] = dict_data.pop('button_enable')
-                dict_data['button']['is_enabled'] = True
-                dict_data.pop('button_disable')
-                dict_data.pop('promotion_url')
-                dict_data.pop('promotion_id')
-                dict_data.pop('promotion_conditions')
+            fill_promotion(dict_data, bool(promo_id['promotion_id']), bool(result))
 
     except CancelledError:
         raise
@@ -1586,131 +1420,52 @@ async def insert_promotion_to_profiles(request, promotion_id):
         raise ApiResponse(90, exc=e, log_message='Исключение добавления profile к участии в акциии')
 
 
-async def get_popup_banner(request,  language_code):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                popup_banners = await connection.fetch(
-                    '''  select  banner_popup_view_translates.title, banner_popup_view_translates.description,  
-                       banners.promotion_id, banner_translates.button_enable, banner_translates.button_disable,
-                       banners.redirect , promotions.promotion_conditions, banner_popup_view.time_interval, 
-                       banner_popup_view.popup_show_count, banners.id as banner_id,
-                        banner_popup_view.id as popup_banner_id, airport_banner.action,
-                       concat((select value from system_parameters where name = $3),
-                       banner_popup_view.image_path)               as image_url,
-                       concat((select value from system_parameters where name = $3),
-                       banner_popup_view.logo_path)               as logo_url,
-                     case
-                      when banners.promotion_id is null then null
-                      else
-                      concat((select value from system_parameters where name = $2),
-                      null)
-                      end as promotion_url
-                      from banners
-                      inner join banner_translates on banners.id = banner_translates.banner_id
-                      left outer join promotions on banners.promotion_id = promotions.id
-                      left outer join airport_banner on banners.id = airport_banner.banner_id
-                      left outer join banner_popup_view on banners.banner_popup_view_id = banner_popup_view.id
-                      left outer join banner_popup_view_translates on banner_popup_view.id = banner_popup_view_translates.banner_popup_view_id
-                      where   banner_translates.language_code=$1 and
-                            banner_popup_view_translates.language_code=$1 and banners.active=$4 and banners.visible=$4 order by banners.id desc''',
-                    language_code, 'participate_in_promotion', 'resource_server_url', True
-                )
-                return popup_banners
-
-    except CancelledError:
-        raise
-    except Exception as e:
-        logger.error(f'Исключение при обращении к popup banner get_popup_banner ' + str(e))
-        raise ApiResponse(90, exc=e, log_message='Исключение при обращении к popup banner get_popup_banner ' + str(e))
-
-
-async def check_show_popup(request, dict_data):
-
-    show_count = dict_data.pop('popup_show_count')
-    time_interval = dict_data.pop('time_interval')
-    # banner_id = dict_data.pop('banner_id')
-    # banner_popup_id = dict_data.pop('banner_popup_id')
-    date_start = date_now() - time_interval
-
+async def select_popup_banners(request, language_code, max_count):
+    """
+    Popup баннеры для показа профилю: кандидаты вместе с участием в акции и числом показов профилю за окно
+    time_interval каждого баннера выбираются одним запросом, показы отобранных записываются одним insert.
+    Баннер показывается, если число показов за его окно, включая отобранные перед ним в этом запросе,
+    не больше popup_show_count. Отбирается не более max_count баннеров
+    """
     profile_id = request.get('profile_id')
-
     pool = get_pool_from_request(request)
     try:
         async with pool.acquire() as connection:
             async with connection.transaction():
-                count_db = await connection.fetch(
-                    ''' select count(banner_popup_view_id) from profile_banner_popup_view_shows 
-                        where profile_banner_popup_view_shows.created_date > $1 and  
-                        profile_banner_popup_view_shows.created_date < $2 and 
-                        profile_banner_popup_view_shows.profile_id=$3''',
-                    date_start, date_now(), profile_id
+                now = date_now()
+                candidates = await connection.fetch(
+                    GET_POPUP_BANNERS_QUERY,
+                    language_code, system_parameters.participate_in_promotion, system_parameters.resource_server_url,
+                    profile_id, now
                 )
-                if dict(count_db[0])['count'] <= show_count:
+                selected = []
+                for candidate in candidates:
+                    if len(selected) >= max_count:
+                        break
+                    show_count = candidate['popup_show_count']
+                    if show_count is not None and candidate['shows_count'] + len(selected) <= show_count:
+                        selected.append(candidate)
+                if selected:
                     await connection.execute(
-                        f'insert into profile_banner_popup_view_shows (profile_id, banner_popup_view_id, created_date)'
-                        f'values($1, $2, $3)',
-                        profile_id, dict_data['popup_banner_id'], date_now())
-
-    except CancelledError:
-        raise
-    except Exception as e:
-        logger.error(f'Исключение при  проверке показа popup banner  ' + str(e))
-        raise ApiResponse(90, exc=e, log_message='Исключение при  проверке показа popup banner  popup banner '
-                                                 'get_popup_banner ' + str(e))
-    try:
-        if dict(count_db[0])['count'] <= show_count:
-            return True
-        else:
-            return False
-    except Exception as e:
-        logger.error(f'Исключение при сравнение количества показов popup banner  ' + str(e))
-        raise ApiResponse(90, exc=e, log_message='Исключение при сравнение количества показов popup banner ' + str(e))
-
-
-async def get_single_square_image_url(request, banner_id):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                single_image = await connection.fetchval(
-                    ''' select  
-                    case
-                      when single_preview_square_image_url is null then null
-                      else
-                    concat((select value from system_parameters where name = $2),
-                       single_preview_square_image_url) 
-                    end
-                    from banners where id=$1 ''', banner_id, 'resource_server_url'
-
-                )
-    except CancelledError:
-        raise
-    except Exception as e:
-        logger.error(f'Исключение при получении single_preview_square_image_url  ' + str(e))
-        raise ApiResponse(90, exc=e, log_message='Исключение при получении single_preview_square_image_url '
-                                                  + str(e))
-    return single_image
-
-async def max_count(request):
-    pool = get_pool_from_request(request)
-    try:
-        async with pool.acquire() as connection:
-            async with connection.transaction():
-                count_db = await connection.fetchval(
-                    ''' select value from system_parameters where name = 'popup_max_count' '''
-
-                )
-
+                        'insert into profile_banner_popup_view_shows (profile_id, banner_popup_view_id, created_date) '
+                        'select $1, banner_popup_view_id, $3 from unnest($2::int[]) as banner_popup_view_id',
+                        profile_id, [candidate['popup_banner_id'] for candidate in selected], date_now()
+                    )
     except CancelledError:
         raise
     except Exception as e:
-        logger.error(f'Исключение при  проверке максимального колличества показов попапов в системных параметрах  ' + str(e))
-        raise ApiResponse(90, exc=e, log_message='Исключение при  проверке показа popup banner  popup banner '
-                                                 'get_popup_banner ' + str(e))
+        raise ApiResponse(90, exc=e, log_message='Исключение при отборе popup banner select_popup_banners ' + str(e))
+
+    popup_banners = []
+    for candidate in selected:
+        dict_banner = dict(candidate)
+        participates = dict_banner.pop('participates')
+        for key in ('shows_count', 'popup_show_count', 'time_interval'):
+            dict_banner.pop(key)
+        parse_banner_json(dict_banner)
+        popup_banners.append(fill_promotion(dict_banner, dict_banner['promotion_id'] is not None, participates))
+    return popup_banners
 
-    return count_db
 
 def change_title_for_redirect_banner(dict_banner_, language_code, params_banner_id=None):
 
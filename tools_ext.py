@@ -1,59 +1,202 @@
 import asyncio
-
-import aiohttp
-from loguru import logger
+import bisect
+import time
 
 import tools
 from api_utils import ApiResponse
+from http_clients import HttpClients, get_api_response_json
+from pss.cache import get_catalog_object
 from queries import *
+from response_cache import response_cache
 from settings import *
-from utils import convert_data, get_language_id, rename_field
+from system_parameters import system_parameters
+from utils import convert_data, rename_field
 
 
-async def get_photo_to_point(request, point_id=None):
-    pool = tools.get_pool_from_request(request)
-    async with pool.acquire() as conn:
-        photo_to_points = await conn.fetch(
-            '''
-            select photo_to_point.photo as photo_paths
-            from photo_to_point where point_id =$1
-            order by id
-            ''', point_id)
-    return photo_to_points
+async def get_resource_server_url(request):  # NOQA
+    return system_parameters.resource_server_url
 
 
-async def get_resource_server_url(request):
-    pool = tools.get_pool_from_request(request)
-    async with pool.acquire() as conn:
-        resource_url = await conn.fetchval('''
-                            select value from system_parameters where name = $1 ''', 'resource_server_url')
+class TableSnapshot:
+    """
+    Неизменяемый снимок данных в памяти процесса, отдельный для каждого ключа (например, локали).
+    Перестраивается, когда меняется хеш таблицы TABLE в hashes (или по истечении RESPONSE_CACHE_UNTAGGED_TTL,
+    если такого хеша нет); одновременные запросы ждут одного построения
+    """
+    TABLE = None
+
+    def __init__(self):
+        self._snapshots = {}
+        self._locks = {}
+
+    def _is_actual(self, key):
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return False
+        _, built_hash, built = snapshot
+        current = response_cache.hash_of(self.TABLE)
+        if current is None:
+            return time.monotonic() - built < RESPONSE_CACHE_UNTAGGED_TTL
+        return current == built_hash
+
+    async def get(self, pool, key=None):
+        if self._is_actual(key):
+            return self._snapshots[key][0]
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if not self._is_actual(key):
+                current = response_cache.hash_of(self.TABLE)
+                self._snapshots[key] = (await self._build(pool, key), current, time.monotonic())
+        return self._snapshots[key][0]
+
+    async def _build(self, pool, key):
+        raise NotImplementedError
+
+
+class AirportsTree(TableSnapshot):
+    """
+    Дерево аэропортов (аэропорты -> терминалы, переводы) для Airports.get.
+    Строится двумя запросами (GET_AIRPORTS_TREE, GET_AIRPORTS_TRANSLATE) и не изменяется после построения
+    """
+    TABLE = 'airports'
+
+    async def _build(self, pool, key) -> dict:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(GET_AIRPORTS_TREE, system_parameters.resource_server_url)
+            airports_id_list = [row['id'] for row in rows if row['parent_id'] is None]
+            translates = await conn.fetch(GET_AIRPORTS_TRANSLATE, airports_id_list)
+
+        airports, terminals = [], {}
+        for row in rows:
+            row = dict(row)
+            parent_id = row.pop('parent_id')
+            if parent_id is None:
+                airports.append(row)
+            else:
+                row.pop('code_iata')
+                terminals.setdefault(parent_id, []).append(row)
+        for airport in airports:
+            if airport['id'] in terminals:
+                airport['terminals'] = tuple(terminals[airport['id']])
+        translates = tuple(convert_data(translates, formatting_datetime=FORMAT_DATE_TIME))
+        return {'airports': tuple(airports), 'translates': translates}
+
+
+airports_tree = AirportsTree()
+
+
+class BannersSnapshot:
+    """
+    Активные баннеры одной локали в порядке убывания id. Выборки по фильтру (категория, аэропорт)
+    и их total_count вычисляются один раз на снимок. Запоминаются только выборки по категориям и аэропортам,
+    которые есть в снимке, поэтому их число ограничено содержимым снимка, а не параметрами запросов
+    """
+    # аэропорт, к которому не привязан ни один баннер: выборка из баннеров без привязки к аэропорту
+    _OTHER_AIRPORT = object()
 
-    return resource_url
+    def __init__(self, rows):
+        self._banners = []
+        self._category_ids = set()
+        self._airport_ids = set()
+        for row in rows:
+            banner = dict(row)
+            airport_ids = banner.pop('airport_ids')
+            # баннер без привязки к аэропорту показывается во всех аэропортах
+            airports = None if not airport_ids or None in airport_ids else frozenset(airport_ids)
+            category_id = banner.pop('category_id')
+            self._banners.append((category_id, airports, banner))
+            self._category_ids.add(category_id)
+            self._airport_ids.update(airports or ())
+        self._selections = {}
+
+    def _select(self, category_id, airport_id) -> tuple:
+        if category_id is not None and category_id not in self._category_ids:
+            return (), []
+        if airport_id is not None and airport_id not in self._airport_ids:
+            airport_id = self._OTHER_AIRPORT
+        key = (category_id, airport_id)
+        selection = self._selections.get(key)
+        if selection is None:
+            banners = tuple(banner for banner_category_id, airports, banner in self._banners
+                            if (category_id is None or banner_category_id == category_id)
+                            and (airport_id is None or airports is None or airport_id in airports))
+            # -id по возрастанию, для bisect при постраничной выдаче по after_id
+            selection = self._selections[key] = (banners, [-banner['id'] for banner in banners])
+        return selection
+
+    def total_count(self, category_id=None, airport_id=None) -> int:
+        return len(self._select(category_id, airport_id)[0])
+
+    def page(self, category_id=None, airport_id=None, limit=20, offset=0, after_id=None) -> tuple:
+        """
+        Страница баннеров. При after_id (id последнего баннера предыдущей страницы) выдача начинается
+        со следующего за ним баннера и offset не учитывается. Возвращает (баннеры, after_id следующей страницы или None)
+        """
+        banners, keys = self._select(category_id, airport_id)
+        start = bisect.bisect_right(keys, -after_id) if after_id is not None else offset
+        page = banners[start:start + limit]
+        next_after_id = page[-1]['id'] if page and start + limit < len(banners) else None
+        return page, next_after_id
+
+
+class BannersFeed(TableSnapshot):
+    """ Снимки ленты баннеров по локалям для GetBanners.get, перестраиваются при изменении хеша banners """
+    TABLE = 'banners'
+
+    async def _build(self, pool, key) -> BannersSnapshot:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(GET_BANNERS_FEED_QUERY, key, system_parameters.resource_server_url)
+        return BannersSnapshot(rows)
+
+
+banners_feed = BannersFeed()
 
 
 async def get_brands(request, language_code, testing=False, airport_id=None, category_id=None, city_id=None, limit=20,
-                     offset=0, point_id=None):
-    language_id = await get_language_id(request)
+                     offset=0, point_id=None, with_photos=False):
     pool = tools.get_pool_from_request(request)
     async with pool.acquire() as conn:
-        brands = await conn.fetch(
-            GET_BRANDS_LIST_QUERY,
-            language_code,
-            testing,
-            airport_id,
-            category_id,
-            city_id,
-            limit,
-            offset,
-            point_id
-        )
-
-        prepared_point = await conn.prepare(GET_POINT_QUERY)
-        brands = convert_data(brands, formatting_datetime=FORMAT_DATE_TIME, formatting_float=2)
-        for brand in brands:
-            point = await prepared_point.fetchrow(language_id, brand['points'][0])
-            brand.update(point)
-            brand.pop('points')
+        return await fetch_brands(conn, language_code, testing, airport_id, category_id, city_id, limit, offset,
+                                  point_id, with_photos)
+
+
+async def fetch_brands(conn, language_code, testing=False, airport_id=None, category_id=None, city_id=None, limit=20,
+                       offset=0, point_id=None, with_photos=False):
+    """
+    Страница брендов. Данные точек (режим работы, адреса, кэшбэк) и, при with_photos, карусели фото
+    читаются для всей страницы запросами по массиву id точек и раскладываются по брендам в python
+    """
+    brands = await conn.fetch(
+        GET_BRANDS_LIST_QUERY,
+        language_code,
+        testing,
+        airport_id,
+        category_id,
+        city_id,
+        limit,
+        offset,
+        point_id,
+        system_parameters.resource_server_url
+    )
+    if not brands:
+        return []
+    points_id = [brand['points'][0] for brand in brands]
+    points = await conn.fetch(GET_POINTS_BY_IDS_QUERY, language_code, points_id)
+    photos = await conn.fetch(GET_PHOTOS_TO_POINTS_QUERY, points_id) if with_photos else []
+
+    points = {row['point_id']: row for row in points}
+    photos_to_points = {}
+    for row in photos:
+        photos_to_points.setdefault(row['point_id'], []).append(row['photo'])
+
+    brands = convert_data(brands, formatting_datetime=FORMAT_DATE_TIME, formatting_float=2)
+    for brand in brands:
+        _point_id = brand.pop('points')[0]
+        point = points.get(_point_id)
+        if point is not None:
+            brand.update({key: value for key, value in point.items() if key != 'point_id'})
+        if with_photos:
+            brand['photo_paths'] = photos_to_points.get(_point_id, [])
     return brands
 
 
@@ -65,7 +208,7 @@ async def stock_gen(stocks_id_list, conn, language_id, active):
     prepared_partner_info = await conn.prepare(GET_POINT_QUERY)
     prepared_brand_info = await conn.prepare(GET_BRAND_QUERY)
     for stock_id in stocks_id_list:
-        stock = await prepared_stock.fetchrow(language_id, stock_id, active)
+        stock = await prepared_stock.fetchrow(language_id, stock_id, active, system_parameters.resource_server_url)
         stock = convert_data(stock, formatting_datetime=FORMAT_DATE)
         cart = await prepared_cart.fetchrow(stock_id)
         cart = convert_data(cart, formatting_float=2)
@@ -78,7 +221,8 @@ async def stock_gen(stocks_id_list, conn, language_id, active):
             raise ApiResponse(13)
         partner = await prepared_partner_info.fetchrow(language_id, point.get('id'))
         partner = convert_data(partner, formatting_datetime=FORMAT_DATE_TIME)
-        brand = await prepared_brand_info.fetchrow(language_id, point.get('brand_id'))
+        brand = await prepared_brand_info.fetchrow(language_id, point.get('brand_id'),
+                                                   system_parameters.resource_server_url)
         brand = convert_data(brand)
         partner.update(brand)
         airport_id = point.get('airport_id')
@@ -103,22 +247,22 @@ async def wallet(logger, pool, request):
             operating_system = row.get('os')
             os_version = row.get('os_version')
 
-            async with aiohttp.ClientSession() as session:
-                request_body = {
-                    "pqr": pqr,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'phone_number': phone_number,
-                    'os': operating_system,
-                    'os_version': os_version
-                }
-
-                resp = await session.post(f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard', json=request_body)
-                try:
-                    json = await resp.json()
-                    url = json['data']['url']
-                except Exception:
-                    raise ApiResponse(30)
+            session = HttpClients.get(HttpClients.WALLET)
+            request_body = {
+                "pqr": pqr,
+                'first_name': first_name,
+                'last_name': last_name,
+                'phone_number': phone_number,
+                'os': operating_system,
+                'os_version': os_version
+            }
+
+            resp = await session.post(f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard', json=request_body)
+            try:
+                json = await resp.json()
+                url = json['data']['url']
+            except Exception:
+                raise ApiResponse(30)
         return {'url': url}
 
     return {'pqr': pqr}
@@ -130,72 +274,36 @@ async def get_st(request, stock_id, language_code, airport_id=None):
         async with pool.acquire() as conn:
             async with conn.transaction():
                 airport_code = await conn.fetchval(GET_AIRPORT_CODE, airport_id)
-                params = dict(stock_id=stock_id, language_code=language_code, airport_code=airport_code)
+                params = dict(stock_id=stock_id, airport_code=airport_code)
     else:
-        params = dict(stock_id=stock_id, language_code=language_code)
+        params = dict(stock_id=stock_id)
 
-    headers = {'Authorization': f'Bearer {config.pss_service.token}'}
+    stock_info = await get_catalog_object(request, 'stock', language_code, **params)
+    brand_tag = stock_info['stock'].get('brand_tag')
+    async with pool.acquire() as conn:
+        brand_id = await conn.fetchval(GET_BRAND_ID_QUERY, brand_tag)
 
-    async with aiohttp.ClientSession() as session:
-        url = config.pss_service.url + 'seller/stock'
-        logger.info(f'запрос на url {url}, params: {params}')
-        stock = asyncio.create_task(
-            get_api_response_json(request, session, url, 'get', headers, params=params))
-        stock_info = await stock
-        brand_tag = stock_info['stock'].get('brand_tag')
-        async with pool.acquire() as conn:
-            brand_id = await conn.fetchval(GET_BRAND_ID_QUERY, brand_tag)
-
-        point_id = stock_info['stock']['points'][0]['point_id']
-        url = config.pss_service.url + 'seller/point'
-        params = dict(point_id=point_id, language_code=language_code)
-        logger.info(f'запрос на url {url}, params: {params}')
-        point = asyncio.create_task(
-            get_api_response_json(request, session, url, 'get', headers, params=params))
-
-        url = config.pss_service.url + 'seller/brand'
-
-        params = dict(brand_tag=brand_tag, language_code=language_code)
-        logger.info(f'запрос на url {url}, params: {params}')
-        brand = asyncio.create_task(
-            get_api_response_json(request, session, url, 'get', headers, params=params))
-        brand_info = (await brand).get('brand')
-        point_info = (await point).get('point')
-        stock_info = (await stock).get('stock')
-        rename_field(stock_info, ('stock_id', 'id'))
-        rename_field(stock_info['cart'], [('cart_id', 'id'), ('cart_amount', 'amount')])
-        for product in stock_info['cart']['products']:
-            rename_field(product, ('product_amount', 'amount'))
-        partner = dict(
-            address_short=point_info.get('point_info'),
-            open_partner_schedule=point_info.get('open_partner_schedule'),
-            close_partner_schedule=point_info.get('close_partner_schedule'),
-            logo_path=brand_info.get('logo_path'),
-            name=brand_info.get('title'),
-            id=brand_id
-        )
-        stock_info.pop('points')
-        stock_info.pop('brand_tag')
-        data = dict(stock=stock_info, partner=partner)
+    point_id = stock_info['stock']['points'][0]['point_id']
+    point, brand = await asyncio.gather(
+        get_catalog_object(request, 'point', language_code, point_id=point_id),
+        get_catalog_object(request, 'brand', language_code, brand_tag=brand_tag),
+    )
+    brand_info = brand.get('brand')
+    point_info = point.get('point')
+    stock_info = stock_info.get('stock')
+    rename_field(stock_info, ('stock_id', 'id'))
+    rename_field(stock_info['cart'], [('cart_id', 'id'), ('cart_amount', 'amount')])
+    for product in stock_info['cart']['products']:
+        rename_field(product, ('product_amount', 'amount'))
+    partner = dict(
+        address_short=point_info.get('point_info'),
+        open_partner_schedule=point_info.get('open_partner_schedule'),
+        close_partner_schedule=point_info.get('close_partner_schedule'),
+        logo_path=brand_info.get('logo_path'),
+        name=brand_info.get('title'),
+        id=brand_id
+    )
+    stock_info.pop('points')
+    stock_info.pop('brand_tag')
+    data = dict(stock=stock_info, partner=partner)
     return data
-
-
-async def get_api_response_json(base_request, session, url, method, headers=None, params=None, json=None):
-    try:
-        if method.lower() == 'get':
-            response = await session.get(url, headers=headers, params=params, json=json)
-        elif method.lower() == 'post':
-            response = await session.post(url, headers=headers, params=params, json=json)
-        else:
-            raise NotImplementedError
-    except Exception as ex:
-        raise ApiResponse(31, exc=ex, log_message=f"не удалось выполнить запрос к партнёрскму сервису: "
-                                                  f"{method.upper()}: {url} : {ex}")
-    try:
-        response = await response.json()
-    except Exception as ex:
-        raise ApiResponse(90, exc=ex, log_message=f"не удалось распарсить json: {url}")
-    if response.get('responseCode') != 0:
-        raise ApiResponse(30, log_message=f"Ответ от стороннего сервиса не 0: {url} : "
-                                          f"responseCode = {response.get('responseCode')}")
-    return response.get('data')
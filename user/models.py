@@ -107,4 +107,14 @@ class NoneUser(User):
     unread_banners_count: Any = None
 
 
+class SessionState(BaseModel):
+    """
+    Результат разрешения сессии в auth_middleware (tools.resolve_session)
+    """
+    active: Union[bool, None]
+    have_devices: bool = False
+    have_profile: bool = False
+    need_to_fill_profile: Union[bool, None] = None
+
+
 user_context: ContextVar[User] = ContextVar('user', default=NoneUser())
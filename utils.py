@@ -1,12 +1,14 @@
+import base64
 import codecs
 import itertools
+import json
 import operator
 import os
 import re
 import secrets
-from datetime import datetime, date
+from datetime import datetime
 from random import choice
-from typing import Union, Tuple, List
+from typing import Union, Tuple, List, TYPE_CHECKING
 
 import jsonschema
 from api_utils import ApiResponse, ApiPool
@@ -14,10 +16,18 @@ from asyncpg import Connection
 from loguru import logger
 from pydantic import BaseModel, ValidationError, MissingError, ExtraError
 
+import file_io
+import serializers
 import tools
-from alfa_bank.models import GetOrderStatusExtendedDataResponse
+import validators
+from settings import UPLOAD_CHUNK_SIZE, FEEDBACK_MAX_FILES, FEEDBACK_MAX_FILE_SIZE, FEEDBACK_MAX_TOTAL_SIZE, \
+    FEEDBACK_MAX_FIELD_SIZE, FEEDBACK_IMAGE_MAX_SIDE
 from tools import get_pool_from_request
 
+if TYPE_CHECKING:
+    # alfa_bank.views импортирует utils: импорт пакета alfa_bank отсюда замкнул бы цикл при импорте utils первым
+    from alfa_bank.models import GetOrderStatusExtendedDataResponse
+
 
 def get_bool_param(request, name, required=True, default=False):
     param = request.query.get(name)
@@ -53,6 +63,36 @@ def get_page(request):
     return limit, offset
 
 
+def encode_cursor(created_date, id_) -> str:
+    """ Непрозрачный курсор страницы: позиция (created_date, id) последней строки """
+    raw = json.dumps([created_date.isoformat(), id_]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        created_date, id_ = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_date), int(id_)
+    except (ValueError, TypeError) as exc:
+        raise ApiResponse(13, exc=exc, log_message=f'некорректный cursor={cursor}')
+
+
+def get_cursor(request):
+    """
+    (created_date, id) из параметра cursor или None. Если cursor передан, страница начинается после этой позиции
+    и offset не учитывается
+    """
+    cursor = request.query.get('cursor')
+    return None if cursor is None else decode_cursor(cursor)
+
+
+def next_cursor(rows, limit, date_key='created_date', id_key='id'):
+    """ Курсор следующей страницы или None, если страница последняя """
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1][date_key], rows[-1][id_key])
+
+
 def group_data(data: list, group_keys, group_name: str):
     result = []
     by_value = operator.itemgetter(*group_keys)
@@ -92,27 +132,9 @@ def convert_data(result, formatting_datetime=None, formatting_float=None):
     """
     if result is None:
         return None
-    elif isinstance(result, list):
-        for i in range(len(result)):
-            result[i] = convert_data(result[i], formatting_datetime, formatting_float)
-    else:
-        result = dict(result)
-        if formatting_datetime or formatting_float:
-            if isinstance(formatting_float, dict):
-                if isinstance(formatting_float['keys'], dict):
-                    for key in formatting_float['keys'].keys():
-                        result[key] = to_fixed(result[key], formatting_float['keys'][key])
-                elif isinstance(formatting_float['keys'], (set, tuple, list)):
-                    for key in formatting_float['keys']:
-                        result[key] = to_fixed(result[key], formatting_float['n'])
-            for key in result.keys():
-                if isinstance(formatting_float, int):
-                    if formatting_float and isinstance(result[key], float):
-                        result[key] = to_fixed(result[key], formatting_float)
-                if formatting_datetime and (isinstance(result[key], (datetime, date))):
-                    result[key] = datetime.strftime(result[key], formatting_datetime)
-
-    return result
+    if isinstance(result, list):
+        return serializers.convert_rows(result, formatting_datetime, formatting_float)
+    return serializers.convert_row(result, formatting_datetime, formatting_float)
 
 
 def to_fixed(obj, digits=2):
@@ -124,9 +146,7 @@ def validate_data(data, schema):
         return None
     try:
         if isinstance(schema, dict) or isinstance(schema, list):
-            jsonschema.validate(data, schema,
-                                format_checker=jsonschema.FormatChecker(
-                                    formats=['date', 'date-time', 'phone', 'email', 'digitstr', 'str_bool']))
+            validators.check(data, schema)
         elif issubclass(schema, BaseModel):
             return schema(**data)
     except ValidationError as exceptions:
@@ -138,19 +158,12 @@ def validate_data(data, schema):
                 raise ApiResponse(14)
         raise ApiResponse(13)
     except jsonschema.exceptions.ValidationError as exc:
-        if exc.validator == 'required':
-            raise ApiResponse(12)
-        if exc.validator == 'additionalProperties':
-            raise ApiResponse(14)
-        else:
-            raise ApiResponse(13)
+        validators.raise_api_response(exc)
 
 
 async def validate_data_with_block(request, data, schema):
     try:
-        jsonschema.validate(data, schema,
-                            format_checker=jsonschema.FormatChecker(
-                                formats=['date', 'date-time', 'phone', 'email', 'digitstr']))
+        validators.check(data, schema, validators.format_checker_with_block)
 
     except jsonschema.exceptions.ValidationError as exc:
         logger.warning(f'validate_data_with_block: Сессия заблокирована, data={data} не соответствует схеме')
@@ -197,27 +210,90 @@ def rename_field(row: dict, names: Union[Tuple[str, str], List[Tuple[str, str]]]
 
 
 class RequestFileSaver:
+    """
+    Потоковое чтение multipart-формы. Файлы из поля form_name пишутся на диск частями по UPLOAD_CHUNK_SIZE
+    через пул потоков file_io, без буферизации всего тела запроса в памяти, остальные поля возвращаются словарем.
+    При превышении ограничений на количество и размер файлов уже записанные файлы удаляются
+    """
 
-    def __init__(self, form_name, upload_folder):
+    def __init__(self, form_name, upload_folder, max_files=FEEDBACK_MAX_FILES, max_file_size=FEEDBACK_MAX_FILE_SIZE,
+                 max_total_size=FEEDBACK_MAX_TOTAL_SIZE, image_max_side=FEEDBACK_IMAGE_MAX_SIDE):
         self._form_name = form_name
         self._upload_folder = upload_folder
+        self._max_files = max_files
+        self._max_file_size = max_file_size
+        self._max_total_size = max_total_size
+        self._image_max_side = image_max_side
+
+    @staticmethod
+    def _make_filename(part):
+        extension = 'jpg'
+        if part.filename:
+            extension = re.sub(r'[^A-Za-z0-9]', '', part.filename.split('.')[-1])[:10] or extension
+        return secrets.token_urlsafe(64) + '.' + extension
+
+    async def _save_part(self, part, path, total_size):
+        size = 0
+        f = await file_io.run(open, path, 'wb')
+        try:
+            while True:
+                chunk = await part.read_chunk(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self._max_file_size or total_size + size > self._max_total_size:
+                    raise ApiResponse(13, log_message=f'превышен допустимый размер файла {part.filename}')
+                await file_io.run(f.write, chunk)
+        finally:
+            await file_io.run(f.close)
+        return size
+
+    @staticmethod
+    async def _read_field(part, total_size):
+        data = bytearray()
+        while True:
+            chunk = await part.read_chunk(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            data.extend(chunk)
+            if len(data) > FEEDBACK_MAX_FIELD_SIZE or total_size + len(data) > FEEDBACK_MAX_TOTAL_SIZE:
+                raise ApiResponse(13, log_message=f'превышен допустимый размер поля {part.name}')
+        return data.decode(part.get_charset(default='utf-8')), len(data)
+
+    async def read(self, request) -> Tuple[dict, List[str]]:
+        reader = await request.multipart()
+        fields, filenames = {}, []
+        total_size = 0
+        try:
+            while True:
+                part = await reader.next()
+                if part is None:
+                    break
+                if part.name != self._form_name:
+                    fields[part.name], size = await self._read_field(part, total_size)
+                    total_size += size
+                    continue
+                if part.filename == '':
+                    # пустое поле выбора файла: браузер присылает часть с filename="" и без содержимого
+                    continue
+                if len(filenames) >= self._max_files:
+                    raise ApiResponse(13, log_message=f'превышено количество файлов в форме {self._form_name}')
+                path = os.path.join(self._upload_folder, self._make_filename(part))
+                filenames.append(path)
+                size = await self._save_part(part, path, total_size)
+                if size == 0:
+                    # пустой файл не отправить во вложении письма
+                    await file_io.run(file_io.remove_files, [filenames.pop()])
+                    continue
+                total_size += size
+                await file_io.run(file_io.downsize_image, path, self._image_max_side)
+        except BaseException:
+            await file_io.run(file_io.remove_files, filenames)
+            raise
+        return fields, filenames
 
     async def save_files(self, request):
-        post = await request.post()
-
-        images = post.getall(self._form_name, [''])
-        filenames = []
-        if images != ['']:
-            for image in images:
-                if isinstance(image, bytearray):
-                    filename = secrets.token_urlsafe(64) + '.jpg'
-                    with open(os.path.join(self._upload_folder, filename)) as f:
-                        f.write(image)
-                else:
-                    filename = secrets.token_urlsafe(64) + '.' + image.filename.split('.')[-1]
-                    with open(os.path.join(self._upload_folder, filename), 'wb') as f:
-                        f.write(image.file.read())
-                    filenames.append(os.path.join(self._upload_folder, filename))
+        _, filenames = await self.read(request)
         return filenames
 
 
@@ -255,7 +331,7 @@ def mask_pans(raw):
     return re.sub('[0-9]{6}\*\*[0-9]{4}', '######**####', str(raw))
 
 
-async def save_email_for_receipts(confirmation_data: GetOrderStatusExtendedDataResponse, profile_id):
+async def save_email_for_receipts(confirmation_data: 'GetOrderStatusExtendedDataResponse', profile_id):
     conn: Connection
     try:
         email = confirmation_data.orderBundle.customerDetails.email
@@ -1,4 +1,3 @@
-from asyncio import sleep
 from datetime import datetime
 
 from aiohttp import web
@@ -7,8 +6,8 @@ from asyncpg import Connection
 from loguru import logger
 from pydantic import BaseModel
 
-import alfa_bank
 import pss
+from payment_status import poll_status
 from tools import get_data_from_request
 from user.models import User
 from utils import validate_data
@@ -25,20 +24,11 @@ class BindCardView(web.View):
         data = await get_data_from_request(self.request)
         params = validate_data(data, self.PostInputData)
         async with ApiPool.get_pool().acquire() as conn:
-
             card_row = await conn.fetchrow('select * from premium_cards where id = $1', params.card_id)
-            attempts = 0
-            while True:
-                attempts += 1
-                confirmation_data = await alfa_bank.GetOrderStatusExtended.post(
-                    alfa_bank.GetOrderStatusExtended.input_post_model(orderId=card_row.get('bank_order_id')),
-                    raise_api_response=False)
-                order_status = confirmation_data.order_status
-                if order_status != 0 or attempts > 5:
-                    break
-                await sleep(1)
-                attempts += 1
+        # опрос банка с паузами - без соединения с БД
+        confirmation_data = await poll_status(card_row.get('bank_order_id'), raise_api_response=False)
 
+        async with ApiPool.get_pool().acquire() as conn:
             customer_id = await conn.fetchval('select uid from profiles where id = $1', card_row.get('profile_id'))
             expire_date = datetime.strptime(confirmation_data.cardAuthInfo.expiration, '%Y%m')
             pss_j_model = pss.BindCard.input_post_model(
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+import jsonschema
+from api_utils import ApiResponse
+from jsonschema.exceptions import best_match
+
+import schemas
+
+FORMATS = ['date', 'date-time', 'phone', 'email', 'digitstr', 'str_bool']
+FORMATS_WITH_BLOCK = ['date', 'date-time', 'phone', 'email', 'digitstr']
+
+# общие для всех валидаторов, состояния не хранят
+format_checker = jsonschema.FormatChecker(formats=FORMATS)
+format_checker_with_block = jsonschema.FormatChecker(formats=FORMATS_WITH_BLOCK)
+
+
+class ValidatorRegistry:
+    """
+    Скомпилированные валидаторы jsonschema: схема проверяется и валидатор создается один раз на схему.
+    Схемы из schemas.py регистрируются при импорте, прочие - при первой проверке
+    (таких хранится не больше max_size, давно не использованные вытесняются).
+    Ключ - id схемы; объект схемы хранится вместе с валидатором, поэтому его id не может быть переиспользован
+    """
+
+    def __init__(self, max_size=256):
+        self._max_size = max_size
+        self._registered = {}
+        self._dynamic = OrderedDict()
+
+    @staticmethod
+    def compile(schema, checker):
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        return cls(schema, format_checker=checker)
+
+    def register(self, schema):
+        for checker in (format_checker, format_checker_with_block):
+            self._registered[(id(schema), id(checker))] = (schema, self.compile(schema, checker))
+
+    def register_module(self, module):
+        for name in dir(module):
+            value = getattr(module, name)
+            if name.isupper() and isinstance(value, dict):
+                self.register(value)
+
+    def get(self, schema, checker=format_checker):
+        key = (id(schema), id(checker))
+        entry = self._registered.get(key)
+        if entry is None:
+            entry = self._dynamic.get(key)
+            if entry is None:
+                entry = self._dynamic[key] = (schema, self.compile(schema, checker))
+                while len(self._dynamic) > self._max_size:
+                    self._dynamic.popitem(last=False)
+            self._dynamic.move_to_end(key)
+        return entry[1]
+
+    def __len__(self):
+        return len(self._registered) + len(self._dynamic)
+
+
+registry = ValidatorRegistry()
+registry.register_module(schemas)
+
+
+def check(data, schema, checker=format_checker):
+    """ То же, что jsonschema.validate(data, schema, format_checker=checker), но валидатором из registry """
+    error = best_match(registry.get(schema, checker).iter_errors(data))
+    if error is not None:
+        raise error
+
+
+def raise_api_response(exc: jsonschema.exceptions.ValidationError):
+    """ Код ответа по ошибке jsonschema: 12 - нет обязательного поля, 14 - лишнее поле, 13 - прочие ошибки """
+    if exc.validator == 'required':
+        raise ApiResponse(12)
+    if exc.validator == 'additionalProperties':
+        raise ApiResponse(14)
+    raise ApiResponse(13)
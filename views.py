@@ -8,8 +8,18 @@ from aiohttp_session import get_session
 from loguru import logger
 from pydantic import BaseModel
 import asyncio
+import encoders
 import schemas
 import tools
+import tools_ext
+from banner_counters import banner_counters
+from payment_status import payment_status_worker
+from blacklist import ip_blacklist
+from pss.cache import pss_catalog
+from pss.products import product_catalog
+from shared_cache import shared_cache
+from response_cache import response_cache
+from system_parameters import system_parameters
 import utils
 from api_utils import ApiResponse
 from settings import *
@@ -35,7 +45,15 @@ async def root_handler(request):
                               ip_remote=ip_a,
                               ip_x_real_ip=host_r,
                               host_x_forwarded_for=host_x,
-                              peer_name=peer_name))
+                              peer_name=peer_name,
+                              ip_blacklist=ip_blacklist.metrics(),
+                              banner_counters=banner_counters.metrics(),
+                              payment_status=payment_status_worker.metrics(),
+                              system_parameters=system_parameters.metrics(),
+                              response_cache=response_cache.metrics(),
+                              pss_catalog=pss_catalog.metrics(),
+                              product_catalog=product_catalog.metrics(),
+                              shared_cache=shared_cache.metrics()))
 
 
 @routes.post(ROUTE_REGISTER)
@@ -246,12 +264,10 @@ async def confirm_code(request):
                 # ----------------проверка на наличие баннеров профиля
                 result_b = await tools.check_confirm_banners(request)
                 if not result_b:
-                    list_id = await tools.get_list_id_banners(request)
-                    list_id_ = utils.convert_data(list_id)
-                    for banner_ in list_id_:
-                        await tools.insert_into_banners_to_profiles(request, banner_['id'])
-                else:
-                    pass
+                    if BANNERS_ASSIGN_DEFERRED:
+                        asyncio.ensure_future(tools.assign_banners_in_background(pool, request.get('profile_id')))
+                    else:
+                        await tools.assign_banners_to_profile(pool, request.get('profile_id'))
                 # --------------------------------------------------
                 raise ApiResponse(0, data=data_response)
             else:
@@ -558,7 +574,7 @@ async def take_logs(request):
 async def reload_params(request):
     error = None
     try:
-        res = tools.read_sys_params(request.app)
+        res = await tools.read_sys_params(request.app)
         logger.info(f'{res}')
     except Exception as exc:
         error = str(exc)
@@ -852,6 +868,7 @@ class GetBanners(web.View):
         airport_id: Optional[int] = None
         limit_offset: Optional[int] = 20
         offset: Optional[int] = 0
+        after_id: Optional[int] = None
 
         class Config:
             extra = 'forbid'
@@ -865,6 +882,7 @@ class GetBanners(web.View):
         @apiParam {int} [category_id] категория баннера 
         @apiParam {int} [limit_offset=20] количество баннеров
         @apiParam {int} [offset=0] от какого баннера
+        @apiParam {int} [after_id] id последнего баннера предыдущей страницы (data.next_after_id), вместо offset
        @apiSuccess (200) {int} responseCode Код ошибки (0 - нет ошибки)
        @apiSuccess (200) {string} responseMessage  Описание ошибки, ответа
        @apiExample Request-Example:
@@ -888,7 +906,8 @@ class GetBanners(web.View):
                 "single_preview_square_image_url": "https://developer.mileonair.com/resources/Banner/photo.png"
             }
         ],
-        "total_count": 1
+        "total_count": 1,
+        "next_after_id": null
     }
 }
 
@@ -910,48 +929,20 @@ class GetBanners(web.View):
         params = utils.validate_data(self.request.query, self.InputGetData)
         language_code = self.request.get('locale', 'ru')
 
-        if params.category_id is None and params.airport_id is None:  # 00 category = none airport = none
-            banners = await tools.get_all_banners(self.request, language_code,
-                                                  params.limit_offset, params.offset)
-
-        elif params.category_id is not None and params.airport_id is None:  # 01 category = notNone airport = none
-            banners = await tools.get_banner_category(self.request, params.category_id, language_code,
-                                                      params.limit_offset, params.offset)
-
-        elif params.category_id is None and params.airport_id is not None:  # 10 category = none airport = notNone
-            banners = await tools.get_banners_airport(self.request, params.airport_id, language_code,
-                                                      params.limit_offset, params.offset)
-
-        elif params.category_id is not None and params.airport_id is not None:  # 11 category = notNone airport = notNone
-            banners = await tools.get_banners_category_airport(self.request, params.airport_id, language_code,
-                                                               params.category_id, params.limit_offset, params.offset)
-
-        else:
-            banners = None
-
-        list_banners = []
-        # await tools.update_banner_count_to_profile(self.request)
+        snapshot = await tools_ext.banners_feed.get(tools.get_pool_from_request(self.request), language_code)
+        banners, next_after_id = snapshot.page(params.category_id, params.airport_id, params.limit_offset,
+                                               params.offset, params.after_id)
+        total_count = snapshot.total_count(params.category_id, params.airport_id)
         await tools.update_status_banner_to_profile(self.request)
-        if not banners:
-            total_count = 0
-            raise ApiResponse(0, {'banners': list_banners, 'total_count': total_count})
-
-        for banner in banners:
-            dict_banner = dict(banner)
-            del dict_banner['total_count']
-            list_banners.append(dict_banner)
-        logger.info(f'Запрос выполнен для получения баннеров выполнен')
-
-        if banners is not None:
-            total_count = banners[0]['total_count']
-        else:
-            total_count = 0
 
-        if len(list_banners):
-            image_url = await tools.get_single_square_image_url(self.request, list_banners[0]['id'])
-            list_banners[0]['single_preview_square_image_url'] = image_url
+        list_banners = [dict(banner) for banner in banners]
+        # single_preview_square_image_url отдается только для первого баннера страницы
+        for dict_banner in list_banners[1:]:
+            dict_banner.pop('single_preview_square_image_url')
+        logger.info(f'Запрос выполнен для получения баннеров выполнен')
 
-        raise ApiResponse(0, {'banners': list_banners, 'total_count': total_count})
+        raise encoders.api_response(0, {'banners': list_banners, 'total_count': total_count,
+                                        'next_after_id': next_after_id})
 
 
 @routes.view(ROUTE_BANNERS_CATEGORIES)
@@ -1101,22 +1092,13 @@ class PopupBanner(web.View):
     async def get(self):
 
         language_code = self.request.get('locale', 'ru')
-        popup_banners = await tools.get_popup_banner(self.request, language_code)
-        list_popup_banners = []
-        if popup_banners:
-            for banner in popup_banners:
-                dict_banner = dict(banner)
-                dict_banner_ = await tools.check_promotion(self.request, dict_banner['banner_id'], dict_banner)
-                if await tools.check_show_popup(self.request, dict_banner_):
-                    if "redirect" in dict_banner_:
-                        dict_banner_ = tools.change_title_for_redirect_banner(dict_banner_, language_code)
-                    list_popup_banners.append(dict_banner_)
-
-                logger.info(f'Отобраны попап баннеры')
-
-        max_count_popup_show = await tools.max_count(self.request)
-
-        raise ApiResponse(0, list_popup_banners[0:int(max_count_popup_show)])
+        popup_banners = await tools.select_popup_banners(self.request, language_code,
+                                                          system_parameters.popup_max_count or 0)
+        list_popup_banners = [tools.change_title_for_redirect_banner(banner, language_code)
+                              for banner in popup_banners]
+        logger.info(f'Отобраны попап баннеры')
+
+        raise ApiResponse(0, list_popup_banners)
 
 
 
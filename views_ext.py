@@ -7,7 +7,6 @@ from abc import abstractmethod, ABC
 from asyncio import CancelledError, create_task
 from typing import Optional, List
 
-import aiohttp
 import aiohttp_jinja2
 from aiohttp import http_parser
 from aiohttp import web
@@ -19,7 +18,10 @@ from pydantic import validator
 from pydantic.main import BaseModel
 
 import alfa_bank
+import encoders
 import kassa
+import order_state
+import payment_status
 import pss
 import schemas
 import tools
@@ -30,12 +32,19 @@ from alfa_bank import create_bundle
 from models import OrderModel
 from order.models import OnpassOrder
 from profile import Profile as ProfileObj, EmailAddress
+from pss.batch import fetch_orders, gather_bounded, make_deadline, iter_pages
+from pss import products as pss_products
+from pss.decode import parse
 from queries import *
 from sendmail import send_mail_async
 from settings import *
+from payment_status import payment_status_worker
+from response_cache import cached_response, response_cache
+from system_parameters import system_parameters
 from confirm_email.views import SendEmail
+from http_clients import HttpClients
 from user.models import User, Profile as profile_find
-from utils import convert_data, validate_data, get_page, get_bool_param, \
+from utils import convert_data, validate_data, get_page, get_cursor, next_cursor, get_bool_param, \
     group_data, get_language_id, to_int, rename_field, RequestFileSaver, get_redirect_url, save_email_for_receipts, validate_data
 from pydantic import ValidationError
 routes = web.RouteTableDef()
@@ -132,7 +141,6 @@ class Profile(ApiView):
             }
 
         """
-        await tools.check_banners(self.request)
         profile = await ProfileObj.get_by_session(self.session)
         return ApiResponse(0, profile)
 
@@ -195,6 +203,7 @@ class Profile(ApiView):
 @routes.view(ROUTE_AIRPORTS)
 class Airports(web.View):
 
+    @cached_response('airports')
     async def get(self):
         """
 
@@ -298,26 +307,14 @@ class Airports(web.View):
         """
 
         pool = tools.get_pool_from_request(self.request)
-        async with pool.acquire() as conn:
-            async with conn.transaction():
-
-                airports = await conn.fetch(GET_AIRPORTS)
-                convert_data(airports)
-                airports_id_list = [row['id'] for row in airports]
-                terminals_prepared = await conn.prepare(GET_TERMINALS)
-                for airport in airports:
-                    terminals = convert_data(await terminals_prepared.fetch(airport.get('id')))
-                    if terminals:
-                        airport['terminals'] = terminals
-                translates = await conn.fetch(GET_AIRPORTS_TRANSLATE, airports_id_list)
-                convert_data(translates, formatting_datetime=FORMAT_DATE_TIME)
-        data = {'airports': airports, 'translates': translates}
+        data = await tools_ext.airports_tree.get(pool)
         raise ApiResponse(0, data)
 
 
 @routes.view(ROUTE_PARAMETERS)
 class Parameters(web.View):
 
+    @cached_response('system_parameters')
     async def get(self):
         """
         @api {get} https://developer.mileonair.com/api/v1/parameters Системные параметры
@@ -368,6 +365,7 @@ class Parameters(web.View):
 @routes.view(ROUTE_LANGUAGES)
 class Languages(web.View):
 
+    @cached_response('languages')
     async def get(self):
         """
 
@@ -517,6 +515,7 @@ class Hashes(web.View):
         pool = tools.get_pool_from_request(self.request)
         async with pool.acquire() as conn:
             data = await conn.fetch(GET_HASHES_QUERY)
+        response_cache.set_hashes(data)
         data = convert_data(data)
         data = {'hashes': data}
 
@@ -555,19 +554,18 @@ class Feedback(web.View):
               "responseMessage": "Запрос обработан успешно"
             }
         """
-        # params = await tools.get_data_from_request((await self.request.post()))
-        params = dict(await self.request.post())
+        filenames = None
+        if self.request.content_type == 'multipart/form-data':
+            saver = RequestFileSaver('photo', FEEDBACK_IMAGES_FOLDER)
+            params, filenames = await saver.read(self.request)
+            filenames = filenames or None
+        else:
+            params = dict(await self.request.post())
 
         if params == {}:
             logger.debug('формы пустые')
             params = await tools.get_data_from_request(self.request)
             logger.debug(f'params={params}')
-        if params.get('photo') is not None:
-            saver = RequestFileSaver('photo', FEEDBACK_IMAGES_FOLDER)
-            filenames = await saver.save_files(self.request)
-            params.pop('photo')
-        else:
-            filenames = None
         validate_data(params, schemas.POST_FEEDBACK_SCHEMA)
         phone = self.request.get('phone_number', None)
         message = params.get('message')
@@ -602,6 +600,7 @@ class Feedback(web.View):
 @routes.view(ROUTE_FAQ)
 class Faq(web.View):
 
+    @cached_response('faq')
     async def get(self):
         """
 
@@ -660,7 +659,7 @@ class Faq(web.View):
         pool = tools.get_pool_from_request(self.request)
         language_id = await get_language_id(self.request)
         async with pool.acquire() as conn:
-            data = await conn.fetch(GET_FAQ_QUERY, language_id)
+            data = await conn.fetch(GET_FAQ_QUERY, language_id, system_parameters.resource_server_url)
         convert_data(data)
         data = {'faq': data}
 
@@ -683,6 +682,7 @@ class Notifications(web.View):
 
         @apiParam {int} [limit=20] Ограничение количества выводимых оповещений
         @apiParam {int} [offset=0] Отступ пагинации
+        @apiParam {string} [cursor] Курсор следующей страницы (data.next_cursor), вместо offset
 
         @apiExample Request-Example:
             https://developer.mileonair.com/api/v1/notifications?limit=5&offset=0
@@ -693,6 +693,7 @@ class Notifications(web.View):
         @apiSuccess (200) {list}   data.notifications   Список оповещений
         @apiSuccess (200) {string}   data.notifications.message Текст оповещения
         @apiSuccess (200) {string}   data.notifications.created_date Время создания оповещения
+        @apiSuccess (200) {string}   [data.next_cursor] Курсор следующей страницы, null на последней странице
 
 
 
@@ -723,18 +724,24 @@ class Notifications(web.View):
 
         """
         limit, offset = get_page(self.request)
+        cursor = get_cursor(self.request)
         pool = tools.get_pool_from_request(self.request)
         async with pool.acquire() as conn:
-            data = await conn.fetch(GET_NOTIFICATIONS_QUERY, self.request.get("profile_id"), limit, offset)
+            if cursor is None:
+                data = await conn.fetch(GET_NOTIFICATIONS_QUERY, self.request.get("profile_id"), limit, offset)
+            else:
+                data = await conn.fetch(GET_NOTIFICATIONS_AFTER_QUERY, self.request.get("profile_id"), limit, *cursor)
 
+        cursor = next_cursor(data, limit)
         convert_data(data, formatting_datetime=FORMAT_DATE_TIME)
-        data = {'notifications': data}
+        data = {'notifications': data, 'next_cursor': cursor}
 
         raise ApiResponse(0, data)
 
 
 @routes.view(ROUTE_CITIES)
 class Cities(web.View):
+    @cached_response('cities')
     async def get(self):
         """
 
@@ -912,42 +919,42 @@ class WalletCard(ApiView):
         moa_sid = tools.get_moa_sid_from_req(self.request)
         pool = tools.get_pool_from_request(self.request)
         async with pool.acquire() as conn:
-            async with conn.transaction():
-                row = await conn.fetchrow(
-                    'select pqr, first_name, last_name, phone_number, os, os_version from profiles '
-                    'inner join sessions on profiles.id = sessions.profile_id '
-                    'inner join devices on sessions.device_id = devices.id where sid = $1', moa_sid)
-                pqr = row.get('pqr')
-                first_name = row.get('first_name')
-                last_name = row.get('last_name')
-                phone_number = row.get('phone_number')
-                operating_system = row.get('os')
-                os_version = row.get('os_version')
-
-                async with aiohttp.ClientSession() as session:
-                    request_body = {"pqr": pqr,
-                                    'first_name': first_name,
-                                    'last_name': last_name,
-                                    'phone_number': phone_number,
-                                    'os': operating_system,
-                                    'os_version': os_version,
-                                    'language_code': self.language_code
-                                    }
-                    card_type = self.request.query.get("type")
-                    if card_type is not None:
-                        request_body.update({"type": card_type})
-                    resp = await session.post(f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard',
-                                              json=request_body)
-                    try:
-                        logger.debug(f'sending request to '
-                                     f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard Body json: {request_body} ')
-                        response = await resp.json()
-                        url = response['data']['url']
-                    except Exception:
-                        logger.debug(f'response from '
-                                     f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard: {response} ')
-                        raise ApiResponse(30)
-            raise ApiResponse(0, {'url': url})
+            row = await conn.fetchrow(
+                'select pqr, first_name, last_name, phone_number, os, os_version from profiles '
+                'inner join sessions on profiles.id = sessions.profile_id '
+                'inner join devices on sessions.device_id = devices.id where sid = $1', moa_sid)
+        pqr = row.get('pqr')
+        first_name = row.get('first_name')
+        last_name = row.get('last_name')
+        phone_number = row.get('phone_number')
+        operating_system = row.get('os')
+        os_version = row.get('os_version')
+
+        # запрос к сервису карт - без соединения с БД
+        session = HttpClients.get(HttpClients.WALLET)
+        request_body = {"pqr": pqr,
+                        'first_name': first_name,
+                        'last_name': last_name,
+                        'phone_number': phone_number,
+                        'os': operating_system,
+                        'os_version': os_version,
+                        'language_code': self.language_code
+                        }
+        card_type = self.request.query.get("type")
+        if card_type is not None:
+            request_body.update({"type": card_type})
+        resp = await session.post(f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard',
+                                  json=request_body)
+        try:
+            logger.debug(f'sending request to '
+                         f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard Body json: {request_body} ')
+            response = await resp.json()
+            url = response['data']['url']
+        except Exception:
+            logger.debug(f'response from '
+                         f'https://{IS_DEV_PREFIX}cl.maocloud.ru/api/v1/walletCard: {response} ')
+            raise ApiResponse(30)
+        raise ApiResponse(0, {'url': url})
 
 
 # ----------------- партнёры ----------------------
@@ -956,6 +963,7 @@ class WalletCard(ApiView):
 @routes.view(ROUTE_PARTNER_CATEGORIES)
 class PartnerCategories(web.View):
 
+    @cached_response('partner_categories')
     async def get(self):
         """
 
@@ -1135,14 +1143,11 @@ class PartnersInAirport(web.View):
 
         brands = await tools_ext.get_brands(self.request, language_code, airport_id=params.airport_id,
                                             category_id=params.category_id, limit=params.limit, offset=params.offset,
-                                            point_id=params.point_id)
+                                            point_id=params.point_id, with_photos=True)
 
         resource_url = await tools_ext.get_resource_server_url(self.request)
         try:
             for i, brand in enumerate(brands):
-                brands[i]['photo_paths'] = [x['photo_paths'] for x in await tools_ext.get_photo_to_point(self.request,
-                                                                                                         brand[
-                                                                                                             'point_id'])]
                 for j, item in enumerate(brands[i]['photo_paths']):
 
                     if item is not None:
@@ -1169,7 +1174,7 @@ class PartnersInAirport(web.View):
 
         data = dict(partners_in_airport=data)
 
-        raise ApiResponse(0, data)
+        raise encoders.api_response(0, data)
 
 
 @routes.view(ROUTE_PARTNERS_CITIES)
@@ -1350,6 +1355,7 @@ class PartnersRelevant(web.View):
 
 @routes.view(ROUTE_INFO)
 class Info(web.View):
+    @cached_response('information')
     async def get(self):
         """
 
@@ -1487,9 +1493,9 @@ class Geo(web.View):
         headers = {'Authorization': f'Bearer {config.callback_service.token}'}
         url = f'{config.callback_service.url}pushes/geo'
         try:
-            async with aiohttp.ClientSession() as session:
-                await tools_ext.get_api_response_json(self.request, session, url, 'post', headers,
-                                                      json=json_body)
+            session = HttpClients.get(HttpClients.CALLBACK)
+            await tools_ext.get_api_response_json(self.request, session, url, 'post', headers,
+                                                  json=json_body)
             logger.info(f'запрос успешно доставлен на {url}, код ответа 0')
         except ApiResponse:
             pass
@@ -1569,7 +1575,8 @@ class Promotions(ApiView):
 
         async with self.pool.acquire() as conn:
             async with conn.transaction():
-                data = await conn.fetch(GET_PROMOTIONS_QUERY, params.active, language_id, limit, offset)
+                data = await conn.fetch(GET_PROMOTIONS_QUERY, params.active, language_id, limit, offset,
+                                        system_parameters.resource_server_url)
                 convert_data(data, formatting_datetime=FORMAT_DATE_TIME)
 
         data = {'promotions': data}
@@ -1604,9 +1611,9 @@ class Stocks(web.View):
                     params.update(dict(brand_tag=brand_tag))
 
         try:
-            async with aiohttp.ClientSession() as session:
-                response = await session.get(url, headers=headers, params=params, timeout=2)
-                response_data = await response.json()
+            session = HttpClients.get(HttpClients.PSS)
+            response = await session.get(url, headers=headers, params=params, timeout=2)
+            response_data = await response.json()
         except CancelledError:
             raise
         except Exception as ex:
@@ -1630,7 +1637,7 @@ class Stocks(web.View):
             raise ApiResponse(30, exc=ex, log_message=f"не удалось прочитать ответ партнёрского сервиса: {url} : {ex}")
 
         data = {"stocks": stocks}
-        raise ApiResponse(0, data)
+        raise encoders.api_response(0, data)
 
     async def get(self):
         """
@@ -2254,6 +2261,7 @@ class OrdersView(web.View):
         @apiParam {bool="true", "false"} active Выбор между активными заказами и архивом.
         @apiParam {int} [limit=20] Ограничение количества выводимых значений
         @apiParam {int} [offset=0] Отступ пагинации
+        @apiParam {string} [cursor] Курсор следующей страницы (data.next_cursor), вместо offset
 
 
         @apiDescription Возвращает список заказов
@@ -2262,6 +2270,7 @@ class OrdersView(web.View):
         @apiSuccess (200) {string} responseMessage  Описание ошибки, ответа
         @apiSuccess (200) {dict} data  Словарь с данными
         @apiSuccess (200) {list}   data.orders  Список заказов
+        @apiSuccess (200) {string}   [data.next_cursor] Курсор следующей страницы, null на последней странице
         @apiSuccess (200) {bool}   data.orders.custom Указатель является ли заказ персональным
         @apiSuccess (200) {string}   data.orders.qr QR код
         @apiSuccess (200) {string}   data.orders.order_id id заказа
@@ -2315,23 +2324,24 @@ class OrdersView(web.View):
         pool = tools.get_pool_from_request(self.request)
         active = get_bool_param(self.request, 'active', required=True)
         limit, offset = get_page(self.request)
+        cursor = get_cursor(self.request)
         async with pool.acquire() as conn:
-            orders = await conn.fetch(GET_ORDERS_QUERY, self.request.get('profile_id'), active, limit, offset)
-        tasks = list()
-        for order in orders:
-            order_id = order.get('order_id')
-            qr = order.get('qr')
-            pss_qr = order.get('pss_qr')
-            prepared_order = asyncio.create_task(OrderView.get_order(self.request, order_id, qr, pss_qr))
-            tasks.append(prepared_order)
-        data = list()
-        for order in tasks:
-            try:
-                data.append(await order)
-            except ApiResponse:
-                logger.error(f'не удалось получить информацию о заказае')
-                continue
-        raise ApiResponse(0, dict(orders=data))
+            if cursor is None:
+                orders = await conn.fetch(GET_ORDERS_QUERY, self.request.get('profile_id'), active, limit, offset)
+            else:
+                orders = await conn.fetch(GET_ORDERS_AFTER_QUERY, self.request.get('profile_id'), active, limit,
+                                          *cursor)
+        deadline = make_deadline()
+        pss_orders = await fetch_orders(self.request, [order.get('pss_qr') for order in orders], deadline=deadline)
+        data = await gather_bounded(
+            (OrderView.get_order(self.request, order.get('order_id'), order.get('qr'), order.get('pss_qr'),
+                                 pss_orders[order.get('pss_qr')])
+             for order in orders if order.get('pss_qr') in pss_orders),
+            deadline=deadline)
+        data = [order for order in data if order is not None]
+        if len(data) < len(orders):
+            logger.error(f'не удалось получить информацию о {len(orders) - len(data)} из {len(orders)} заказов')
+        raise ApiResponse(0, dict(orders=data, next_cursor=next_cursor(orders, limit, id_key='order_id')))
 
 
 @routes.view(ROUTE_ORDER)  # todo добавить информацию о точке продаж
@@ -2556,14 +2566,17 @@ class OrderView(web.View):
         raise ApiResponse(0, data)
 
     @staticmethod
-    async def get_order(request, order_id, qr, pss_qr):
-        async with aiohttp.ClientSession() as session:
+    async def get_order(request, order_id, qr, pss_qr, pss_order=None):
+        if pss_order is None:
+            session = HttpClients.get(HttpClients.PSS)
             url = config.pss_service.url + 'seller/order'
             headers = {'Authorization': f'Bearer {config.pss_service.token}'}
             response = await tools_ext.get_api_response_json(request, session, url, 'get', headers,
                                                              params={'qr': pss_qr})
-            response['order']['qr'] = qr
-            response['order']['order_id'] = order_id
+        else:
+            response = dict(order=pss_order)
+        response['order']['qr'] = qr
+        response['order']['order_id'] = order_id
 
         stock_id = response['order'].pop('stock_id')
         # получаем доолнительную информацию о заказае
@@ -2901,63 +2914,58 @@ class OnpassPoint(web.View):
             'Authorization': f'Bearer {config.pss_service.token}'
         }
         params = dict(point_id=point_id, language_code=self.request.get('locale'))
-        async with aiohttp.ClientSession() as session:
-            try:
+        session = HttpClients.get(HttpClients.PSS)
+        try:
 
-                response = await session.get(url, headers=headers, params=params)
-                response_data = await response.json()
-            except CancelledError:
-                raise
-            except Exception as ex:
-                logger.error(f"не удалось выполнить запрос к партнёрскму сервису: {url} : {ex}")
-                raise ApiResponse(31)
-            try:
-                if response_data.get('responseCode') != 0:
-                    logger.error(f"Ответ партнёрского сервиса не 0 партнёрскму сервису: {url}, "
-                                 f"params = {params}, responseCode ={response_data.get('responseCode')}")
-                    raise ApiResponse(30)
-                point = response_data['data'].get('point')
-                if point.get('brand_tag') != 'onpass':
-                    logger.warning('невозможный сценарий)')
-                    return ApiResponse(13)
-            except CancelledError:
-                raise
-            except Exception as ex:
-                logger.error(f"не удалось прочитать ответ партнёрского сервиса: {url} : {ex}")
+            response = await session.get(url, headers=headers, params=params)
+            response_data = await response.json()
+        except CancelledError:
+            raise
+        except Exception as ex:
+            logger.error(f"не удалось выполнить запрос к партнёрскму сервису: {url} : {ex}")
+            raise ApiResponse(31)
+        try:
+            if response_data.get('responseCode') != 0:
+                logger.error(f"Ответ партнёрского сервиса не 0 партнёрскму сервису: {url}, "
+                             f"params = {params}, responseCode ={response_data.get('responseCode')}")
                 raise ApiResponse(30)
+            point = response_data['data'].get('point')
+            if point.get('brand_tag') != 'onpass':
+                logger.warning('невозможный сценарий)')
+                return ApiResponse(13)
+        except CancelledError:
+            raise
+        except Exception as ex:
+            logger.error(f"не удалось прочитать ответ партнёрского сервиса: {url} : {ex}")
+            raise ApiResponse(30)
 
-            async with self._pool.acquire() as conn:
-                prepared_qr = await conn.prepare(QR_CODES_QUERY)
-                purchased_visits_count = 0
-                qr_codes = await prepared_qr.fetchval(point_id, self.request.get('profile_id'))
-                if qr_codes is not None:
-                    for pss_qr in qr_codes:
-                        url = config.pss_service.url + 'seller/order'
-                        headers = {'Authorization': f'Bearer {config.pss_service.token}'}
-                        try:
-                            pss_order = await tools_ext.get_api_response_json(self.request, session, url, 'get',
-                                                                              headers,
-                                                                              params={'qr': pss_qr})
-                        except ApiResponse:
-                            logger.error(f'Ну удалось учесть заказ с pss_qr = {pss_qr}: ')
-                            continue
-                        if not pss_order['order']['refunded']:
-                            for product in pss_order['order']['products']:
-                                purchased_visits_count += product['remainder']
-            custom_info = point.get('custom_info')
-            if custom_info is not None:
-                try:
-                    price = custom_info.pop('price')
-                except:
-                    price = 0
-                if price is None:
-                    price = 0
-                point.update(
-                    dict(
-                        price=price,
-                        purchased_visits_count=purchased_visits_count,
-                    )
+        async with self._pool.acquire() as conn:
+            qr_codes = await conn.fetchval(QR_CODES_QUERY, point_id, self.request.get('profile_id'))
+        purchased_visits_count = 0
+        if qr_codes is not None:
+            pss_orders = await fetch_orders(self.request, qr_codes)
+            for pss_qr in qr_codes:
+                pss_order = pss_orders.get(pss_qr)
+                if pss_order is None:
+                    logger.error(f'Ну удалось учесть заказ с pss_qr = {pss_qr}: ')
+                    continue
+                if not pss_order['refunded']:
+                    for product in pss_order['products']:
+                        purchased_visits_count += product['remainder']
+        custom_info = point.get('custom_info')
+        if custom_info is not None:
+            try:
+                price = custom_info.pop('price')
+            except:
+                price = 0
+            if price is None:
+                price = 0
+            point.update(
+                dict(
+                    price=price,
+                    purchased_visits_count=purchased_visits_count,
                 )
+            )
         products = await self.get_products(dict(point_id=point_id))
         point.update(dict(products=products))
         async with self._pool.acquire() as conn:
@@ -2973,15 +2981,18 @@ class OnpassPoint(web.View):
         raise ApiResponse(0, data)
 
     async def get_products(self, params=None):
+        products = await pss_products.point_products(self.request.get('locale', 'ru'), params.get('point_id'))
+        if products is not None:
+            return products
         try:
             language_code = self.request.get('locale', 'ru')
             params.update({"language_code": language_code})
             url = config.pss_service.url + 'seller/products'
             headers = {'Authorization': f'Bearer {config.pss_service.token}'}
-            async with aiohttp.ClientSession() as session:
-                response = await session.get(url, headers=headers, params=params)
-                data = await response.json()
-                return data.get('data').get('products')
+            session = HttpClients.get(HttpClients.PSS)
+            response = await session.get(url, headers=headers, params=params)
+            data = await response.json()
+            return data.get('data').get('products')
         except Exception as exc:
             logger.error(f"не удалось получить список продуктов для {params}, exc:{exc}")
             return list()
@@ -3024,7 +3035,7 @@ class OnpassPointsInAirport(web.View):
         if pss_response.code != 0:
             logger.error(f'ответ партнёрского сервиса не 0 а {pss_response.code}')
             raise ApiResponse(30)
-        return pss.views.PointsModel(**pss_response.data)
+        return parse(pss.views.PointsModel, pss_response.data)
 
     async def get(self):
         """
@@ -3101,56 +3112,49 @@ class OnpassPointsInAirport(web.View):
         points = await self._get_points_from_pss(airport_code)
         logger.debug(f'получилт поинты {points}')
         orders = pss.views.OrdersModel()
-        orders_limit = 500
-        page = 0
-        while True:
-
-            pss_response = await pss.views.Orders.pss_get(
-                pss.views.Orders.InputGetData(
-                    brand_tag=ONPASS_BRAND_TAG,
-                    airport_code=airport_code,
-                    phone=self.request.get('phone_number'),
-                    filter=pss.views.Orders.InputGetData.FilterEnum.actual,
-                    limit=orders_limit,
-                    offset=page * orders_limit
-                )
-            )
-            if pss_response.code != 0:
-                logger.error(f'ответ партнёрского сервиса не 0 а {pss_response.code}')
-                raise ApiResponse(30)
-            pss_orders = pss.views.OrdersModel(**pss_response.data)
-            orders.orders.extend(pss_orders.orders)
-            page += 1
-            if len(pss_orders.orders) < orders_limit: break
+        pages = iter_pages(
+            pss.views.Orders,
+            pss.views.Orders.InputGetData(
+                brand_tag=ONPASS_BRAND_TAG,
+                airport_code=airport_code,
+                phone=self.request.get('phone_number'),
+                filter=pss.views.Orders.InputGetData.FilterEnum.actual
+            ),
+            pss.views.OrdersModel
+        )
+        async for pss_orders in pages:
+            orders.extend(pss_orders.orders)
         logger.debug(f'orders = {orders}')
         async with pool.acquire() as conn:
-            prepared_qr = await conn.prepare(QR_CODES_QUERY)
-            i = 0
-            while i < len(points.points):
-                point = points.points[i]
-                purchased_visits_count = 0
-
-                qr_codes = await prepared_qr.fetchval(point.id, self.request.get('profile_id'))
-                logger.debug(point)
-                if qr_codes is not None:
-                    for pss_qr in qr_codes:
-                        order = orders.find(order_qr=pss_qr)
-                        if order is not None:
-                            for product in orders.find(order_qr=pss_qr).products:
-                                purchased_visits_count += product.remainder
-                if purchased_visits_count == 0 and params.purchased:
-                    points.points.pop(i)
-                    continue
-                i += 1
-                custom_info = point.custom_info
-                if custom_info is not None:
-                    price = custom_info.pop('price')
-                    if price is not None:
-                        point.price = price
-                    point.purchased_visits_count = purchased_visits_count
+            qr_rows = await conn.fetch(QR_CODES_BY_POINTS_QUERY, [point.id for point in points.points],
+                                       self.request.get('profile_id'))
+        qr_codes_by_point = {row['pss_point_id']: row['qr_codes'] for row in qr_rows}
+        i = 0
+        while i < len(points.points):
+            point = points.points[i]
+            purchased_visits_count = 0
+
+            qr_codes = qr_codes_by_point.get(point.id)
+            logger.debug(point)
+            if qr_codes is not None:
+                for pss_qr in qr_codes:
+                    order = orders.find(order_qr=pss_qr)
+                    if order is not None:
+                        for product in order.products:
+                            purchased_visits_count += product.remainder
+            if purchased_visits_count == 0 and params.purchased:
+                points.points.pop(i)
+                continue
+            i += 1
+            custom_info = point.custom_info
+            if custom_info is not None:
+                price = custom_info.pop('price')
+                if price is not None:
+                    point.price = price
+                point.purchased_visits_count = purchased_visits_count
         points.points.sort(key=lambda x: (not x.active, x.photo_path is None, -x.price, x.id))
         # data = dict(points=result)
-        raise ApiResponse(0, points.dict())
+        raise encoders.api_response(0, points.dict())
 
 
 # -------------------------------------------------------------------------------------------
@@ -3208,12 +3212,15 @@ class ProductsView(web.View):
 
         params = dict(self.request.query)
         language_code = self.request.get('locale', 'ru')
+        body = await pss_products.products_body(language_code, params)
+        if body is not None:
+            return pss_products.json_body_response(body)
         params.update({"language_code": language_code})
         url = config.pss_service.url + 'seller/products'
         headers = {'Authorization': f'Bearer {config.pss_service.token}'}
-        async with aiohttp.ClientSession() as session:
-            response = await session.get(url, headers=headers, params=params)
-            data = await response.json()
+        session = HttpClients.get(HttpClients.PSS)
+        response = await session.get(url, headers=headers, params=params)
+        data = await response.json()
         return web.json_response(data)
 
 
@@ -3260,12 +3267,15 @@ class ProductView(web.View):
         """
         params = dict(self.request.query)
         language_code = self.request.get('locale', 'ru')
+        body = await pss_products.product_body(language_code, params)
+        if body is not None:
+            return pss_products.json_body_response(body)
         params.update({"language_code": language_code})
         url = config.pss_service.url + 'seller/product'
         headers = {'Authorization': f'Bearer {config.pss_service.token}'}
-        async with aiohttp.ClientSession() as session:
-            response = await session.get(url, headers=headers, params=params)
-            data = await response.json()
+        session = HttpClients.get(HttpClients.PSS)
+        response = await session.get(url, headers=headers, params=params)
+        data = await response.json()
         return web.json_response(data)
 
 
@@ -3280,28 +3290,42 @@ class BasePayView(web.View):
     params: InputPostData
 
     async def pay(self, order_id):
+        """
+        Короткие обращения к БД чередуются с запросами в партнёрский сервис и банк, которые идут без соединения.
+        На время регистрации оплаты заказ захвачен (order_state.REGISTERING)
+        """
         pool = ApiPool.get_pool()
         async with pool.acquire() as self._conn:
             await self.find_moa_order(order_id)
+        try:
             await self.make_ofd_receipt()
             await self.register_order()
-            cashback = await self.update_order()
-            if cashback is not None:
-                return await self.collect_response(cashback)
-            else:
-                return await self.collect_response()
+        except BaseException:
+            async with pool.acquire() as self._conn:
+                await order_state.advance(self._conn, self._order.id, self._order.state,
+                                          sources=(order_state.REGISTERING,))
+            raise
+        async with pool.acquire() as self._conn:
+            order = await self.update_order()
+        if order is not None:
+            cashback = await MilesOperations(order).process()
+            return await self.collect_response(cashback or 0)
+        return await self.collect_response()
 
     async def find_moa_order(self, order_id):
         order_row = await self._conn.fetchrow(self._order_query, order_id, self.user.id)
         if order_row is None:
             raise ApiResponse(13)
         self._order = OrderModel(**order_row)
+        if await order_state.advance(self._conn, self._order.id, order_state.REGISTERING) is None:
+            raise ApiResponse(13, log_message=f'заказ {order_id} в состоянии {self._order.state} нельзя оплатить')
 
     async def make_ofd_receipt(self):
         pass
 
     @abstractmethod
-    async def update_order(self):
+    async def update_order(self) -> Optional[OrderModel]:
+        """ Сохраняет результат регистрации оплаты; возвращает заказ, если по нему нужно начислить мили """
         pass
 
     @abstractmethod
@@ -3394,8 +3418,11 @@ class WebPayView(BasePayView):
         )
 
     async def update_order(self):
-        await self._conn.execute('update orders set qr = $2 where id = $1', self._order.id,
-                                 self.alfa_response.order_id)
+        await order_state.advance(self._conn, self._order.id, order_state.AWAITING_PAYMENT,
+                                  qr=self.alfa_response.order_id)
+        # оплата на странице банка: статус сверяется в фоне, даже если клиент не вернется в приложение
+        await payment_status_worker.enqueue(self._conn, self.alfa_response.order_id,
+                                            delay=PAYMENT_STATUS['first_delay'])
 
     async def collect_response(self, cashback=None):
         return dict(
@@ -3421,42 +3448,52 @@ class ConfirmPay(web.View):
     async def get(self):
         self.params = validate_data(self.request.query, self.GetInputData)
         # self.params = self.GetInputData(**self.request.query)
-        pool = ApiPool.get_pool()
-        async with pool.acquire() as self._conn:
-            await self.confirm_order()
+        await self.confirm_order()
 
     async def confirm_order(self):
-        order = validate_data(await self._conn.fetchrow(self._order_query, self.params.qr), OrderModel)
-        if order is None:
-            raise ApiResponse(13, log_message=f'order with params:{self.params} not found')
-        # order = OrderModel(**await self._conn.fetchrow(self._order_query, self.params.qr))
-        logger.debug(f'order = {order}')
+        """
+        Статус оплаты запрашивает у банка payment_status_worker; здесь заказ ставится на внеочередную проверку
+        и ее результат ожидается без соединения с БД
+        """
+        pool = ApiPool.get_pool()
+        async with pool.acquire() as self._conn:
+            order = validate_data(await self._conn.fetchrow(self._order_query, self.params.qr), OrderModel)
+            if order is None:
+                raise ApiResponse(13, log_message=f'order with params:{self.params} not found')
+            logger.debug(f'order = {order}')
+        cashback = None
         if not order.confirmed:
-            attempts = 0
-            while True:
-                attempts += 1
-                confirmation_data = await alfa_bank.GetOrderStatusExtended.post(
-                    alfa_bank.GetOrderStatusExtended.input_post_model(orderId=order.qr))
-                order_status = confirmation_data.order_status
-                if order_status != 0 or attempts > 5:
-                    break
-            logger.debug(f'order = {confirmation_data}')
-            order.paid = order_status == 2
-            order.confirmed = order_status != 0
-            await save_email_for_receipts(confirmation_data, order.profile_id)
-        await self._conn.execute(
-            'update orders set paid=$2, confirmed=$3 where id = $1', order.id, order.paid, order.confirmed)
-        if order.confirmed and not order.processed:
+            cashback = await payment_status_worker.check_now(order.qr)
+            async with pool.acquire() as self._conn:
+                order = OrderModel(**await self._conn.fetchrow(self._order_query, self.params.qr))
+        elif not order.processed:
             cashback = await MilesOperations(order).process()
-
-        else:
-            cashback = None
         raise ApiResponse(0, dict(
             status=order.paid,
             cashback=cashback
         ))
 
 
+async def confirm_order_payment(bank_order_id, confirmation_data):
+    """
+    Обработчик payment_status_worker для заказов (orders.qr): сохраняет окончательный статус оплаты
+    и начисляет мили. Возвращает кешбэк; None, если заказ уже подтвержден
+    """
+    paid = confirmation_data.order_status == 2
+    async with ApiPool.get_pool().acquire() as conn:
+        row = await order_state.advance(conn, bank_order_id, order_state.confirmed(paid), key='qr',
+                                        paid=paid, confirmed=True)
+    if row is None:
+        return None
+    order = OrderModel(**row)
+    logger.debug(f'order = {confirmation_data}')
+    await save_email_for_receipts(confirmation_data, order.profile_id)
+    return await MilesOperations(order).process()
+
+
+payment_status_worker.register(payment_status.ORDER, confirm_order_payment)
+
+
 class MobilePayView(BasePayView, ABC):
     class InputPostData(BaseModel):
         order_id: int
@@ -3469,13 +3506,12 @@ class MobilePayView(BasePayView, ABC):
             qr = self.alfa_response.data.orderId
         else:
             qr = None
-        order = OrderModel(**await self._conn.fetchrow(
-            'update orders set qr = $2, confirmed=True, paid = $3  where id = $1 returning *',
-            self._order.id,
-            qr,
-            self.alfa_response.success))
-        cashback = await MilesOperations(order).process()
-        return cashback
+        order_row = await order_state.advance(
+            self._conn, self._order.id, order_state.confirmed(self.alfa_response.success),
+            qr=qr, confirmed=True, paid=self.alfa_response.success)
+        if order_row is None:
+            raise ApiResponse(90, log_message=f'заказ {self._order.id} захвачен другим запросом во время оплаты')
+        return OrderModel(**order_row)
 
     async def collect_response(self, cashback=0):
         data = {'cashback': cashback}
@@ -3624,6 +3660,11 @@ class RedirectSuccessView(web.View):
         if status.lower() not in ['success', 'failed']:
             raise HTTPNotFound
         context = {'status': status.upper()}
+        bank_order_id = self.request.query.get('orderId')
+        if bank_order_id:
+            # банк добавляет orderId к адресу возврата; повторные переходы не дублируют заказ в очереди
+            async with tools.get_pool_from_request(self.request).acquire() as conn:
+                await payment_status_worker.enqueue_order_redirect(conn, bank_order_id)
 
         return context
 
@@ -3636,10 +3677,20 @@ class MilesOperations:
         self.order = order
 
     async def process(self):
-        async with ApiPool.get_pool().acquire() as self._conn:
+        """
+        Списание или разморозка миль по подтвержденному заказу. Запросы в партнёрский сервис и кассу идут
+        без соединения с БД, заказ на это время захвачен (order_state.PROCESSING).
+        Возвращает начисленные мили; None, если заказ уже обрабатывается или обработан
+        """
+        pool = ApiPool.get_pool()
+        async with pool.acquire() as self._conn:
+            if await order_state.advance(self._conn, self.order.id, order_state.PROCESSING) is None:
+                return None
+            frozen_miles = await self._conn.fetchval('select freezed_mile_count from uuid_relations '
+                                                     'where transactions_uuid= $1', self.order.uuid_relation) \
+                if self.order.paid else None
+        try:
             if self.order.paid:
-                frozen_miles = await self._conn.fetchval('select freezed_mile_count from uuid_relations '
-                                                         'where transactions_uuid= $1', self.order.uuid_relation)
                 pss_response = await pss.Order.pss_get(
                     pss.models.OrderGetInput(
                         qr=self.order.pss_qr
@@ -3655,12 +3706,17 @@ class MilesOperations:
                     await self.collect()
                 else:
                     await self.redeem()
-                mile_bonus = await self.get_mile_bonus()
             else:
                 await self.unfreeze()
-                mile_bonus = 0
-            await self._conn.execute('update orders set processed =true where id = $1', self.order.id)
-            return mile_bonus
+        except BaseException:
+            async with pool.acquire() as self._conn:
+                await order_state.advance(self._conn, self.order.id, order_state.confirmed(self.order.paid),
+                                          sources=(order_state.PROCESSING,))
+            raise
+        async with pool.acquire() as self._conn:
+            mile_bonus = await self.get_mile_bonus() if self.order.paid else 0
+            await order_state.advance(self._conn, self.order.id, order_state.PROCESSED, processed=True)
+        return mile_bonus
 
     def create_receipt(self):
         receipt = kassa.models.Receipt(